@@ -1,12 +1,25 @@
 #ai_service.py
-from dataclasses import dataclass
-from typing import List, Dict, Tuple, Set, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Set, Optional, Union
+import hashlib
+import json
+import logging
 import re
-import spacy
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
 import math
-from collections import Counter
+import threading
+from collections import Counter, OrderedDict
+
+from .embedding_cache import TeacherEmbeddingCache
+from .embeddings import EmbeddingBackend, SentenceTransformerBackend, make_backend
+from .metrics import GRADER_ANSWERS, GRADER_STAGE_LATENCY
+from .result_cache import GradeResultCache
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change to the scoring code can change a score: it is part of
+# every memoized result's key, so no result from an older grader is served.
+GRADER_VERSION = 2
 
 # ==============================
 # DATA STRUCTURES (MINIMAL)
@@ -17,6 +30,51 @@ class Concept:
     keywords: List[str]
     weight: float = 1.0
 
+@dataclass
+class CompiledQuestion:
+    """Teacher-side grading artifacts, computed once at upload and stored with the question."""
+    teacher_relations: List[Tuple[str, str, str]]
+    keyword_to_concept: Dict[str, str]   # lowercased keyword -> concept name
+    keyword_lemmas: Dict[str, str]       # lowercased keyword -> its lemmatized form
+    concept_keywords: List[str]          # lowercased, in concept order (repetition check)
+    teacher_token_count: int
+    embedding_model: str = ""            # teacher embedding lives in TeacherEmbeddingCache
+    embedding_hash: str = ""             # under (embedding_model, embedding_hash)
+    version: str = ""                    # changes whenever the question is re-uploaded or edited
+    revision: str = ""                   # the upload compiled for (part of `version`)
+    grader_version: int = 0              # GRADER_VERSION of the grader that compiled it
+    matcher: Optional["KeywordMatcher"] = field(default=None, repr=False, compare=False)  # built on first use
+
+    def to_dict(self) -> Dict:
+        """Firestore-safe form (no nested arrays)."""
+        return {
+            'teacher_relations': [{'subj': s, 'verb': v, 'obj': o} for s, v, o in self.teacher_relations],
+            'keyword_to_concept': self.keyword_to_concept,
+            'keyword_lemmas': self.keyword_lemmas,
+            'concept_keywords': self.concept_keywords,
+            'teacher_token_count': self.teacher_token_count,
+            'embedding_model': self.embedding_model,
+            'embedding_hash': self.embedding_hash,
+            'version': self.version,
+            'revision': self.revision,
+            'grader_version': self.grader_version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CompiledQuestion":
+        return cls(
+            teacher_relations=[(r['subj'], r['verb'], r['obj']) for r in data.get('teacher_relations', [])],
+            keyword_to_concept=dict(data.get('keyword_to_concept', {})),
+            keyword_lemmas=dict(data.get('keyword_lemmas', {})),
+            concept_keywords=list(data.get('concept_keywords', [])),
+            teacher_token_count=int(data.get('teacher_token_count', 0)),
+            embedding_model=data.get('embedding_model', ''),
+            embedding_hash=data.get('embedding_hash', ''),
+            version=data.get('version', ''),
+            revision=data.get('revision', ''),
+            grader_version=int(data.get('grader_version', 0)),
+        )
+
 @dataclass
 class QuestionConfig:
     question_id: str
@@ -26,11 +84,106 @@ class QuestionConfig:
     correct_answer: str = ""  # Fallback
     concepts: List[Concept] = None
     max_score: int = 1
-    
+    compiled: Optional[CompiledQuestion] = None
+
+    @classmethod
+    def from_dict(cls, q: Dict) -> "QuestionConfig":
+        """Build from a stored question document, including its compiled artifact if present."""
+        return cls(
+            question_id=q['id'],
+            type=q['type'],
+            teacher_answer=q['teacher_answer'],
+            concepts=[Concept(**c) for c in q.get('concepts', [])],
+            max_score=int(float(q.get('max_score', 1))),
+            compiled=CompiledQuestion.from_dict(q['compiled']) if q.get('compiled') else None,
+        )
+
+@dataclass
+class ParsedAnswer:
+    """A student answer parsed once per grade and shared by the concept, relation and penalty stages."""
+    text: str                   # normalized
+    doc: "spacy.tokens.Doc"
+    lemma_counts: Counter       # alphabetic lemmas
+    lemma_text: str             # every token's lemma, original spacing (keyword matching)
+    token_count: int            # whitespace tokens of `text`
+
+# ==============================
+# KEYWORD MATCHING
+# ==============================
+class KeywordMatcher:
+    """All keywords of a question compiled once into a word-level trie.
+
+    `match` walks the answer's words in a single pass. Matches are whole
+    words/phrases only ("gas" does not hit "gasket"), and each plain-word
+    keyword is also matched by its lemma against the answer's lemma text, so
+    "plant" still hits "plants".
+    """
+
+    # Keywords and answers are split the same way. Dots inside a word and trailing
+    # +/# stay part of it, so "c++", "c#", ".net" and "node.js" are not "c"/"net"/"node js".
+    _WORD = re.compile(r"\.?\w+(?:\.\w+)*[+#]*")
+
+    def __init__(self, concepts: List[Concept], keyword_lemmas: Optional[Dict[str, str]] = None):
+        keyword_lemmas = keyword_lemmas or {}
+        # trie node: {word: (concept indices ending here, child node)}
+        self._root: Dict[str, Tuple[Set[int], Dict]] = {}
+        for i, c in enumerate(concepts):
+            for kw in c.keywords:
+                kw = kw.lower()
+                words = self._words(kw)
+                if words:
+                    self._insert(words, i)
+                # spaCy splits technical terms ("c++" -> "c ++"), so only plain words match by lemma
+                if all(w.isalpha() for w in words):
+                    lemma_words = self._words(keyword_lemmas.get(kw, ""))
+                    if lemma_words:
+                        self._insert(lemma_words, i)
+
+    def _insert(self, words: List[str], concept_index: int) -> None:
+        node = self._root
+        for n, word in enumerate(words):
+            hits, child = node.setdefault(word, (set(), {}))
+            if n == len(words) - 1:
+                hits.add(concept_index)
+            node = child
+
+    def _words(self, text: str) -> List[str]:
+        return self._WORD.findall(text)
+
+    def match(self, *texts: str) -> Set[int]:
+        """Indices of the concepts hit anywhere in `texts`."""
+        hits: Set[int] = set()
+        root = self._root
+        for text in texts:
+            words = self._words(text)
+            present = root.keys() & set(words)
+            phrase_starts = set()
+            for word in present:
+                word_hits, child = root[word]
+                hits |= word_hits
+                if child:
+                    phrase_starts.add(word)
+            if not phrase_starts:
+                continue
+            # Only multi-word keywords need positional walks
+            for start, word in enumerate(words):
+                if word not in phrase_starts:
+                    continue
+                node = root[word][1]
+                for nxt in words[start + 1:]:
+                    entry = node.get(nxt)
+                    if entry is None:
+                        break
+                    hits |= entry[0]
+                    node = entry[1]
+        return hits
+
 # ==============================
 # NEW AI-SERVICE DESCRIPTIVE GRADER
 # ==============================
 class DescriptiveAnswerGrader:
+    MAX_QUESTION_CONFIGS = 4096
+
     def __init__(
         self,
         emb_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
@@ -38,35 +191,186 @@ class DescriptiveAnswerGrader:
         w_relation: float = 0.30,
         w_semantic: float = 0.35,   # Increased (transformer core)
         w_penalty: float = 0.10,
+        teacher_cache: Optional[TeacherEmbeddingCache] = None,
+        embedder: Optional[EmbeddingBackend] = None,
+        result_cache: Optional[GradeResultCache] = None,
     ):
-        self.model = SentenceTransformer(emb_model_name)
+        self.emb_model_name = emb_model_name
+        self.embedder = embedder or SentenceTransformerBackend(emb_model_name)
+        self.teacher_cache = teacher_cache
+        self.result_cache = result_cache
+        import spacy  # pulls in thinc and torch: loaded with the grader, not when views import this module
+
         self.nlp = spacy.load("en_core_web_sm")
         self.w_concept = w_concept
         self.w_relation = w_relation
         self.w_semantic = w_semantic
         self.w_penalty = w_penalty
+        self._configs: "OrderedDict[Tuple, QuestionConfig]" = OrderedDict()
+        self._configs_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """Run one tiny pass through both models so lazy kernels/allocations happen before real traffic."""
+        self.embedder.encode(["warm up"])
+        self.nlp("warm up")
 
     def _normalize(self, text: str) -> str:
         return re.sub(r"\s+", " ", text.lower()).strip()
 
-    def compute_concept_score(self, cfg: QuestionConfig, student_answer: str) -> float:
+    def parse_answer(self, student_answer: str) -> ParsedAnswer:
+        text = self._normalize(student_answer)
+        return self._parsed(text, self.nlp(text))
+
+    def parse_answers(self, student_answers: List[str], batch_size: int = 64) -> List[ParsedAnswer]:
+        """Parse many answers through spaCy's batched `pipe`."""
+        texts = [self._normalize(a) for a in student_answers]
+        return [self._parsed(t, doc) for t, doc in zip(texts, self.nlp.pipe(texts, batch_size=batch_size))]
+
+    def _parsed(self, text: str, doc) -> ParsedAnswer:
+        return ParsedAnswer(
+            text=text,
+            doc=doc,
+            lemma_counts=Counter(t.lemma_.lower() for t in doc if t.is_alpha),
+            lemma_text=self._lemma_text(doc),
+            token_count=len(text.split()),
+        )
+
+    @staticmethod
+    def _lemma_text(doc) -> str:
+        """Each token's lemma with the original spacing, so "c++" stays one word for KeywordMatcher."""
+        return "".join((t.lemma_ or t.text).lower() + t.whitespace_ for t in doc)
+
+    def _as_parsed(self, student_answer: Union[str, ParsedAnswer]) -> ParsedAnswer:
+        if isinstance(student_answer, ParsedAnswer):
+            return student_answer
+        return self.parse_answer(student_answer)
+
+    def compute_concept_score(self, cfg: QuestionConfig, student_answer: Union[str, ParsedAnswer]) -> float:
         if not cfg.concepts:
             return 1.0
-        text = self._normalize(student_answer)
+        parsed = self._as_parsed(student_answer)
         total_weight = sum(c.weight for c in cfg.concepts)
         if total_weight == 0: return 0.0
-        gained = 0.0
-        for c in cfg.concepts:
-            for kw in c.keywords:
-                if kw.lower() in text:
-                    gained += c.weight
-                    break
+        hits = self.compiled_for(cfg).matcher.match(parsed.text, parsed.lemma_text)
+        gained = sum(c.weight for i, c in enumerate(cfg.concepts) if i in hits)
         return gained / total_weight
 
-    def extract_relations(self, text: str, concepts: List[Concept]) -> Set[Tuple[str, str, str]]:
+    def compile_question(self, cfg: QuestionConfig, revision: str = "") -> CompiledQuestion:
+        """Precompute everything grading needs from the teacher side of a question.
+
+        `revision` identifies the upload; it is folded into the artifact's
+        `version` so every re-upload invalidates memoized results.
+        """
+        return self.compile_questions([cfg], revision)[0]
+
+    def compile_questions(
+        self, cfgs: List[QuestionConfig], revision: str = "", batch_size: int = 64
+    ) -> List[CompiledQuestion]:
+        """`compile_question` for a whole upload: teacher answers and keywords go through spaCy in batches."""
+        keyword_maps = [{kw.lower(): c.name for c in cfg.concepts or [] for kw in c.keywords} for cfg in cfgs]
+        teacher_texts = [self._normalize(cfg.teacher_answer) for cfg in cfgs]
+
+        all_keywords = list(dict.fromkeys(kw for kw_map in keyword_maps for kw in kw_map))
+        lemma_of = {
+            kw: self._lemma_text(kw_doc)
+            for kw, kw_doc in zip(all_keywords, self.nlp.pipe(all_keywords, batch_size=batch_size))
+        }
+        # Relations need a parse only where there are concepts to relate
+        to_parse = [i for i, cfg in enumerate(cfgs) if cfg.concepts]
+        docs = dict(zip(to_parse, self.nlp.pipe([teacher_texts[i] for i in to_parse], batch_size=batch_size)))
+
+        compiled = []
+        for i, (cfg, keyword_to_concept, teacher_text) in enumerate(zip(cfgs, keyword_maps, teacher_texts)):
+            concepts = cfg.concepts or []
+            relations = self.extract_relations(docs[i], concepts, keyword_to_concept) if i in docs else set()
+            compiled.append(CompiledQuestion(
+                teacher_relations=sorted(relations),
+                keyword_to_concept=keyword_to_concept,
+                keyword_lemmas={kw: lemma_of[kw] for kw in keyword_to_concept},
+                concept_keywords=[kw.lower() for c in concepts for kw in c.keywords],
+                teacher_token_count=len(teacher_text.split()),
+                embedding_model=self.embedder.cache_key,
+                embedding_hash=TeacherEmbeddingCache.text_hash(teacher_text),
+                version=self._question_version(cfg, teacher_text, revision),
+                revision=revision,
+                grader_version=GRADER_VERSION,
+            ))
+        return compiled
+
+    def _question_version(self, cfg: QuestionConfig, teacher_text: str, revision: str) -> str:
+        return self._digest(
+            revision, cfg.question_id, teacher_text, int(cfg.max_score),
+            [(c.name, c.weight, [kw.lower() for kw in c.keywords]) for c in cfg.concepts or []],
+        )
+
+    def _is_current(self, cfg: QuestionConfig) -> bool:
+        """False if `cfg.compiled` came from another grader revision or no longer matches the question."""
+        compiled = cfg.compiled
+        return (
+            compiled.grader_version == GRADER_VERSION
+            and compiled.version == self._question_version(cfg, self._normalize(cfg.teacher_answer), compiled.revision)
+        )
+
+    @staticmethod
+    def _digest(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def config_key(self) -> str:
+        """Identifies everything about this grader that affects scores."""
+        return self._digest(
+            GRADER_VERSION, self.embedder.cache_key, self.w_concept, self.w_relation, self.w_semantic, self.w_penalty
+        )
+
+    def compiled_for(self, cfg: QuestionConfig) -> CompiledQuestion:
+        """The question's stored artifact, compiling (and memoizing on `cfg`) when it has none or a stale one.
+
+        A stored artifact is checked once, on first use: one compiled by an
+        older grader, or for a question edited since, is rebuilt.
+        """
+        if cfg.compiled is None:
+            cfg.compiled = self.compile_question(cfg)
+        elif cfg.compiled.matcher is None and not self._is_current(cfg):
+            logger.info("recompiling stale question artifact", extra={'question_id': cfg.question_id})
+            cfg.compiled = self.compile_question(cfg, cfg.compiled.revision)
+        if cfg.compiled.matcher is None:
+            cfg.compiled.matcher = KeywordMatcher(cfg.concepts or [], cfg.compiled.keyword_lemmas)
+        return cfg.compiled
+
+    def config_for(self, q: Dict) -> QuestionConfig:
+        """The stored question as a QuestionConfig with its matcher built, reused by every job until it changes.
+
+        Keyed by exam, question and compiled `version` (a digest of the
+        question for uploads that predate compiled artifacts), so a re-upload
+        gets a fresh config while jobs for an unchanged exam share one.
+        """
+        compiled = q.get('compiled') or {}
+        key = (
+            q.get('exam_code', ''), q['id'],
+            compiled.get('version') or self._digest(q['type'], q['teacher_answer'], q.get('concepts', []), q.get('max_score', 1)),
+        )
+        with self._configs_lock:
+            cfg = self._configs.get(key)
+            if cfg is not None:
+                self._configs.move_to_end(key)
+                return cfg
+        cfg = QuestionConfig.from_dict(q)
+        self.compiled_for(cfg)  # fully built before other threads can see it
+        with self._configs_lock:
+            self._configs[key] = cfg
+            while len(self._configs) > self.MAX_QUESTION_CONFIGS:
+                self._configs.popitem(last=False)
+        return cfg
+
+    def extract_relations(
+        self,
+        text: Union[str, "spacy.tokens.Doc"],
+        concepts: List[Concept],
+        keyword_to_concept: Optional[Dict[str, str]] = None,
+    ) -> Set[Tuple[str, str, str]]:
         if not concepts: return set()
-        doc = self.nlp(text)
-        keyword_to_concept = {kw.lower(): c.name for c in concepts for kw in c.keywords}
+        doc = self.nlp(text) if isinstance(text, str) else text
+        if keyword_to_concept is None:
+            keyword_to_concept = {kw.lower(): c.name for c in concepts for kw in c.keywords}
         relations: Set[Tuple[str, str, str]] = set()
         for token in doc:
             if token.pos_ != "VERB": continue
@@ -82,19 +386,22 @@ class DescriptiveAnswerGrader:
                 relations.add((subj, verb, obj))
         return relations
 
-    def compute_relation_score(self, cfg: QuestionConfig, student_answer: str) -> float:
-        concepts = cfg.concepts or []
-        teacher_rels = self.extract_relations(self._normalize(cfg.teacher_answer), concepts)
-        student_rels = self.extract_relations(self._normalize(student_answer), concepts)
+    def compute_relation_score(self, cfg: QuestionConfig, student_answer: Union[str, ParsedAnswer]) -> float:
+        compiled = self.compiled_for(cfg)
+        teacher_rels = set(compiled.teacher_relations)
         if not teacher_rels: return 1.0
+        student_rels = self.extract_relations(
+            self._as_parsed(student_answer).doc, cfg.concepts or [], compiled.keyword_to_concept
+        )
         matches = sum(1 for rel in teacher_rels if rel in student_rels)
         return matches / len(teacher_rels)
 
     def compute_semantic_similarity(self, teacher_answer: str, student_answer: str) -> float:
         """NEW: Transformer replaces TF-IDF"""
-        emb_t = self.model.encode(teacher_answer, convert_to_tensor=True)
-        emb_s = self.model.encode(student_answer, convert_to_tensor=True)
-        sim = util.cos_sim(emb_t, emb_s).item()
+        return self.compute_semantic_similarities([teacher_answer], [student_answer])[0]
+
+    @staticmethod
+    def _scale_similarity(sim: float) -> float:
         sim = max(-1.0, min(1.0, sim))
         # Nonlinear scale for realistic grading
         floor, exp = 0.05, 1.1
@@ -102,15 +409,57 @@ class DescriptiveAnswerGrader:
         scaled = (sim - floor) / (1.0 - floor)
         return math.pow(scaled, exp)
 
-    def compute_penalty(self, cfg: QuestionConfig, student_answer: str) -> float:
-        text = self._normalize(student_answer)
-        doc = self.nlp(text)
+    def compute_semantic_similarities(
+        self, teacher_answers: List[str], student_answers: List[str], batch_size: int = 64
+    ) -> List[float]:
+        """Batched semantic similarity: every distinct text is encoded once, in one model call.
+
+        Teacher embeddings come from `teacher_cache` when available; only the
+        misses are encoded, alongside the student answers.
+        """
+        if not student_answers:
+            return []
+        teacher_texts = [self._normalize(t) for t in teacher_answers]
+        cached = self.teacher_cache.get_many(set(teacher_texts)) if self.teacher_cache else {}
+
+        texts = list(dict.fromkeys([t for t in teacher_texts if t not in cached] + list(student_answers)))
+        index = {t: i for i, t in enumerate(texts)}
+        emb = self._encode(texts, batch_size)
+
+        fresh = {t: emb[index[t]] for t in teacher_texts if t not in cached}
+        if self.teacher_cache and fresh:
+            self.teacher_cache.put_many(fresh)
+        lookup = {**cached, **fresh}
+
+        emb_t = np.stack([lookup[t] for t in teacher_texts])
+        emb_s = emb[[index[s] for s in student_answers]]
+        # Unit vectors: cosine similarity is the row-wise dot product
+        sims = np.einsum("ij,ij->i", emb_t, emb_s)
+        return [self._scale_similarity(float(sim)) for sim in sims]
+
+    def warm_teacher_embeddings(self, teacher_answers: List[str]) -> int:
+        """Encode and cache any teacher answers not cached yet; returns how many were encoded."""
+        if not self.teacher_cache:
+            return 0
+        texts = list(dict.fromkeys(self._normalize(t) for t in teacher_answers if t and t.strip()))
+        cached = self.teacher_cache.get_many(texts)
+        missing = [t for t in texts if t not in cached]
+        if missing:
+            emb = self._encode(missing)
+            self.teacher_cache.put_many(dict(zip(missing, emb)))
+        return len(missing)
 
-        from collections import Counter
-        lemmas = [t.lemma_.lower() for t in doc if t.is_alpha]
-        word_freq = Counter(lemmas)
+    def _encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Unit-normalized float32 embeddings, one row per text."""
+        return self.embedder.encode(texts, batch_size=batch_size)
 
-        concept_kws = [kw.lower() for c in (cfg.concepts or []) for kw in c.keywords]
+    def compute_penalty(self, cfg: QuestionConfig, student_answer: Union[str, ParsedAnswer]) -> float:
+        parsed = self._as_parsed(student_answer)
+        doc = parsed.doc
+        word_freq = parsed.lemma_counts
+
+        compiled = self.compiled_for(cfg)
+        concept_kws = compiled.concept_keywords
 
         rep_hits = sum(1 for kw in concept_kws if word_freq.get(kw, 0) > 3)
 
@@ -119,8 +468,8 @@ class DescriptiveAnswerGrader:
 
         ratio_pen = 0.5 if verb_cnt == 0 and noun_cnt > 0 else 0.3 if noun_cnt / max(1, verb_cnt) > 5 else 0.0
 
-        t_len = len(self._normalize(cfg.teacher_answer).split())
-        s_len = len(text.split())
+        t_len = compiled.teacher_token_count
+        s_len = parsed.token_count
 
         len_pen = 0.4 if t_len > 0 and s_len > 3 * t_len else 0.0
 
@@ -128,12 +477,10 @@ class DescriptiveAnswerGrader:
 
         return max(0.0, min(1.0, raw_pen))
 
-    def evaluate_answer(student_answer, correct_answer, concepts=None, max_score=10):
+    def evaluate_answer(self, student_answer, correct_answer, concepts=None, max_score=10):
         """NEW: Hybrid wrapper for backward compatibility"""
-        grader = DescriptiveAnswerGrader()
-        
         cfg = QuestionConfig("Q1",type="descriptive", teacher_answer = correct_answer, concepts =  concepts or [], max_score=int(float(max_score or 0)))
-        result = grader.grade(cfg, student_answer)
+        result = self.grade(cfg, student_answer)
         similarity = result["normalized"]  # 0-1.0
         ai_score = (similarity * 100)  # Percentage
         is_correct = similarity > 0.5
@@ -141,11 +488,76 @@ class DescriptiveAnswerGrader:
 
     def grade(self, cfg: QuestionConfig, student_answer: str) -> Dict:
         """Full breakdown (for debugging)"""
-        c_score = self.compute_concept_score(cfg, student_answer)
-        r_score = self.compute_relation_score(cfg, student_answer)
-        s_score = self.compute_semantic_similarity(cfg.teacher_answer, student_answer)
-        penalty = self.compute_penalty(cfg, student_answer)
-        
+        with GRADER_STAGE_LATENCY.time(stage='parse'):
+            parsed = self.parse_answer(student_answer)
+        with GRADER_STAGE_LATENCY.time(stage='concept'):
+            c_score = self.compute_concept_score(cfg, parsed)
+        with GRADER_STAGE_LATENCY.time(stage='relation'):
+            r_score = self.compute_relation_score(cfg, parsed)
+        with GRADER_STAGE_LATENCY.time(stage='semantic'):
+            s_score = self.compute_semantic_similarity(cfg.teacher_answer, student_answer)
+        with GRADER_STAGE_LATENCY.time(stage='penalty'):
+            penalty = self.compute_penalty(cfg, parsed)
+        GRADER_ANSWERS.inc(source='graded')
+        return self._combine(cfg, c_score, r_score, s_score, penalty)
+
+    def grade_many(self, cfgs: List[QuestionConfig], answers: List[str], batch_size: int = 64) -> List[Dict]:
+        """Grade many (question, answer) pairs with a single batched encoder pass.
+
+        Pairs may come from any number of submissions; returns one `grade()`-style
+        breakdown per pair, in input order.
+        """
+        if len(cfgs) != len(answers):
+            raise ValueError("grade_many needs exactly one answer per question config")
+
+        keys: List[Optional[str]] = [None] * len(cfgs)
+        cached: Dict[str, Dict] = {}
+        if self.result_cache is not None:
+            config_key = self.config_key()
+            keys = [
+                self._digest(self.compiled_for(cfg).version, config_key, self._normalize(answer))
+                for cfg, answer in zip(cfgs, answers)
+            ]
+            cached = self.result_cache.get_many(set(keys))
+
+        # Identical answers to the same question inside one batch are graded once
+        todo, seen = [], set()
+        for i, key in enumerate(keys):
+            if key is None or (key not in cached and key not in seen):
+                todo.append(i)
+                seen.add(key)
+        results: List[Optional[Dict]] = [cached.get(key) for key in keys]
+        if todo:
+            todo_cfgs = [cfgs[i] for i in todo]
+            todo_answers = [answers[i] for i in todo]
+            # Batched stages are timed per batch, the per-answer stages per answer
+            with GRADER_STAGE_LATENCY.time(stage='semantic_batch'):
+                s_scores = self.compute_semantic_similarities(
+                    [cfg.teacher_answer for cfg in todo_cfgs], todo_answers, batch_size=batch_size
+                )
+            with GRADER_STAGE_LATENCY.time(stage='parse_batch'):
+                parsed_answers = self.parse_answers(todo_answers, batch_size=batch_size)
+            fresh = {}
+            for i, cfg, parsed, s_score in zip(todo, todo_cfgs, parsed_answers, s_scores):
+                with GRADER_STAGE_LATENCY.time(stage='concept'):
+                    c_score = self.compute_concept_score(cfg, parsed)
+                with GRADER_STAGE_LATENCY.time(stage='relation'):
+                    r_score = self.compute_relation_score(cfg, parsed)
+                with GRADER_STAGE_LATENCY.time(stage='penalty'):
+                    penalty = self.compute_penalty(cfg, parsed)
+                results[i] = self._combine(cfg, c_score, r_score, s_score, penalty)
+                if keys[i] is not None:
+                    fresh[keys[i]] = results[i]
+            if self.result_cache is not None:
+                self.result_cache.put_many(fresh)
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = dict(fresh[key])
+        GRADER_ANSWERS.inc(len(todo), source='graded')
+        GRADER_ANSWERS.inc(len(keys) - len(todo), source='cache')
+        return results
+
+    def _combine(self, cfg: QuestionConfig, c_score: float, r_score: float, s_score: float, penalty: float) -> Dict:
         combined = (self.w_concept * c_score + 
                    self.w_relation * r_score + 
                    self.w_semantic * s_score - 
@@ -163,7 +575,49 @@ class DescriptiveAnswerGrader:
         }
 
 # ==============================
-# USAGE (Direct replacement)
+# SHARED GRADER (ONE PER PROCESS)
+# ==============================
+_shared_grader: Optional[DescriptiveAnswerGrader] = None
+_shared_grader_lock = threading.Lock()
+
+
+def get_grader() -> DescriptiveAnswerGrader:
+    """Return the process-wide grader, loading and warming the models on first use."""
+    global _shared_grader
+    if _shared_grader is None:
+        with _shared_grader_lock:
+            if _shared_grader is None:
+                grader = _grader_from_settings()
+                grader.warm_up()
+                _shared_grader = grader
+    return _shared_grader
+
+
+def _grader_from_settings() -> DescriptiveAnswerGrader:
+    """Build a grader with the embedding backend and teacher cache chosen in Django settings."""
+    from django.conf import settings
+
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    embedder = make_backend(settings.GRADER_EMBEDDING_BACKEND, model_name, settings.GRADER_ONNX_MODEL_DIR)
+    teacher_cache = TeacherEmbeddingCache(
+        embedder.cache_key, path=settings.GRADER_CACHE_DIR / "teacher_embeddings.sqlite3"
+    )
+    result_cache = GradeResultCache(
+        max_bytes=settings.GRADER_RESULT_CACHE_MB * 1024 * 1024,
+        path=settings.GRADER_CACHE_DIR / "grade_results.sqlite3" if settings.GRADER_RESULT_CACHE_SHARED else None,
+    )
+    return DescriptiveAnswerGrader(
+        model_name, teacher_cache=teacher_cache, embedder=embedder, result_cache=result_cache
+    )
+
+
+def grader_is_ready() -> bool:
+    """True once the shared grader has loaded and warmed its models."""
+    return _shared_grader is not None
+
+
+# ==============================
+# USAGE (Direct replacement): python -m exam.ai_service
 # ==============================
 if __name__ == "__main__":
     grader = DescriptiveAnswerGrader()
@@ -177,5 +631,5 @@ if __name__ == "__main__":
     
     # Full breakdown
     concepts = [Concept("plants", ["plant", "plants"]), Concept("sunlight", ["sunlight", "light"])]
-    cfg = QuestionConfig("Q1", teacher, concepts, 10.0)
+    cfg = QuestionConfig("Q1", type="descriptive", teacher_answer=teacher, concepts=concepts, max_score=10)
     print(grader.grade(cfg, student))
@@ -0,0 +1,215 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, Increment, Maximum
+
+from .firebase_config import adb, db
+from .firestore_batch import ChunkedWriteBatch
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# answer_drafts/<exam_code>/students/<pern_no> = {'answers': {<q_id>: <answer>}, 'revision': n, 'saves': n, ...}
+# Kept apart from results/, so stats, exports and grading never see unsubmitted answers.
+# The page numbers its saves 1, 2, 3...; `revision` is the highest stored and `saves` how many
+# were stored, so saves == revision means none is missing (e.g. still buffered in another worker).
+DRAFTS = 'answer_drafts'
+STUDENTS = 'students'
+
+# How long saves for a just-submitted draft are refused, so one in flight can't write it back
+TOMBSTONE_SECONDS = 60
+
+DRAFT_SAVES = Counter('exam_draft_saves_total', 'Draft autosaves received')
+DRAFT_WRITES = Counter('exam_draft_documents_written_total', 'Draft documents written to Firestore by the buffer')
+
+
+def draft_ref(exam_code: str, pern_no: str, client=None):
+    return (client or db).collection(DRAFTS).document(str(exam_code)).collection(STUDENTS).document(str(pern_no))
+
+
+@dataclass
+class _Draft:
+    answers: Dict = field(default_factory=dict)
+    revision: int = 0
+    saves: int = 0
+
+    def fields(self) -> Dict:
+        """The merge-set that adds these changes to the stored draft."""
+        return {
+            'answers': self.answers,
+            'revision': Maximum(self.revision),
+            'saves': Increment(self.saves),
+            'updated_at': SERVER_TIMESTAMP,
+        }
+
+
+class DraftBuffer:
+    """Write-behind buffer for autosaved answers.
+
+    Saves only update memory: changes for the same student are merged
+    question by question, and a background thread writes one document per
+    student with pending changes every `interval` seconds, in batches. So
+    Firestore sees at most one draft write per student per interval however
+    often students type. Drafts still in the buffer are lost if the process
+    dies; the page resends everything when a save is missing from the stored draft.
+    A deleted (submitted) draft is tombstoned for TOMBSTONE_SECONDS: saves that
+    arrive meanwhile are refused instead of creating it again.
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, str], _Draft] = {}
+        self._deleted: "OrderedDict[Tuple[str, str], float]" = OrderedDict()  # key -> monotonic time of delete
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="draft-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add(self, exam_code: str, pern_no: str, changes: Dict, revision: int) -> bool:
+        """Buffer a save; False if the draft was just submitted and the save is dropped."""
+        key = (exam_code, str(pern_no))
+        with self._lock:
+            deleted_at = self._deleted.get(key)
+            if deleted_at is not None and time.monotonic() - deleted_at < TOMBSTONE_SECONDS:
+                return False
+            draft = self._pending.setdefault(key, _Draft())
+            draft.answers.update(changes)
+            draft.revision = max(draft.revision, revision)
+            draft.saves += 1
+            full = len(self._pending) >= self.max_pending
+        DRAFT_SAVES.inc()
+        if full:
+            self._wake.set()  # flush early rather than grow without bound
+        return True
+
+    def pending(self, exam_code: str, pern_no: str) -> _Draft:
+        """A copy of the changes not yet written for this student."""
+        with self._lock:
+            draft = self._pending.get((exam_code, str(pern_no)))
+            return _Draft(dict(draft.answers), draft.revision, draft.saves) if draft else _Draft()
+
+    def discard(self, exam_code: str, pern_no: str) -> Optional[_Draft]:
+        with self._lock:
+            return self._pending.pop((exam_code, str(pern_no)), None)
+
+    def flush_student(self, exam_code: str, pern_no: str) -> None:
+        """Write this student's pending changes now, after any flush already under way."""
+        with self._flush_lock:
+            draft = self.discard(exam_code, pern_no)
+            if draft is None:
+                return
+            try:
+                draft_ref(exam_code, pern_no).set(draft.fields(), merge=True)
+            except Exception:
+                self._restore({(exam_code, str(pern_no)): draft})
+                raise
+            DRAFT_WRITES.inc()
+
+    def delete(self, exam_code: str, pern_no: str) -> None:
+        """Drop the student's draft, here and in Firestore, and tombstone it.
+
+        A flush under way finishes first and later saves are refused, so neither can write it back.
+        """
+        key = (exam_code, str(pern_no))
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+                now = time.monotonic()
+                while self._deleted and now - next(iter(self._deleted.values())) >= TOMBSTONE_SECONDS:
+                    self._deleted.popitem(last=False)
+                self._deleted.pop(key, None)
+                self._deleted[key] = now
+            draft_ref(exam_code, pern_no).delete()
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write every pending draft now; returns the number of documents written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                with ChunkedWriteBatch(db) as batch:
+                    for (exam_code, pern_no), draft in pending.items():
+                        batch.set(draft_ref(exam_code, pern_no), draft.fields(), merge=True)
+            except Exception:
+                self._restore(pending)
+                raise
+            DRAFT_WRITES.inc(len(pending))
+            return len(pending)
+
+    def _restore(self, pending: Dict[Tuple[str, str], _Draft]) -> None:
+        """Put back drafts whose write failed, under any changes that arrived since."""
+        with self._lock:
+            for key, draft in pending.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    draft.answers.update(newer.answers)
+                    draft.revision = max(draft.revision, newer.revision)
+                    draft.saves += newer.saves
+                self._pending[key] = draft
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("draft flush failed", extra={'pending': self.depth()})
+
+
+_draft_buffer: Optional[DraftBuffer] = None
+_draft_buffer_lock = threading.Lock()
+
+DRAFT_BUFFER_DEPTH = Gauge(
+    'exam_draft_buffer_students', 'Students with draft changes waiting to be written',
+    callback=lambda: _draft_buffer.depth() if _draft_buffer is not None else None,
+)
+
+
+def get_draft_buffer() -> DraftBuffer:
+    """The process-wide draft buffer, whose flusher starts on first use."""
+    global _draft_buffer
+    if _draft_buffer is None:
+        with _draft_buffer_lock:
+            if _draft_buffer is None:
+                buffer = DraftBuffer(settings.DRAFT_FLUSH_INTERVAL, settings.DRAFT_BUFFER_MAX_STUDENTS)
+                buffer.start()
+                _draft_buffer = buffer
+    return _draft_buffer
+
+
+async def aload_draft(exam_code: str, pern_no: str) -> Tuple[Dict, int, bool]:
+    """(answers, revision, complete) of the student's stored draft, once this worker's pending changes are in it.
+
+    `complete` is False when some save up to `revision` is not stored: held by
+    another worker's buffer, lost with a restart, or never received.
+    """
+    await sync_to_async(get_draft_buffer().flush_student, thread_sensitive=False)(exam_code, pern_no)
+    doc = await draft_ref(exam_code, pern_no, client=adb()).get()
+    stored = (doc.to_dict() or {}) if doc.exists else {}
+    revision = stored.get('revision', 0)
+    return stored.get('answers', {}), revision, stored.get('saves', 0) == revision
+
+
+async def adelete_draft(exam_code: str, pern_no: str) -> None:
+    """Drop a student's draft once the answers are submitted."""
+    await sync_to_async(get_draft_buffer().delete, thread_sensitive=False)(exam_code, pern_no)
@@ -0,0 +1,89 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+class TeacherEmbeddingCache:
+    """Two-tier cache of teacher-answer embeddings.
+
+    Keys are (model name, sha256 of the normalized teacher text). Lookups hit an
+    in-memory LRU first and fall back to a local SQLite file, so every worker on
+    the box shares embeddings and restarts come up warm.
+    """
+
+    def __init__(self, model_name: str, path: Optional[Path] = None, max_items: int = 4096):
+        self.model_name = model_name
+        self.max_items = max_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS teacher_embeddings ("
+                " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def text_hash(normalized_text: str) -> str:
+        return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+    def get_many(self, normalized_texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the cached embedding for every text that has one."""
+        found: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for text in normalized_texts:
+                h = self.text_hash(text)
+                if h in self._memory:
+                    self._memory.move_to_end(h)
+                    found[text] = self._memory[h]
+                else:
+                    missing[h] = text
+
+            if missing and self._conn is not None:
+                hashes = list(missing)
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT text_hash, vector FROM teacher_embeddings WHERE model = ? AND text_hash IN (%s)"
+                        % ",".join("?" * len(chunk)),
+                        [self.model_name, *chunk],
+                    ).fetchall()
+                    for h, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(h, vec)
+                        found[missing[h]] = vec
+        return found
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """Store embeddings (keyed by normalized text) in both tiers."""
+        if not embeddings:
+            return
+        rows = []
+        with self._lock:
+            for text, vec in embeddings.items():
+                h = self.text_hash(text)
+                vec = np.asarray(vec, dtype=np.float32)
+                self._remember(h, vec)
+                rows.append((self.model_name, h, vec.tobytes()))
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO teacher_embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows
+                )
+                self._conn.commit()
+
+    def _remember(self, h: str, vec: np.ndarray) -> None:
+        self._memory[h] = vec
+        self._memory.move_to_end(h)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
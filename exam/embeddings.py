@@ -0,0 +1,143 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+# ==============================
+# EMBEDDING BACKENDS
+# ==============================
+class EmbeddingBackend:
+    """Turns texts into unit-normalized float32 embeddings, one row per text."""
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the embedding space, e.g. for TeacherEmbeddingCache keys."""
+        return f"{self.model_name}:{self.name}"
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """PyTorch SentenceTransformer in fp32 (the original grader setup)."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    @property
+    def cache_key(self) -> str:
+        return self.model_name  # keeps cache entries written before backends existed
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """The same model exported to ONNX (int8 dynamic quantization) and run with ONNX Runtime on CPU.
+
+    `model_dir` is produced by `manage.py export_onnx_model` and holds
+    `model.onnx` plus the tokenizer files. Mean pooling + L2 normalization
+    mirror the SentenceTransformer pipeline of all-MiniLM-L6-v2.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_name: str, model_dir: Path, max_length: int = 256):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer  # not transformers: that would pull torch back in
+
+        model_dir = Path(model_dir)
+        if not (model_dir / "model.onnx").exists():
+            raise FileNotFoundError(
+                f"No ONNX model in {model_dir}; run `python manage.py export_onnx_model` first"
+            )
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_dir / "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        out = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            batch = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            feeds = {k: v for k, v in batch.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(out).astype(np.float32)
+
+
+def make_backend(kind: str, model_name: str, onnx_model_dir: Path = None) -> EmbeddingBackend:
+    """Backend by setting value: 'torch' (default) or 'onnx'."""
+    if kind == "onnx":
+        return OnnxEmbeddingBackend(model_name, onnx_model_dir)
+    if kind == "torch":
+        return SentenceTransformerBackend(model_name)
+    raise ValueError(f"Unknown embedding backend: {kind!r}")
+
+
+def export_onnx_model(model_name: str, out_dir: Path, quantize: bool = True, opset: int = 17) -> Path:
+    """Export the SentenceTransformer's transformer to ONNX, optionally int8-quantized, plus its tokenizer."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+    tokenizer.save_pretrained(str(out_dir))
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = out_dir / ("model.fp32.onnx" if quantize else "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[k] for k in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(out_dir / "model.onnx"), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+    return out_dir / "model.onnx"
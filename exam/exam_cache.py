@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .firebase_config import adb, db
+from .metrics import Counter
+from .question_store import aload_questions, load_questions
+
+# cache_versions/exams = {<exam_code>: <int>}, bumped whenever an exam or its questions change
+VERSIONS_COLLECTION = 'cache_versions'
+VERSIONS_DOC = 'exams'
+
+EXAM_CACHE_LOOKUPS = Counter('exam_cache_lookups_total', 'Exam metadata/question cache lookups', ('kind', 'result'))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    version: int
+    checked_at: float
+
+
+class ExamCache:
+    """In-process LRU for exam metadata and question sets, which are read-only while an exam runs.
+
+    An entry is served without any Firestore read for `ttl` seconds. After
+    that it is revalidated against a shared version stamp document (one small
+    read per TTL for all exams), and only reloaded if that exam's version
+    changed. `invalidate()` bumps the stamp, so every worker picks up an
+    upload or an activation change within one TTL.
+    """
+
+    def __init__(self, ttl: float, max_items: int = 256):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._versions_checked_at = float('-inf')
+        self._versions_inflight: Dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, exam_code: str, loader: Callable[[str], Any]) -> Any:
+        key = (kind, exam_code)
+        now = time.monotonic()
+        entry = self._fresh(key, now)
+        if entry is not None and now - entry.checked_at < self.ttl:
+            return entry.value
+
+        version = self._current_versions(now).get(exam_code, 0)
+        if entry is not None and entry.version == version:
+            return self._revalidated(kind, entry, now)
+        return self._store(kind, key, loader(exam_code), version, now)  # read after the version, so never older
+
+    async def aget(self, kind: str, exam_code: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+        """get() for async views; `loader` is a coroutine function."""
+        key = (kind, exam_code)
+        now = time.monotonic()
+        entry = self._fresh(key, now)
+        if entry is not None and now - entry.checked_at < self.ttl:
+            return entry.value
+
+        version = (await self._acurrent_versions(now)).get(exam_code, 0)
+        if entry is not None and entry.version == version:
+            return self._revalidated(kind, entry, now)
+        return self._store(kind, key, await loader(exam_code), version, now)
+
+    def _fresh(self, key, now: float) -> Optional[_Entry]:
+        """The cached entry, counting a hit when it is still inside its TTL."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.ttl:
+                self._entries.move_to_end(key)
+                EXAM_CACHE_LOOKUPS.inc(kind=key[0], result='hit')
+        return entry
+
+    def _revalidated(self, kind: str, entry: _Entry, now: float) -> Any:
+        with self._lock:
+            entry.checked_at = now
+        EXAM_CACHE_LOOKUPS.inc(kind=kind, result='revalidated')
+        return entry.value
+
+    def _store(self, kind: str, key, value: Any, version: int, now: float) -> Any:
+        with self._lock:
+            self._entries[key] = _Entry(value, version, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        EXAM_CACHE_LOOKUPS.inc(kind=kind, result='miss')
+        return value
+
+    def invalidate(self, exam_code: str) -> None:
+        """Drop this worker's entries for the exam and bump its version for all other workers."""
+        from google.cloud.firestore_v1 import Increment
+
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == exam_code]:
+                del self._entries[key]
+            self._versions_checked_at = float('-inf')
+        db.collection(VERSIONS_COLLECTION).document(VERSIONS_DOC).set({exam_code: Increment(1)}, merge=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions = {}
+            self._versions_checked_at = float('-inf')
+
+    def _current_versions(self, now: float) -> Dict[str, int]:
+        with self._lock:
+            if now - self._versions_checked_at < self.ttl:
+                return self._versions
+        doc = db.collection(VERSIONS_COLLECTION).document(VERSIONS_DOC).get()
+        return self._set_versions((doc.to_dict() or {}) if doc.exists else {}, now)
+
+    def _set_versions(self, versions: Dict[str, int], now: float) -> Dict[str, int]:
+        with self._lock:
+            self._versions = versions
+            self._versions_checked_at = now
+        return versions
+
+    async def _acurrent_versions(self, now: float) -> Dict[str, int]:
+        """_current_versions() for async views; concurrent requests on one loop share a single stamp read."""
+        with self._lock:
+            if now - self._versions_checked_at < self.ttl:
+                return self._versions
+        loop = asyncio.get_running_loop()
+        pending = self._versions_inflight.get(loop)
+        if pending is None:
+            pending = self._versions_inflight[loop] = loop.create_task(self._aread_versions())
+            pending.add_done_callback(lambda _: self._versions_inflight.pop(loop, None))
+        return self._set_versions(await asyncio.shield(pending), now)
+
+    async def _aread_versions(self) -> Dict[str, int]:
+        doc = await adb().collection(VERSIONS_COLLECTION).document(VERSIONS_DOC).get()
+        return (doc.to_dict() or {}) if doc.exists else {}
+
+
+_exam_cache = ExamCache(settings.EXAM_CACHE_TTL, settings.EXAM_CACHE_SIZE)
+
+
+def _load_exam(exam_code: str) -> Optional[Dict]:
+    doc = db.collection('exam_codes').document(str(exam_code)).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def get_exam(exam_code: str) -> Optional[Dict]:
+    """The `exam_codes/<code>` document as a dict (None if there is no such exam). Treat as read-only."""
+    if not exam_code:
+        return None
+    return _exam_cache.get('exam', exam_code, _load_exam)
+
+
+def get_questions(exam_code: str) -> List[Dict]:
+    """The exam's question set (see question_store.load_questions). Treat as read-only."""
+    if not exam_code:
+        return []
+    return _exam_cache.get('questions', exam_code, load_questions)
+
+
+async def _aload_exam(exam_code: str) -> Optional[Dict]:
+    doc = await adb().collection('exam_codes').document(str(exam_code)).get()
+    return doc.to_dict() if doc.exists else None
+
+
+async def aget_exam(exam_code: str) -> Optional[Dict]:
+    """get_exam() for async views."""
+    if not exam_code:
+        return None
+    return await _exam_cache.aget('exam', exam_code, _aload_exam)
+
+
+async def aget_questions(exam_code: str) -> List[Dict]:
+    """get_questions() for async views."""
+    if not exam_code:
+        return []
+    return await _exam_cache.aget('questions', exam_code, aload_questions)
+
+
+def invalidate_exam(exam_code: str) -> None:
+    """Call after changing an exam's metadata or questions."""
+    _exam_cache.invalidate(exam_code)
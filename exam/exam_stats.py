@@ -0,0 +1,235 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, Increment, Maximum, Minimum, transactional
+
+from .firebase_config import db
+from .firestore_batch import ChunkedWriteBatch
+from .queries import exists, projected
+from .search import SEARCH_FIELD, search_tokens
+
+logger = logging.getLogger(__name__)
+
+# exam_stats/<exam_code> holds running totals over the graded submissions of one exam:
+#   count, percentage_sum, min_percentage, max_percentage,
+#   ranges    {'fail', 'pass', 'excellent': n}
+#   histogram {'0'..'9': n}                  (10% bins, 100% counted in '9')
+#   timeline  {'2026-01-31T09:05': {'count', 'sum'}}   (TIMELINE_MINUTES buckets)
+#   version   bumped by every change, so a rebuild can tell whether grading touched them meanwhile
+EXAM_STATS = 'exam_stats'
+
+# What a submission currently contributes to those totals ({'percentage', 'slot'}).
+# It survives re-submission, so re-grading replaces the old contribution
+# instead of adding a second one.
+STATS_FIELD = 'stats_counted'
+
+TIMELINE_MINUTES = 5
+
+# A rebuild whose scan keeps being overtaken by grading gives up after this many scans
+MAX_REBUILD_ATTEMPTS = 3
+
+
+def stats_ref(exam_code: str):
+    return db.collection(EXAM_STATS).document(str(exam_code))
+
+
+def score_range(percentage: float) -> str:
+    if percentage < 40:
+        return 'fail'
+    if percentage < 70:
+        return 'pass'
+    return 'excellent'
+
+
+def timeline_slot(timestamp) -> Optional[str]:
+    if not hasattr(timestamp, 'strftime'):
+        return None
+    minute = timestamp.minute - timestamp.minute % TIMELINE_MINUTES
+    return timestamp.replace(minute=minute, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M')
+
+
+def contribution(submission: Dict) -> Optional[Dict]:
+    """What a graded submission adds to its exam's totals; None if it has no score yet."""
+    percentage = submission.get('percentage')
+    if percentage is None:
+        return None
+    return {'percentage': float(percentage), 'slot': timeline_slot(submission.get('timestamp'))}
+
+
+def _accumulate(totals: Dict, contrib: Optional[Dict], sign: int = 1) -> None:
+    if not contrib:
+        return
+    p = contrib['percentage']
+    totals[('count',)] += sign
+    totals[('percentage_sum',)] += sign * p
+    totals[('ranges', score_range(p))] += sign
+    totals[('histogram', str(min(int(p // 10), 9)))] += sign
+    if contrib.get('slot'):
+        totals[('timeline', contrib['slot'], 'count')] += sign
+        totals[('timeline', contrib['slot'], 'sum')] += sign * p
+
+
+def _nest(flat: Dict, wrap=lambda v: v) -> Dict:
+    nested: Dict = {}
+    for path, value in flat.items():
+        node = nested
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = wrap(value)
+    return nested
+
+
+def stats_delta(previous: Optional[Dict], current: Optional[Dict]) -> Dict:
+    """A merge-set payload that swaps `previous` for `current` in the totals.
+
+    min/max can only widen incrementally; a lowered score leaves them stale
+    until the next rebuild.
+    """
+    totals: Dict = defaultdict(int)
+    _accumulate(totals, previous, -1)
+    _accumulate(totals, current, +1)
+    delta = _nest({path: v for path, v in totals.items() if v}, Increment)
+    if current:
+        delta['min_percentage'] = Minimum(current['percentage'])
+        delta['max_percentage'] = Maximum(current['percentage'])
+    if delta:
+        delta['version'] = Increment(1)
+        delta['updated_at'] = SERVER_TIMESTAMP
+    return delta
+
+
+def save_graded_result(ref, exam_code: str, fields: Dict) -> None:
+    """Store grading results on a submission and fold them into the exam's totals atomically."""
+
+    @transactional
+    def _apply(transaction):
+        snapshot = ref.get(transaction=transaction)
+        data = snapshot.to_dict() or {}
+        previous = data.get(STATS_FIELD)
+        current = contribution({**data, **fields})
+        transaction.update(ref, {**fields, STATS_FIELD: current, 'updated_at': SERVER_TIMESTAMP})
+        delta = stats_delta(previous, current)
+        if delta:
+            transaction.set(stats_ref(exam_code), delta, merge=True)
+
+    _apply(db.transaction())
+
+
+def compute_stats(contributions: Iterable[Dict]) -> Dict:
+    totals: Dict = defaultdict(int)
+    percentages = []
+    for contrib in contributions:
+        _accumulate(totals, contrib)
+        percentages.append(contrib['percentage'])
+    stats = _nest(totals)
+    stats['count'] = len(percentages)
+    stats['percentage_sum'] = sum(percentages)
+    if percentages:
+        stats['min_percentage'] = min(percentages)
+        stats['max_percentage'] = max(percentages)
+    return stats
+
+
+def rebuild_exam_stats(exam_code: str, client=None) -> Dict:
+    """Recompute exam_stats/<exam_code> from the raw submissions (one read per submission).
+
+    Graded submissions count with their current score; pending or failed
+    re-submissions keep counting their last graded score, as they do
+    incrementally. Submissions whose recorded contribution is wrong, or that
+    predate the `status` or search token fields, are fixed.
+
+    Submissions are read and fixed outside any transaction; only the final
+    write of the totals is transactional, and it goes ahead only if the
+    aggregate's `version` is still the one read before the scan. If grading
+    changed it meanwhile, the scan runs again (the grade may have been
+    missed, or a fix may have overwritten its contribution).
+    """
+    client = client or db
+    ref = client.collection(EXAM_STATS).document(str(exam_code))
+
+    @transactional
+    def _replace_if_unchanged(transaction, version, stats):
+        snapshot = ref.get(transaction=transaction)
+        if (snapshot.to_dict() or {}).get('version', 0) != version:
+            return False
+        transaction.set(ref, {
+            **stats, 'version': version + 1, 'updated_at': SERVER_TIMESTAMP, 'rebuilt_at': SERVER_TIMESTAMP,
+        })
+        return True
+
+    fixed = 0
+    for attempt in range(1, MAX_REBUILD_ATTEMPTS + 1):
+        version = (ref.get().to_dict() or {}).get('version', 0)
+        seen, contributions, attempt_fixed = _scan_submissions(client, exam_code)
+        fixed += attempt_fixed
+        stats = compute_stats(contributions)
+        if _replace_if_unchanged(client.transaction(), version, stats):
+            break
+        logger.info("exam graded during stats rebuild; scanning again", extra={'exam_code': exam_code, 'attempt': attempt})
+    else:
+        raise RuntimeError(f"exam {exam_code} kept being graded during {MAX_REBUILD_ATTEMPTS} stats rebuilds")
+
+    report = {'submissions': seen, 'counted': stats['count'], 'fixed': fixed}
+    logger.info("rebuilt exam stats", extra={'exam_code': exam_code, **report})
+    return report
+
+
+def _scan_submissions(client, exam_code: str):
+    """(submissions seen, their contributions, submissions fixed) from one pass over an exam's submissions."""
+    from .grading_queue import STATUS_GRADED
+
+    submissions = client.collection('results').document(str(exam_code)).collection('submissions')
+    fields = ['status', 'percentage', 'timestamp', STATS_FIELD, 'student_name', 'pern_no', SEARCH_FIELD]
+    contributions, fixed, seen = [], 0, 0
+    with ChunkedWriteBatch(client) as batch:
+        for doc in projected(submissions, fields):
+            seen += 1
+            data = doc.to_dict()
+            if data.get('status', STATUS_GRADED) == STATUS_GRADED:
+                contrib = contribution(data)
+                fix = {STATS_FIELD: contrib} if contrib != data.get(STATS_FIELD) else {}
+                if 'status' not in data and contrib:
+                    fix['status'] = STATUS_GRADED  # graded before statuses existed
+                if SEARCH_FIELD not in data:
+                    fix[SEARCH_FIELD] = search_tokens(data.get('student_name'), data.get('pern_no'))
+                if fix:
+                    batch.update(submissions.document(doc.id), fix)
+                    fixed += 1
+            else:
+                contrib = data.get(STATS_FIELD)
+            if contrib:
+                contributions.append(contrib)
+    return seen, contributions, fixed
+
+
+def summarize(stats: Dict) -> Dict:
+    """The admin_stats view of an aggregate document."""
+    count = int(stats.get('count', 0))
+    ranges = stats.get('ranges', {})
+    timeline = stats.get('timeline', {})
+    slots = sorted(slot for slot, bucket in timeline.items() if bucket.get('count'))
+    return {
+        'total': count,
+        'avg': stats.get('percentage_sum', 0) / count if count else 0.0,
+        'max': float(stats.get('max_percentage', 0)) if count else 0.0,
+        'min': float(stats.get('min_percentage', 0)) if count else 0.0,
+        'ranges': [int(ranges.get(name, 0)) for name in ('fail', 'pass', 'excellent')],
+        'timeline': slots,
+        'avg_scores': [timeline[slot]['sum'] / timeline[slot]['count'] for slot in slots],
+    }
+
+
+def load_exam_stats(exam_code: str, client=None) -> Dict:
+    """Summary of an exam's results from its aggregate document (one read).
+
+    Never rebuilds: an exam with graded submissions but no aggregate (graded
+    before aggregates existed) gets an empty summary with `pending` set
+    until `manage.py rebuild_exam_stats` has run for it.
+    """
+    client = client or db
+    doc = client.collection(EXAM_STATS).document(str(exam_code)).get()
+    if doc.exists:
+        return {**summarize(doc.to_dict()), 'pending': False}
+    submissions = client.collection('results').document(str(exam_code)).collection('submissions')
+    return {**summarize({}), 'pending': exists(submissions.where('percentage', '>=', 0))}
@@ -0,0 +1,172 @@
+import csv
+import importlib.util
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+# (submission field, column header) of the results export, in column order.
+# Per-question details are left to the analytics archive (manage.py export_results).
+EXPORT_COLUMNS = [
+    ('pern_no', 'Perno'),
+    ('student_name', 'student_name'),
+    ('status', 'status'),
+    ('total_score', 'total_score'),
+    ('total_max_score', 'total_max_score'),
+    ('percentage', 'percentage'),
+    ('total_questions', 'total_questions'),
+    ('timestamp', 'Submission Time'),
+    ('graded_at', 'Graded At'),
+]
+EXPORT_FIELDS = [field for field, _ in EXPORT_COLUMNS]
+EXPORT_HEADERS = [header for _, header in EXPORT_COLUMNS]
+TIMESTAMP_FIELDS = {'timestamp', 'graded_at'}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def _naive_utc(value):
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_rows(pages: Iterable[List]) -> Iterator[List]:
+    """One list of EXPORT_FIELDS values per submission; only the known timestamp fields are converted."""
+    for page in pages:
+        for doc in page:
+            data = doc.to_dict()
+            yield [
+                _naive_utc(data.get(field)) if field in TIMESTAMP_FIELDS else data.get(field)
+                for field in EXPORT_FIELDS
+            ]
+
+
+class _Echo:
+    """A write-only file whose write() hands the data back, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows: Iterable[List]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow(['' if v is None else v for v in row])
+
+
+def xlsx_file(rows: Iterable[List], sheet_name: str = 'Results'):
+    """Write the rows to a temporary .xlsx with XlsxWriter's constant_memory mode; returns the open file.
+
+    Rows are flushed to disk as they are written, so memory stays flat. The
+    workbook is only a valid zip once closed, so it cannot go out before the
+    last row is in.
+    """
+    import xlsxwriter
+
+    out = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook = xlsxwriter.Workbook(out, {'constant_memory': True, 'remove_timezone': True})
+    sheet = workbook.add_worksheet(sheet_name)
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    sheet.write_row(0, 0, EXPORT_HEADERS)
+    for r, row in enumerate(rows, start=1):
+        for c, value in enumerate(row):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                sheet.write_datetime(r, c, value, date_format)
+            else:
+                sheet.write(r, c, value)
+    workbook.close()
+    out.seek(0)
+    return out
+
+
+class _Drain:
+    """A file-like sink for pyarrow that keeps only what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def parquet_supported() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def parquet_types() -> Dict:
+    """The pyarrow type of each EXPORT_FIELDS column; fixed, so an all-null batch can't change it."""
+    import pyarrow as pa
+
+    return {
+        'pern_no': pa.string(),
+        'student_name': pa.string(),
+        'status': pa.string(),
+        'total_score': pa.float64(),
+        'total_max_score': pa.float64(),
+        'percentage': pa.float64(),
+        'total_questions': pa.int64(),
+        'timestamp': pa.timestamp('us'),
+        'graded_at': pa.timestamp('us'),
+    }
+
+
+def arrow_table(rows: Iterable[Sequence], schema):
+    """A pyarrow table of `schema` from rows of values in column order; string columns take str() of any value."""
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) or [()] * len(schema)
+    arrays = [
+        pa.array([v if v is None or field.type != pa.string() else str(v) for v in values], field.type)
+        for field, values in zip(schema, columns)
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def parquet_stream(rows: Iterable[List], row_group_size: int = 5000) -> Iterator[bytes]:
+    """Parquet bytes, one row group at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = parquet_types()
+    schema = pa.schema([(field, types[field]) for field in EXPORT_FIELDS])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    def write(batch):
+        writer.write_table(arrow_table(batch, schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
@@ -1,73 +1,111 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 from django.conf import settings
+import asyncio
+import logging
 import os
+import threading
+import weakref
+
+from .metrics import instrument_firestore
+
+logger = logging.getLogger(__name__)
 
 # Global variable to store db connection
 _db = None
 _initialized = False
+_lock = threading.Lock()
 
 def get_firestore_client():
     """
     Lazily initialize Firebase and return Firestore client
-    This function is called when database is needed
+    This function is called when database is needed; returns None when
+    Firebase is not configured (the failure is logged once per process)
     """
     global _db, _initialized
     
     # If already initialized, return existing connection
-    if _initialized and _db is not None:
+    if _initialized:
         return _db
-    
+
+    with _lock:
+        if not _initialized:
+            _db = _connect()
+            _initialized = True
+    return _db
+
+def _connect():
     try:
         # Get credentials path from settings
         cred_path = settings.FIREBASE_CRED
         
-        print(f"🔍 Looking for Firebase credentials at: {cred_path}")
-        
         # Check if file exists
         if not os.path.exists(cred_path):
-            print(f"❌ ERROR: Firebase credentials file not found at {cred_path}")
-            print(f"   Please ensure 'firebase-credentials.json' is in your project root folder")
+            logger.error("Firebase credentials file not found", extra={'cred_path': str(cred_path)})
             return None
-        
-        print(f"✅ Found credentials file: {cred_path}")
+
+        import firebase_admin
+        from firebase_admin import credentials, firestore
         
         # Initialize Firebase if not already done
         if not firebase_admin._apps:
-            print("🔌 Initializing Firebase...")
             cred = credentials.Certificate(str(cred_path))
             firebase_admin.initialize_app(cred)
-            print("✅ Firebase initialized successfully!")
-        else:
-            print("ℹ️  Firebase already initialized")
+            logger.info("Firebase initialized", extra={'cred_path': str(cred_path)})
         
         # Get Firestore client
-        _db = firestore.client()
-        _initialized = True
-        
-        print("✅ Connected to Firestore!")
-        return _db
+        instrument_firestore()
+        return firestore.client()
     
     except FileNotFoundError as e:
-        print(f"❌ File not found: {e}")
+        logger.error("Firebase credentials file not found: %s", e)
         return None
     
     except ValueError as e:
-        print(f"❌ Invalid credentials: {e}")
+        logger.error("Invalid Firebase credentials: %s", e)
         return None
     
     except Exception as e:
-        print(f"❌ Error connecting to Firebase: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error connecting to Firebase")
         return None
 
-# Initialize on first import (attempt, won't fail if credentials missing)
-try:
-    print("📦 Loading firebase_config module...")
-    get_firestore_client()
-except Exception as e:
-    print(f"⚠️  Warning during firebase_config load: {e}")
+class _LazyClient:
+    """Stands in for the Firestore client so importing `db` never connects; the first attribute access does."""
+
+    def __getattr__(self, name):
+        client = get_firestore_client()
+        if client is None:
+            raise RuntimeError("Firestore is not configured; check settings.FIREBASE_CRED")
+        return getattr(client, name)
+
+    def __bool__(self):
+        return get_firestore_client() is not None
 
 # Export for use in views
-db = get_firestore_client()
+db = _LazyClient()
+
+
+# ==================== ASYNC CLIENT (ASGI views) ====================
+# gRPC aio channels belong to the event loop that created them, so there is
+# one AsyncClient per loop: one per worker under ASGI, one per request when
+# async views run under WSGI.
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_firestore_client():
+    """The Firestore AsyncClient for the running event loop, sharing the sync client's Firebase app."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if get_firestore_client() is None:  # initializes the Firebase app, or logs why it can't
+            raise RuntimeError("Firestore is not configured; check settings.FIREBASE_CRED")
+        import firebase_admin
+        from google.cloud.firestore import AsyncClient
+
+        app = firebase_admin.get_app()
+        client = AsyncClient(credentials=app.credential.get_credential(), project=app.project_id)
+        _async_clients[loop] = client
+    return client
+
+
+def adb():
+    """Shorthand for get_async_firestore_client(), mirroring `db`."""
+    return get_async_firestore_client()
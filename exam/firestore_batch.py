@@ -0,0 +1,61 @@
+import json
+from typing import Dict, Optional
+
+# Firestore limits: 500 writes per commit and 10 MiB per request (keep headroom for overhead)
+MAX_BATCH_OPS = 500
+MAX_BATCH_BYTES = 9 * 1024 * 1024
+
+
+def _approx_size(data: Optional[Dict]) -> int:
+    return len(json.dumps(data, default=str).encode('utf-8')) if data else 0
+
+
+class ChunkedWriteBatch:
+    """A WriteBatch that commits itself whenever the next write would break Firestore's limits.
+
+    Each commit is atomic on its own; callers that need all-or-nothing
+    visibility across chunks should write new documents first and switch a
+    pointer document last (see question_store.save_questions).
+    """
+
+    def __init__(self, db, max_ops: int = MAX_BATCH_OPS, max_bytes: int = MAX_BATCH_BYTES):
+        self._db = db
+        self.max_ops = max_ops
+        self.max_bytes = max_bytes
+        self._batch = None
+        self._ops = 0
+        self._bytes = 0
+        self.commits = 0
+        self.writes = 0
+
+    def set(self, ref, data: Dict, merge: bool = False) -> None:
+        self._current(_approx_size(data)).set(ref, data, merge=merge)
+
+    def update(self, ref, data: Dict) -> None:
+        self._current(_approx_size(data)).update(ref, data)
+
+    def delete(self, ref) -> None:
+        self._current(0).delete(ref)
+
+    def commit(self) -> None:
+        if self._batch is not None and self._ops:
+            self._batch.commit()
+            self.commits += 1
+            self.writes += self._ops
+        self._batch, self._ops, self._bytes = None, 0, 0
+
+    def _current(self, size: int):
+        if self._batch is not None and (self._ops >= self.max_ops or self._bytes + size > self.max_bytes):
+            self.commit()
+        if self._batch is None:
+            self._batch = self._db.batch()
+        self._ops += 1
+        self._bytes += size
+        return self._batch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
@@ -0,0 +1,112 @@
+from typing import Dict, List, Tuple
+
+from .ai_service import DescriptiveAnswerGrader
+
+
+def _grade_mcq(q: Dict, user_ans: Dict) -> Tuple[float, Dict]:
+    selected = user_ans.get('selectedOption', '')
+    correct_letter = q['teacher_answer']
+    options = q.get('options', [])
+
+    correct_index = ord(correct_letter.upper()) - ord('A')
+    correct_option = options[correct_index] if correct_index < len(options) else ''
+
+    is_correct = selected == correct_option
+    q_score = q['max_score'] if is_correct else 0.0
+    return q_score, {'type': 'MCQ', 'correct': is_correct, 'max_score': q['max_score']}
+
+
+def grade_answers(questions: List[Dict], answers: Dict, grader: DescriptiveAnswerGrader) -> Tuple[float, List[Dict]]:
+    """Score one submission. Returns (total score, per-question details)."""
+    return grade_answer_sets(questions, [answers], grader)[0]
+
+
+def grade_answer_sets(
+    questions: List[Dict], answer_sets: List[Dict], grader: DescriptiveAnswerGrader
+) -> List[Tuple[float, List[Dict]]]:
+    """Score any number of submissions to the same questions.
+
+    MCQs are checked inline; every answered descriptive question of every
+    submission goes to the grader in a single `grade_many` call.
+    """
+    cfgs = {q['id']: grader.config_for(q) for q in questions if q['type'] != 'mcq'}
+    scored: List[Dict[str, Tuple[float, Dict]]] = [{} for _ in answer_sets]
+    pending: List[Tuple[int, Dict]] = []
+    pending_cfgs, pending_answers = [], []
+
+    for n, answers in enumerate(answer_sets):
+        for q in questions:
+            q_id = q['id']
+            user_ans = answers.get(q_id, {})
+            if q['type'] == 'mcq':
+                scored[n][q_id] = _grade_mcq(q, user_ans)
+                continue
+
+            student_ans = user_ans.get('answer', '')
+            if not student_ans.strip():
+                scored[n][q_id] = (0.0, {'type': 'Descriptive', 'score': 0.0, 'max_score': q['max_score']})
+            else:
+                pending.append((n, q))
+                pending_cfgs.append(cfgs[q_id])
+                pending_answers.append(student_ans)
+
+    if pending_cfgs:
+        for (n, q), result in zip(pending, grader.grade_many(pending_cfgs, pending_answers)):
+            scored[n][q['id']] = (result['final_score'], {
+                'type': 'Descriptive',
+                'concept_score': result['concept_score'],
+                'relation_score': result['relation_score'],
+                'semantic_similarity': result['semantic_similarity'],
+                'penalty': result['penalty'],
+                'max_score': q['max_score'],
+            })
+
+    graded = []
+    for answers, submission_scores in zip(answer_sets, scored):
+        score = 0.0
+        result_details = []
+        for q in questions:
+            q_id = q['id']
+            user_ans = answers.get(q_id, {})
+            q_score, details = submission_scores[q_id]
+            score += q_score
+            result_details.append({
+                'q_id': q_id,
+                'question': q['question'][:100] + '...' if len(q['question']) > 100 else q['question'],
+                'your_answer': user_ans.get('answer', user_ans.get('selectedOption', '')),
+                'score': round(q_score, 1),
+                'details': details
+            })
+        graded.append((score, result_details))
+    return graded
+
+
+def score_submission(questions: List[Dict], answers: Dict, grader: DescriptiveAnswerGrader) -> Dict:
+    """Grade a submission and return the result fields stored on its Firestore document."""
+    return score_submissions(questions, [answers], grader)[0]
+
+
+def score_submissions(questions: List[Dict], answer_sets: List[Dict], grader: DescriptiveAnswerGrader) -> List[Dict]:
+    """`score_submission` for many submissions, graded in one batch."""
+    total_max = sum(q.get('max_score', 1.0) for q in questions)
+    return [
+        {
+            'total_score': float(score),
+            'total_questions': len(questions),
+            'total_max_score': total_max,
+            'percentage': round((score / total_max) * 100, 1) if total_max else 0.0,
+            'details': result_details,
+        }
+        for score, result_details in grade_answer_sets(questions, answer_sets, grader)
+    ]
+
+
+def answers_from_details(details: List[Dict], questions: List[Dict]) -> Dict:
+    """Rebuild the raw answers of a submission stored before raw answers were kept."""
+    types = {q['id']: q['type'] for q in questions}
+    answers = {}
+    for d in details:
+        value = d.get('your_answer', '')
+        key = 'selectedOption' if types.get(d.get('q_id')) == 'mcq' else 'answer'
+        answers[d.get('q_id')] = {key: value}
+    return answers
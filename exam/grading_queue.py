@@ -0,0 +1,172 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from .ai_service import get_grader
+from .exam_stats import save_graded_result
+from .firebase_config import db
+from .grading import score_submission
+from .metrics import GRADING_JOB_LATENCY, GRADING_JOBS, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Submission lifecycle, stored in the `status` field of results/<code>/submissions/<pern_no>
+STATUS_PENDING = 'pending'
+STATUS_GRADING = 'grading'
+STATUS_GRADED = 'graded'
+STATUS_FAILED = 'failed'
+
+# Set by grading; cleared when the student submits again
+GRADED_FIELDS = ('total_score', 'percentage', 'details', 'graded_at', 'error')
+
+
+@dataclass
+class GradingJob:
+    exam_code: str
+    pern_no: str
+    answers: Dict
+    questions: List[Dict]
+
+    @property
+    def key(self) -> str:
+        return f"{self.exam_code}/{self.pern_no}"
+
+
+def submission_ref(exam_code: str, pern_no: str, client=None):
+    """results/<exam_code>/submissions/<pern_no>; pass the async client to get an AsyncDocumentReference."""
+    return (client or db).collection('results').document(exam_code).collection('submissions').document(str(pern_no))
+
+
+class GradingQueue:
+    """Bounded in-process queue feeding a small pool of grading threads.
+
+    Answers are already stored (status=pending) before a job is queued, so a
+    full queue or a restart never loses a submission: pending documents can be
+    re-graded with `manage.py regrade_exam`.
+    """
+
+    MAX_TRACKED = 10000  # recent job statuses kept in memory for polling
+
+    def __init__(self, workers: int, maxsize: int):
+        self._queue: "queue.Queue[GradingJob]" = queue.Queue(maxsize=maxsize)
+        self._status: Dict[str, str] = {}
+        self._status_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"grading-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, job: GradingJob, timeout: float = 1.0) -> bool:
+        """Queue a job; False when the queue stays full for `timeout` seconds."""
+        # Marked pending first: once queued, a worker may move it on to grading at any moment
+        with self._status_lock:
+            previous = self._status.get(job.key)
+        self._set_status(job.key, STATUS_PENDING)
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            self._restore_status(job.key, previous)
+            return False
+        return True
+
+    def status(self, exam_code: str, pern_no: str) -> Optional[str]:
+        """Status of a job this process has seen, without a Firestore read."""
+        with self._status_lock:
+            return self._status.get(f"{exam_code}/{pern_no}")
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _set_status(self, key: str, status: str) -> None:
+        with self._status_lock:
+            self._status.pop(key, None)
+            self._status[key] = status
+            while len(self._status) > self.MAX_TRACKED:
+                self._status.pop(next(iter(self._status)))
+
+    def _restore_status(self, key: str, previous: Optional[str]) -> None:
+        with self._status_lock:
+            if self._status.get(key) != STATUS_PENDING:
+                return  # changed since
+            if previous is None:
+                del self._status[key]
+            else:
+                self._status[key] = previous
+
+    def _run(self) -> None:
+        try:
+            get_grader()  # warm the models before taking the first job
+        except Exception:
+            logger.exception("grader warm-up failed")
+        while True:
+            job = self._queue.get()
+            try:
+                self._grade(job)
+            except Exception:
+                # never let one job take the worker down; the submission stays pending for regrade_exam
+                logger.exception("grading job crashed", extra={'exam_code': job.exam_code, 'pern_no': job.pern_no})
+            finally:
+                self._queue.task_done()
+
+    def _grade(self, job: GradingJob) -> None:
+        ref = submission_ref(job.exam_code, job.pern_no)
+        self._set_status(job.key, STATUS_GRADING)
+        started = time.perf_counter()
+        try:
+            result = score_submission(job.questions, job.answers, get_grader())
+            save_graded_result(ref, job.exam_code, {**result, 'status': STATUS_GRADED, 'graded_at': SERVER_TIMESTAMP})
+            self._set_status(job.key, STATUS_GRADED)
+            GRADING_JOBS.inc(status=STATUS_GRADED)
+            logger.info("submission graded", extra={
+                'exam_code': job.exam_code,
+                'pern_no': job.pern_no,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            })
+        except Exception as e:
+            logger.exception("grading failed", extra={'exam_code': job.exam_code, 'pern_no': job.pern_no})
+            self._set_status(job.key, STATUS_FAILED)
+            try:
+                ref.update({'status': STATUS_FAILED, 'error': str(e), 'updated_at': SERVER_TIMESTAMP})
+            except Exception:
+                logger.exception("could not record grading failure", extra={
+                    'exam_code': job.exam_code, 'pern_no': job.pern_no,
+                })
+            GRADING_JOBS.inc(status=STATUS_FAILED)
+        finally:
+            GRADING_JOB_LATENCY.observe(time.perf_counter() - started)
+
+
+_grading_queue: Optional[GradingQueue] = None
+_grading_queue_lock = threading.Lock()
+
+GRADING_QUEUE_DEPTH = Gauge(
+    'exam_grading_queue_depth', 'Jobs waiting in this process\'s grading queue',
+    callback=lambda: _grading_queue.depth() if _grading_queue is not None else None,
+)
+
+
+def get_grading_queue() -> GradingQueue:
+    """The process-wide grading queue, started on first use."""
+    global _grading_queue
+    if _grading_queue is None:
+        with _grading_queue_lock:
+            if _grading_queue is None:
+                _grading_queue = GradingQueue(settings.GRADING_WORKERS, settings.GRADING_QUEUE_SIZE)
+    return _grading_queue
+
+
+def current_grading_queue() -> Optional[GradingQueue]:
+    """This process's grading queue if one was started; never starts one (or loads the grader).
+
+    For status lookups: a process that has not queued anything, e.g. a
+    page-only worker, has no grading in flight and answers from Firestore.
+    """
+    return _grading_queue
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+from .metrics import Counter
+
+# take_exam.html generates one key per attempt at submitting an exam and sends
+# it with every retry of that attempt (network errors, double clicks, the timer
+# racing the button). The key is also stored on the submission document, so a
+# retry that reaches another worker, or this one after a restart, still
+# recognises answers it has already stored.
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 128
+
+SUBMIT_DEDUPE = Counter('exam_submit_dedupe_total', 'Submit requests by idempotency outcome', ('result',))
+
+# (JSON body, HTTP status) of a submit response
+Response = Tuple[Dict, int]
+
+
+class SubmitDedupe:
+    """In-process table of submit keys, each either in flight or completed.
+
+    The first request for a key owns it and resolves its future with the
+    response; concurrent retries wait on that future instead of storing and
+    grading the answers again, and later ones get the response straight away.
+    Failed attempts are released so the next retry starts over.
+    """
+
+    MAX_TRACKED = 10000
+
+    def __init__(self, max_items: int = MAX_TRACKED):
+        self.max_items = max_items
+        self._entries: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """The key's future, and True if the caller is the first and must complete() or release() it."""
+        with self._lock:
+            future = self._entries.get(key)
+            if future is not None:
+                self._entries.move_to_end(key)
+                return future, False
+            future = self._entries[key] = Future()
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+            return future, True
+
+    def complete(self, future: Future, response: Response) -> None:
+        future.set_result(response)
+
+    def release(self, key: str, future: Future, response: Response) -> None:
+        """Forget the key, handing `response` to the requests already waiting on it."""
+        with self._lock:
+            if self._entries.get(key) is future:
+                del self._entries[key]
+        future.set_result(response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+submit_dedupe = SubmitDedupe()
+
+
+def dedupe_key(exam_code: str, pern_no: str, client_key: str) -> str:
+    """Scoped to the student, so one student's key can never replay another's response."""
+    return f"{exam_code}/{pern_no}/{client_key}"
@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam.ai_service import Concept, KeywordMatcher
+
+
+def _legacy_concept_hits(concepts, text):
+    """The pre-matcher compute_concept_score loop: one substring test per keyword."""
+    hits = set()
+    for i, c in enumerate(concepts):
+        for kw in c.keywords:
+            if kw.lower() in text:
+                hits.add(i)
+                break
+    return hits
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark the compiled KeywordMatcher against the per-keyword substring loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concepts', type=int, default=20)
+        parser.add_argument('--keywords', type=int, default=8, help='Keywords per concept')
+        parser.add_argument('--words', type=int, default=300, help='Words per answer')
+        parser.add_argument('--answers', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocab = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10)))
+                 for _ in range(5000)]
+        concepts = [
+            Concept(f"c{i}", [rng.choice(vocab) for _ in range(options['keywords'])])
+            for i in range(options['concepts'])
+        ]
+        answers = [' '.join(rng.choice(vocab) for _ in range(options['words'])) for _ in range(options['answers'])]
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(concepts)
+        compile_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in answers:
+            _legacy_concept_hits(concepts, text)
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in answers:
+            matcher.match(text)
+        matcher_s = time.perf_counter() - start
+
+        n = len(answers)
+        self.stdout.write(
+            f"{options['concepts']} concepts x {options['keywords']} keywords, "
+            f"{options['words']}-word answers, {n} answers"
+        )
+        self.stdout.write(f"compile once : {compile_s * 1e3:8.2f} ms")
+        self.stdout.write(f"legacy loop  : {legacy_s / n * 1e6:8.1f} us/answer")
+        self.stdout.write(f"matcher      : {matcher_s / n * 1e6:8.1f} us/answer")
+        self.stdout.write(f"speedup      : {legacy_s / matcher_s:8.2f}x")
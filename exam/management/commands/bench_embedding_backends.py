@@ -0,0 +1,93 @@
+import multiprocessing
+import random
+import resource
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SENTENCE_PARTS = [
+    "the steam turbine", "drives the generator", "to produce electricity", "economiser preheats feedwater",
+    "using flue gas heat", "the superheater raises", "steam temperature above saturation", "boiler drum",
+    "separates steam from water", "which improves efficiency", "in a thermal power plant", "before the turbine",
+]
+
+
+def _corpus(n, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(SENTENCE_PARTS) for _ in range(rng.randint(2, 12))) for _ in range(n)]
+
+
+def _peak_rss_mb():
+    # VmHWM belongs to this process image; ru_maxrss would also count the parent's pre-exec peak on Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(kind, model_name, onnx_dir, texts, batch_size, repeats, results):
+    """Runs in a fresh process so peak RSS belongs to this backend alone."""
+    from exam.embeddings import make_backend
+
+    started = time.perf_counter()
+    backend = make_backend(kind, model_name, onnx_dir)
+    load_s = time.perf_counter() - started
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+
+    single = []
+    for text in texts[:repeats]:
+        t = time.perf_counter()
+        backend.encode([text])
+        single.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    backend.encode(texts, batch_size=batch_size)
+    batch_s = time.perf_counter() - t
+
+    results.put({
+        'backend': kind,
+        'load_s': load_s,
+        'single_p50_ms': statistics.median(single) * 1e3,
+        'single_p95_ms': statistics.quantiles(single, n=20)[-1] * 1e3,
+        'batch_texts_per_s': len(texts) / batch_s,
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+
+
+class Command(BaseCommand):
+    help = "Compare latency and peak RSS of the torch and ONNX int8 embedding backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default='torch,onnx')
+        parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+        parser.add_argument('--texts', type=int, default=512)
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--repeats', type=int, default=100, help='Single-text encodes for latency percentiles')
+        parser.add_argument('--seed', type=int, default=13)
+
+    def handle(self, *args, **options):
+        texts = _corpus(options['texts'], options['seed'])
+        ctx = multiprocessing.get_context('spawn')
+        self.stdout.write(f"{'backend':10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'RSS MB':>8}")
+        for kind in options['backends'].split(','):
+            results = ctx.Queue()
+            proc = ctx.Process(target=_run_backend, args=(
+                kind, options['model'], settings.GRADER_ONNX_MODEL_DIR, texts,
+                options['batch_size'], options['repeats'], results,
+            ))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0 or results.empty():
+                self.stderr.write(f"{kind}: failed (exit code {proc.exitcode})")
+                continue
+            r = results.get()
+            self.stdout.write(
+                f"{r['backend']:10} {r['load_s']:8.2f} {r['single_p50_ms']:8.2f} {r['single_p95_ms']:8.2f} "
+                f"{r['batch_texts_per_s']:9.1f} {r['peak_rss_mb']:8.0f}"
+            )
@@ -0,0 +1,220 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.ai_service import Concept, DescriptiveAnswerGrader, QuestionConfig
+from exam.embeddings import make_backend
+
+# Seed material for the synthetic corpus (power-plant domain, like the sample exam)
+TOPICS = {
+    'boiler_drum': ['drum', 'boiler', 'separate', 'steam', 'water'],
+    'steam_turbine': ['turbine', 'blades', 'rotate', 'shaft'],
+    'generator': ['generator', 'electricity', 'power', 'magnet'],
+    'economiser': ['economiser', 'preheat', 'flue', 'gas'],
+    'feedwater': ['feedwater', 'inlet', 'temperature', 'pump'],
+    'superheater': ['superheater', 'furnace', 'heat', 'dry'],
+    'condenser': ['condenser', 'vacuum', 'cooling', 'exhaust'],
+}
+VERBS = ['drives', 'heats', 'separates', 'produces', 'converts', 'raises', 'cools', 'feeds', 'rotates', 'supplies']
+FILLER = ['the', 'a', 'which', 'and', 'then', 'inside', 'using', 'from', 'to', 'so', 'efficiently', 'quickly']
+
+# Answer lengths in words: short definitions, typical answers, long essays
+ANSWER_LENGTHS = {'short': (5, 15), 'medium': (30, 60), 'long': (120, 250)}
+
+STAGES = ['parse', 'concept', 'relation', 'semantic', 'penalty', 'grade']
+
+
+def _sentence(rng, keywords):
+    subj, obj = rng.choice(keywords), rng.choice(keywords)
+    return f"the {subj} {rng.choice(VERBS)} the {obj} {' '.join(rng.choice(FILLER) for _ in range(rng.randint(0, 4)))}"
+
+
+def _text(rng, keywords, words):
+    out = []
+    while sum(len(s.split()) for s in out) < words:
+        out.append(_sentence(rng, keywords))
+    return ". ".join(out) + "."
+
+
+def build_corpus(seed, n_questions, answers_per_question):
+    """Deterministic (questions, [(question index, length bucket, answer)]) for a given seed."""
+    rng = random.Random(seed)
+    questions, answers = [], []
+    for qi in range(n_questions):
+        names = rng.sample(sorted(TOPICS), rng.randint(2, 4))
+        keywords = [kw for n in names for kw in TOPICS[n]]
+        questions.append(QuestionConfig(
+            question_id=f"BENCH_{qi}",
+            type='descriptive',
+            teacher_answer=_text(rng, keywords, rng.randint(12, 30)),
+            concepts=[Concept(n, list(TOPICS[n])) for n in names],
+            max_score=rng.choice([5, 8, 10]),
+        ))
+        for _ in range(answers_per_question):
+            bucket = rng.choice(sorted(ANSWER_LENGTHS))
+            lo, hi = ANSWER_LENGTHS[bucket]
+            pool = keywords + rng.sample(sorted(k for v in TOPICS.values() for k in v), 4)
+            answers.append((qi, bucket, _text(rng, pool, rng.randint(lo, hi))))
+    return questions, answers
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(samples):
+    total = sum(samples)
+    return {
+        'calls': len(samples),
+        'p50_ms': round(_percentile(samples, 50) * 1e3, 3),
+        'p95_ms': round(_percentile(samples, 95) * 1e3, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1e3, 3),
+        'throughput_per_s': round(len(samples) / total, 1) if total else None,
+    }
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark the descriptive grader stage by stage on a seeded synthetic corpus and save JSON results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--answers-per-question', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--output', default=None, help='JSON path (default: bench_results/grader-<commit>.json)')
+        parser.add_argument('--compare', default=None, help='Previous JSON result to compare p50 latencies against')
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help='Fail when a stage p50 is this many percent slower than --compare')
+
+    def handle(self, *args, **options):
+        questions, answers = build_corpus(options['seed'], options['questions'], options['answers_per_question'])
+        load_started = time.perf_counter()
+        # No teacher/result caches: measure the grading work itself
+        grader = DescriptiveAnswerGrader(embedder=make_backend(
+            settings.GRADER_EMBEDDING_BACKEND, "sentence-transformers/all-MiniLM-L6-v2", settings.GRADER_ONNX_MODEL_DIR
+        ))
+        load_s = time.perf_counter() - load_started
+        grader.warm_up()
+        for cfg in questions:
+            grader.compiled_for(cfg)  # upload-time work, not part of grading
+
+        timings = {stage: [] for stage in STAGES}
+        by_length = {bucket: [] for bucket in ANSWER_LENGTHS}
+        for qi, bucket, answer in answers:
+            cfg = questions[qi]
+            t = time.perf_counter()
+            parsed = grader.parse_answer(answer)
+            timings['parse'].append(time.perf_counter() - t)
+            for stage, fn in (
+                ('concept', lambda: grader.compute_concept_score(cfg, parsed)),
+                ('relation', lambda: grader.compute_relation_score(cfg, parsed)),
+                ('semantic', lambda: grader.compute_semantic_similarity(cfg.teacher_answer, answer)),
+                ('penalty', lambda: grader.compute_penalty(cfg, parsed)),
+                ('grade', lambda: grader.grade(cfg, answer)),
+            ):
+                t = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - t
+                timings[stage].append(elapsed)
+                if stage == 'grade':
+                    by_length[bucket].append(elapsed)
+
+        cfgs = [questions[qi] for qi, _, _ in answers]
+        texts = [a for _, _, a in answers]
+        t = time.perf_counter()
+        grader.grade_many(cfgs, texts, batch_size=options['batch_size'])
+        batch_s = time.perf_counter() - t
+
+        # Separate pass: tracemalloc slows everything down, so it never overlaps the timings
+        memory = {}
+        sample = answers[:min(len(answers), 20)]
+        for stage, fn in (
+            ('grade', lambda cfg, a: grader.grade(cfg, a)),
+            ('grade_many', None),
+        ):
+            tracemalloc.start()
+            if fn is None:
+                grader.grade_many([questions[qi] for qi, _, _ in sample], [a for _, _, a in sample])
+            else:
+                for qi, _, a in sample:
+                    fn(questions[qi], a)
+            memory[f"{stage}_python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+            tracemalloc.stop()
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'embedding_backend': grader.embedder.cache_key,
+                'seed': options['seed'],
+                'questions': len(questions),
+                'answers': len(answers),
+                'model_load_s': round(load_s, 2),
+            },
+            'stages': {stage: _summary(samples) for stage, samples in timings.items()},
+            'grade_by_answer_length': {b: _summary(s) for b, s in by_length.items() if s},
+            'grade_many': {
+                'pairs': len(texts),
+                'batch_size': options['batch_size'],
+                'total_s': round(batch_s, 3),
+                'throughput_per_s': round(len(texts) / batch_s, 1),
+            },
+            'memory': {**memory, 'peak_rss_mb': _peak_rss_mb()},
+        }
+
+        self.stdout.write(f"{'stage':10} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9}")
+        for stage, s in report['stages'].items():
+            self.stdout.write(f"{stage:10} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['throughput_per_s']:9.1f}")
+        self.stdout.write(f"grade_many: {report['grade_many']['throughput_per_s']} answers/s; memory: {report['memory']}")
+
+        output = Path(options['output'] or settings.BASE_DIR / 'bench_results' / f"grader-{report['meta']['commit'] or 'local'}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Saved {output}"))
+
+        if options['compare']:
+            self._compare(report, json.loads(Path(options['compare']).read_text()), options['max_regression'])
+
+    def _compare(self, report, baseline, max_regression):
+        regressions = []
+        for stage, s in report['stages'].items():
+            before = baseline.get('stages', {}).get(stage, {}).get('p50_ms')
+            if not before:
+                continue
+            change = (s['p50_ms'] - before) / before * 100
+            self.stdout.write(f"{stage:10} p50 {before:.2f} -> {s['p50_ms']:.2f} ms ({change:+.1f}%)")
+            if change > max_regression:
+                regressions.append(f"{stage} +{change:.1f}%")
+        if regressions:
+            raise CommandError(f"p50 regressions over {max_regression}%: {', '.join(regressions)}")
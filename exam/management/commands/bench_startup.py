@@ -0,0 +1,70 @@
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter, so every sample is a cold start
+PROBE = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_project.settings')
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+import exam.views
+t2 = time.perf_counter()
+heavy = [m for m in ('spacy', 'torch', 'sentence_transformers', 'pandas', 'firebase_admin') if m in sys.modules]
+print(json.dumps({'django_setup_s': t1 - t0, 'import_views_s': t2 - t1, 'heavy_modules': heavy}))
+"""
+
+
+def _slowest_imports(top):
+    """Cumulative import times (s) from `python -X importtime` for one cold `import exam.views`."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith(' ' * 3):  # top-level imports only (nested ones are indented)
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start time of django.setup() and `import exam.views` in fresh interpreters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=10, help='Show the N slowest top-level imports')
+        parser.add_argument('--output', default=None, help='Also save the results as JSON')
+
+    def handle(self, *args, **options):
+        samples = []
+        for _ in range(options['runs']):
+            proc = subprocess.run(
+                [sys.executable, '-c', PROBE], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            )
+            samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        report = {'runs': len(samples), 'heavy_modules_after_import': samples[-1]['heavy_modules']}
+        for key in ('django_setup_s', 'import_views_s'):
+            values = [s[key] for s in samples]
+            report[key] = {'median': round(statistics.median(values), 4), 'max': round(max(values), 4)}
+            self.stdout.write(f"{key:16} median {report[key]['median'] * 1000:8.1f} ms   max {report[key]['max'] * 1000:8.1f} ms")
+        self.stdout.write(f"heavy modules loaded by import: {report['heavy_modules_after_import'] or 'none'}")
+
+        report['slowest_imports'] = [{'module': m, 'seconds': round(s, 4)} for s, m in _slowest_imports(options['top'])]
+        for row in report['slowest_imports']:
+            self.stdout.write(f"  {row['seconds'] * 1000:8.1f} ms  {row['module']}")
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Saved {options['output']}"))
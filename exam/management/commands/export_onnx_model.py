@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exam.embeddings import export_onnx_model
+
+
+class Command(BaseCommand):
+    help = "Export the grader's sentence-embedding model to an int8-quantized ONNX model for CPU serving."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+        parser.add_argument('--out', default=str(settings.GRADER_ONNX_MODEL_DIR))
+        parser.add_argument('--no-quantize', action='store_true', help='Keep fp32 weights')
+
+    def handle(self, *args, **options):
+        path = export_onnx_model(options['model'], Path(options['out']), quantize=not options['no_quantize'])
+        size_mb = path.stat().st_size / 1e6
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path} ({size_mb:.1f} MB)"))
+        self.stdout.write("Serve it with GRADER_EMBEDDING_BACKEND=onnx")
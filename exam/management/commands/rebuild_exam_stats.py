@@ -0,0 +1,85 @@
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _without(summary: Dict, percentages: List[float]) -> Dict:
+    """`summary` minus the given scores; min/max become None when a removed score may have set them."""
+    from exam.exam_stats import score_range
+
+    if not percentages:
+        return summary
+    total = summary['total'] - len(percentages)
+    ranges = list(summary['ranges'])
+    for p in percentages:
+        ranges[('fail', 'pass', 'excellent').index(score_range(p))] -= 1
+    bounds_kept = not any(p in (summary['min'], summary['max']) for p in percentages)
+    return {
+        **summary,
+        'total': total,
+        'avg': (summary['avg'] * summary['total'] - sum(percentages)) / total if total else 0.0,
+        'ranges': ranges,
+        'min': summary['min'] if bounds_kept else None,
+        'max': summary['max'] if bounds_kept else None,
+    }
+
+
+class Command(BaseCommand):
+    help = "Recompute the exam_stats aggregate documents from the stored submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_codes', nargs='*', help='Exams to rebuild (default: all exam codes)')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare each aggregate with server-side count/avg queries and report drift',
+        )
+
+    def handle(self, *args, **options):
+        from exam.exam_stats import STATS_FIELD, load_exam_stats, rebuild_exam_stats
+        from exam.firebase_config import get_firestore_client
+        from exam.grading_queue import STATUS_FAILED, STATUS_GRADING, STATUS_PENDING
+        from exam.queries import projected, result_summary
+
+        db = get_firestore_client()
+        if db is None:
+            raise CommandError("Firestore is not configured.")
+
+        exam_codes = options['exam_codes'] or [doc.id for doc in db.collection('exam_codes').select([]).stream()]
+        for exam_code in exam_codes:
+            if options['check']:
+                summary = load_exam_stats(exam_code, db)
+                if summary['pending']:
+                    self.stdout.write(self.style.WARNING(f"{exam_code}: no aggregate yet; run without --check"))
+                    continue
+                submissions = db.collection('results').document(exam_code).collection('submissions')
+                # Both sides over graded submissions only: a pending or failed re-submission still
+                # counts its last score in the aggregate, but has no `percentage` until graded again
+                not_graded = [
+                    doc.to_dict() for doc in projected(
+                        submissions.where('status', 'in', [STATUS_PENDING, STATUS_GRADING, STATUS_FAILED]),
+                        ['percentage', STATS_FIELD],
+                    )
+                ]
+                stored = _without(summary, [
+                    float(d[STATS_FIELD]['percentage']) for d in not_graded if d.get(STATS_FIELD)
+                ])
+                actual = _without(result_summary(submissions), [
+                    float(d['percentage']) for d in not_graded if d.get('percentage') is not None
+                ])
+                drift = {
+                    key: (stored[key], actual[key]) for key in ('total', 'ranges', 'min', 'max')
+                    if stored[key] is not None and actual[key] is not None and stored[key] != actual[key]
+                }
+                if abs(stored['avg'] - actual['avg']) > 0.01:
+                    drift['avg'] = (round(stored['avg'], 2), round(actual['avg'], 2))
+                if drift:
+                    self.stdout.write(self.style.WARNING(f"{exam_code}: drifted (stored, actual) {drift}"))
+                else:
+                    self.stdout.write(f"{exam_code}: ok ({stored['total']} graded)")
+                continue
+
+            report = rebuild_exam_stats(exam_code, db)
+            self.stdout.write(self.style.SUCCESS(
+                f"{exam_code}: {report['counted']} of {report['submissions']} submissions counted, "
+                f"{report['fixed']} contributions fixed"
+            ))
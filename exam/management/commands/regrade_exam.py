@@ -0,0 +1,134 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exam.grading import answers_from_details, score_submissions
+
+# Set in each pool worker by _init_worker
+_worker_questions = None
+
+
+def _init_worker(questions):
+    """Runs once per worker process: set up Django and load the models a single time."""
+    import django
+
+    django.setup()
+    from exam.ai_service import get_grader
+
+    global _worker_questions
+    _worker_questions = questions
+    # A regrade exists to apply current scoring, so it never serves memoized results
+    get_grader().result_cache = None
+
+
+def _grade_chunk(chunk):
+    """Grade [(doc_id, answers), ...] in one batch; returns [(doc_id, result fields), ...]."""
+    from exam.ai_service import get_grader
+
+    results = score_submissions(_worker_questions, [answers for _, answers in chunk], get_grader())
+    return [(doc_id, result) for (doc_id, _), result in zip(chunk, results)]
+
+
+class Command(BaseCommand):
+    help = "Re-score the stored submissions of an exam with the current questions and grader."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_code')
+        parser.add_argument('--page-size', type=int, default=200, help='Submissions read and written per page (max 500)')
+        parser.add_argument('--chunk-size', type=int, default=16, help='Submissions per worker task')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--pending-only', action='store_true', help='Only grade pending/failed submissions')
+        parser.add_argument('--recompile', action='store_true', help='Ignore stored question artifacts and recompile them')
+        parser.add_argument('--resume', action='store_true', help='Continue from the saved checkpoint')
+
+    def handle(self, *args, **options):
+        from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+        from exam.exam_stats import rebuild_exam_stats
+        from exam.firebase_config import get_firestore_client
+        from exam.grading_queue import STATUS_FAILED, STATUS_GRADED, STATUS_PENDING
+        from exam.question_store import load_questions
+
+        exam_code = options['exam_code']
+        page_size = min(options['page_size'], 500)  # one WriteBatch per page
+        db = get_firestore_client()
+        if db is None:
+            raise CommandError("Firestore is not configured.")
+
+        questions = load_questions(exam_code)
+        if not questions:
+            raise CommandError(f"No questions found for exam {exam_code}.")
+        if options['recompile']:
+            questions = [{k: v for k, v in q.items() if k != 'compiled'} for q in questions]
+
+        checkpoint_path = settings.GRADER_CACHE_DIR / f"regrade_{exam_code}.json"
+        last_doc_id, done = None, 0
+        if options['resume'] and checkpoint_path.exists():
+            checkpoint = json.loads(checkpoint_path.read_text())
+            last_doc_id, done = checkpoint['last_doc_id'], checkpoint['done']
+            self.stdout.write(f"Resuming after {last_doc_id} ({done} already re-graded)")
+
+        submissions = db.collection('results').document(exam_code).collection('submissions')
+        base_query = submissions
+        if options['pending_only']:
+            base_query = base_query.where('status', 'in', [STATUS_PENDING, STATUS_FAILED])
+        base_query = base_query.order_by('__name__').limit(page_size)
+
+        started = time.perf_counter()
+        graded_this_run = 0
+        ctx = multiprocessing.get_context('spawn')  # never fork a process holding gRPC state
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=ctx, initializer=_init_worker, initargs=(questions,)
+        ) as pool:
+            while True:
+                query = base_query.start_after({'__name__': last_doc_id}) if last_doc_id else base_query
+                page = list(query.stream())
+                if not page:
+                    break
+
+                items = []
+                for doc in page:
+                    data = doc.to_dict()
+                    answers = data.get('answers')
+                    if answers is None:
+                        answers = answers_from_details(data.get('details', []), questions)
+                    items.append((doc.id, answers))
+
+                chunk_size = options['chunk_size']
+                chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+                page_started = time.perf_counter()
+
+                batch = db.batch()
+                for chunk_results in pool.map(_grade_chunk, chunks):
+                    for doc_id, result in chunk_results:
+                        batch.update(submissions.document(doc_id), {
+                            **result, 'status': STATUS_GRADED, 'graded_at': SERVER_TIMESTAMP,
+                            'updated_at': SERVER_TIMESTAMP,
+                        })
+                batch.commit()
+
+                last_doc_id = page[-1].id
+                done += len(page)
+                graded_this_run += len(page)
+                checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+                checkpoint_path.write_text(json.dumps({'last_doc_id': last_doc_id, 'done': done}))
+
+                page_rate = len(page) / max(time.perf_counter() - page_started, 1e-9)
+                total_rate = graded_this_run / max(time.perf_counter() - started, 1e-9)
+                self.stdout.write(
+                    f"{done} re-graded (page {page_rate:.1f}/s, overall {total_rate:.1f} submissions/s)"
+                )
+
+        if checkpoint_path.exists():
+            checkpoint_path.unlink()
+        rebuild_exam_stats(exam_code, db)  # scores changed outside save_graded_result
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {graded_this_run} submissions of {exam_code} in {elapsed:.1f}s "
+            f"({graded_this_run / max(elapsed, 1e-9):.1f} submissions/s)"
+        ))
@@ -0,0 +1,291 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# ==============================
+# METRIC TYPES (Prometheus text format, no extra dependency)
+# ==============================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Current value, either set explicitly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self._callback is not None:
+            value = self._callback()
+            return [] if value is None else [f"{self.name} {value}"]
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, n in zip(self.buckets, state):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {n}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# ==============================
+# APPLICATION METRICS
+# ==============================
+HTTP_REQUESTS = Counter('exam_http_requests_total', 'HTTP requests by view, method and status', ('view', 'method', 'status'))
+HTTP_LATENCY = Histogram('exam_http_request_duration_seconds', 'View latency', ('view', 'method'))
+HTTP_FIRESTORE_READS = Histogram(
+    'exam_http_request_firestore_reads', 'Firestore documents read per request', ('view',), buckets=COUNT_BUCKETS
+)
+
+GRADER_STAGE_LATENCY = Histogram('exam_grader_stage_duration_seconds', 'Time spent per grading stage', ('stage',))
+GRADER_ANSWERS = Counter('exam_grader_answers_total', 'Descriptive answers scored, by source', ('source',))
+
+GRADING_JOBS = Counter('exam_grading_jobs_total', 'Background grading jobs by outcome', ('status',))
+GRADING_JOB_LATENCY = Histogram('exam_grading_job_duration_seconds', 'Time to grade and store one submission')
+
+FIRESTORE_OPS = Counter('exam_firestore_operations_total', 'Firestore calls by operation', ('op',))
+FIRESTORE_LATENCY = Histogram('exam_firestore_operation_duration_seconds', 'Firestore call latency', ('op',))
+FIRESTORE_READS = Counter('exam_firestore_documents_read_total', 'Firestore documents read', ('op',))
+FIRESTORE_WRITES = Counter('exam_firestore_documents_written_total', 'Firestore documents written', ('op',))
+
+# Per-request read tally, set by RequestMetricsMiddleware
+_request_reads: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar('request_reads', default=None)
+
+
+@contextmanager
+def track_request_reads():
+    """Count Firestore document reads made while handling one request; yields a one-item list."""
+    tally = [0]
+    token = _request_reads.set(tally)
+    try:
+        yield tally
+    finally:
+        _request_reads.reset(token)
+
+
+def record_firestore(op: str, seconds: float, reads: int = 0, writes: int = 0) -> None:
+    FIRESTORE_OPS.inc(op=op)
+    FIRESTORE_LATENCY.observe(seconds, op=op)
+    if reads:
+        FIRESTORE_READS.inc(reads, op=op)
+        tally = _request_reads.get()
+        if tally is not None:
+            tally[0] += reads
+    if writes:
+        FIRESTORE_WRITES.inc(writes, op=op)
+
+
+# ==============================
+# FIRESTORE INSTRUMENTATION
+# ==============================
+_firestore_instrumented = False
+
+
+def instrument_firestore() -> None:
+    """Time every Firestore read/write and count documents, by wrapping the client classes once.
+
+    Queries are timed until their stream is exhausted; an empty query still
+    costs one read, as Firestore bills it.
+    """
+    global _firestore_instrumented
+    if _firestore_instrumented:
+        return
+    _firestore_instrumented = True
+
+    from google.cloud.firestore_v1.aggregation import AggregationQuery
+    from google.cloud.firestore_v1.async_client import AsyncClient
+    from google.cloud.firestore_v1.async_document import AsyncDocumentReference
+    from google.cloud.firestore_v1.batch import WriteBatch
+    from google.cloud.firestore_v1.client import Client
+    from google.cloud.firestore_v1.document import DocumentReference
+    from google.cloud.firestore_v1.query import Query
+    from google.cloud.firestore_v1.transaction import Transaction
+
+    def timed_call(op, reads=0, writes=0):
+        def wrap(method):
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                n_writes = writes(self) if callable(writes) else writes
+                started = time.perf_counter()
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    record_firestore(op, time.perf_counter() - started, reads=reads, writes=n_writes)
+            return wrapper
+        return wrap
+
+    def timed_stream(op, min_reads=1, fixed_reads=None):
+        def wrap(method):
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                started = time.perf_counter()
+                inner = method(self, *args, **kwargs)
+                yielded = 0
+                try:
+                    while True:
+                        try:
+                            item = next(inner)
+                        except StopIteration as stop:
+                            return stop.value  # e.g. query explain metrics
+                        yielded += 1
+                        yield item
+                finally:
+                    inner.close()
+                    reads = fixed_reads if fixed_reads is not None else max(yielded, min_reads)
+                    record_firestore(op, time.perf_counter() - started, reads=reads)
+            return wrapper
+        return wrap
+
+    def timed_async_call(op, reads=0, writes=0):
+        def wrap(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await method(self, *args, **kwargs)
+                finally:
+                    record_firestore(op, time.perf_counter() - started, reads=reads, writes=writes)
+            return wrapper
+        return wrap
+
+    def timed_async_stream(op):
+        def wrap(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                started = time.perf_counter()
+                yielded = 0
+                try:
+                    async for item in method(self, *args, **kwargs):
+                        yielded += 1
+                        yield item
+                finally:
+                    record_firestore(op, time.perf_counter() - started, reads=yielded)
+            return wrapper
+        return wrap
+
+    DocumentReference.get = timed_call('document_get', reads=1)(DocumentReference.get)
+    for op in ('create', 'set', 'update', 'delete'):
+        setattr(DocumentReference, op, timed_call(f'document_{op}', writes=1)(getattr(DocumentReference, op)))
+    WriteBatch.commit = timed_call('batch_commit', writes=lambda batch: len(batch._write_pbs))(WriteBatch.commit)
+    Transaction._commit = timed_call('transaction_commit', writes=lambda txn: len(txn._write_pbs))(Transaction._commit)
+    Query._make_stream = timed_stream('query')(Query._make_stream)
+    AggregationQuery._make_stream = timed_stream('aggregate', fixed_reads=1)(AggregationQuery._make_stream)
+    Client.get_all = timed_stream('get_all', min_reads=0)(Client.get_all)
+
+    AsyncDocumentReference.get = timed_async_call('document_get', reads=1)(AsyncDocumentReference.get)
+    for op in ('create', 'set', 'update', 'delete'):
+        method = getattr(AsyncDocumentReference, op)
+        setattr(AsyncDocumentReference, op, timed_async_call(f'document_{op}', writes=1)(method))
+    AsyncClient.get_all = timed_async_stream('get_all')(AsyncClient.get_all)
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import HTTP_FIRESTORE_READS, HTTP_LATENCY, HTTP_REQUESTS, track_request_reads
+
+logger = logging.getLogger('exam.requests')
+
+
+class RequestMetricsMiddleware:
+    """Times every view and counts the Firestore documents it read (sync and async views alike)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track_request_reads() as reads:
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, reads[0])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with track_request_reads() as reads:
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, reads[0])
+        return response
+
+    def _record(self, request, response, elapsed, reads):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        if view == 'metrics':
+            return  # keep scrapes out of the numbers they report
+
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_LATENCY.observe(elapsed, view=view, method=request.method)
+        HTTP_FIRESTORE_READS.observe(reads, view=view)
+
+        level = logging.WARNING if elapsed * 1000 >= settings.SLOW_REQUEST_MS else logging.DEBUG
+        logger.log(level, "request", extra={
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'firestore_reads': reads,
+        })
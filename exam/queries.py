@@ -0,0 +1,171 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from google.cloud.firestore_v1 import Query
+
+from .firebase_config import db
+
+# ==============================
+# CHEAP QUERY HELPERS
+# ==============================
+# Firestore bills one read per document returned (and one for an empty
+# result), but only one read per 1000 index entries for aggregations.
+# Projections do not reduce reads, only the bytes transferred and decoded.
+
+
+def exists(query) -> bool:
+    """True if the query matches any document; costs one read however many match."""
+    return any(True for _ in query.limit(1).stream())
+
+
+def first(query, fields: Optional[Sequence[str]] = None):
+    """The first matching snapshot (optionally projected to `fields`), or None."""
+    if fields:
+        query = query.select(list(fields))
+    return next(iter(query.limit(1).stream()), None)
+
+
+def projected(query, fields: Sequence[str]) -> Iterator:
+    """Stream only the listed fields of each matching document."""
+    return query.select(list(fields)).stream()
+
+
+def aggregate(query, count: bool = False, sum_fields: Iterable[str] = (), avg_fields: Iterable[str] = ()) -> Dict:
+    """Run count/sum/avg server-side in one request.
+
+    Returns {'count': n, 'sum_<field>': x, 'avg_<field>': y}; averages are
+    None when no document has the field.
+    """
+    agg = query
+    if count:
+        agg = agg.count(alias='count')
+    for field in sum_fields:
+        agg = agg.sum(field, alias=f'sum_{field}')
+    for field in avg_fields:
+        agg = agg.avg(field, alias=f'avg_{field}')
+    if agg is query:
+        raise ValueError("aggregate() needs at least one of count, sum_fields or avg_fields")
+    return {result.alias: result.value for row in agg.get() for result in row}
+
+
+def count(query) -> int:
+    return int(aggregate(query, count=True)['count'])
+
+
+# ==============================
+# CURSOR PAGINATION
+# ==============================
+@dataclass
+class Page:
+    docs: List
+    next_cursor: Optional[str] = None  # pass as `after` for the following page
+    prev_cursor: Optional[str] = None  # pass as `before` for the preceding page
+
+
+def encode_cursor(snapshot, field: str) -> str:
+    """An opaque URL-safe token for the position of `snapshot` in a query ordered by `field`."""
+    value = snapshot.to_dict().get(field)
+    if hasattr(value, 'isoformat'):
+        value = {'ts': value.isoformat()}
+    raw = json.dumps([value, snapshot.id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, field: str) -> Optional[Dict]:
+    """The cursor values for `start_after`/`end_before`; None for a missing or malformed token."""
+    if not token:
+        return None
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['ts'])
+    except (ValueError, TypeError, KeyError):
+        return None
+    return {field: value, '__name__': str(doc_id)}
+
+
+def paginate(query, order_field: str, page_size: int, after: str = '', before: str = '') -> Page:
+    """One page of `query` ordered by (order_field, document id).
+
+    Reads at most page_size + 1 documents however large the collection is;
+    the extra one only tells whether there is another page.
+    """
+    ordered = query.order_by(order_field).order_by('__name__')
+    after_values, before_values = decode_cursor(after, order_field), decode_cursor(before, order_field)
+
+    if before_values:
+        docs = list(ordered.end_before(before_values).limit_to_last(page_size + 1).get())
+        has_prev, has_next = len(docs) > page_size, True
+        docs = docs[-page_size:]
+    else:
+        if after_values:
+            ordered = ordered.start_after(after_values)
+        docs = list(ordered.limit(page_size + 1).stream())
+        has_prev, has_next = after_values is not None, len(docs) > page_size
+        docs = docs[:page_size]
+
+    return Page(
+        docs=docs,
+        next_cursor=encode_cursor(docs[-1], order_field) if docs and has_next else None,
+        prev_cursor=encode_cursor(docs[0], order_field) if docs and has_prev else None,
+    )
+
+
+def iter_pages(query, page_size: int = 500, order_field: Optional[str] = None) -> Iterator[List]:
+    """Walk every document of `query` one page (one request) at a time.
+
+    Ordered by document path, or by (order_field, path) when given; each page
+    resumes after the last snapshot of the previous one, which also works for
+    collection-group queries.
+    """
+    ordered = query.order_by(order_field) if order_field else query
+    ordered = ordered.order_by('__name__').limit(page_size)
+    last = None
+    while True:
+        page = list((ordered.start_after(last) if last is not None else ordered).stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+# ==============================
+# APP QUERIES
+# ==============================
+EXAM_CODE_FIELDS = ['test_name', 'duration', 'active']
+
+
+def exam_code_list(fields: Sequence[str] = EXAM_CODE_FIELDS) -> List:
+    """Snapshots of all exam codes with only the fields the admin pages show."""
+    return list(projected(db.collection('exam_codes'), fields))
+
+
+def result_summary(submissions) -> Dict:
+    """Headline numbers for an exam's submissions without reading them.
+
+    Only graded submissions carry `percentage`, so filtering on it leaves out
+    pending and failed ones. Five small requests in total: count+avg, two
+    range counts and the top/bottom score.
+    """
+    graded = submissions.where('percentage', '>=', 0)
+    totals = aggregate(graded, count=True, avg_fields=['percentage'])
+    total = int(totals['count'])
+    if not total:
+        return {'total': 0, 'avg': 0.0, 'max': 0.0, 'min': 0.0, 'ranges': [0, 0, 0]}
+
+    below_40 = count(submissions.where('percentage', '<', 40))
+    below_70 = count(submissions.where('percentage', '<', 70))
+    top = first(submissions.order_by('percentage', direction=Query.DESCENDING), ['percentage'])
+    bottom = first(submissions.order_by('percentage', direction=Query.ASCENDING), ['percentage'])
+    return {
+        'total': total,
+        'avg': float(totals['avg_percentage'] or 0.0),
+        'max': float(top.to_dict().get('percentage', 0)) if top else 0.0,
+        'min': float(bottom.to_dict().get('percentage', 0)) if bottom else 0.0,
+        'ranges': [below_40, below_70 - below_40, total - below_70],  # <40, 40-70, >=70
+    }
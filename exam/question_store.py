@@ -0,0 +1,153 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from .firebase_config import adb, db
+from .firestore_batch import ChunkedWriteBatch
+
+logger = logging.getLogger(__name__)
+
+# One compact document per exam: question_sets/<exam_code> = {'questions': [...], ...}.
+# Banks too large for one document spill into question_sets/<exam_code>/shards/<revision>_<n>.
+QUESTION_SETS = 'question_sets'
+SHARDS = 'shards'
+
+# Firestore rejects documents over 1 MiB; leave room for field names and metadata
+MAX_SET_BYTES = 900 * 1024
+
+
+def question_set_ref(exam_code: str):
+    return db.collection(QUESTION_SETS).document(str(exam_code))
+
+
+def _shard(questions: List[Dict]) -> List[List[Dict]]:
+    """Split questions, in order, into runs that each fit in one document."""
+    shards, current, size = [], [], 0
+    for q in questions:
+        q_size = len(json.dumps(q, default=str).encode('utf-8'))
+        if q_size > MAX_SET_BYTES:
+            raise ValueError(f"Question {q.get('id')} is too large to store ({q_size // 1024} KiB)")
+        if current and size + q_size > MAX_SET_BYTES:
+            shards.append(current)
+            current, size = [], 0
+        current.append(q)
+        size += q_size
+    shards.append(current)
+    return shards
+
+
+def save_questions(exam_code: str, questions: List[Dict], revision: str = "") -> int:
+    """Replace the question set of one exam; returns the number of batch commits used.
+
+    Usually a single document write. For large banks the extra shards are
+    written first, in batches, and the main document (which says which shards
+    belong to the set) last, so readers see either the old or the new set.
+    """
+    set_ref = question_set_ref(exam_code)
+    previous = set_ref.get()
+    previous = previous.to_dict() if previous.exists else {}
+    shards = _shard(questions)
+
+    with ChunkedWriteBatch(db) as batch:
+        for n, shard in enumerate(shards[1:], start=1):
+            batch.set(set_ref.collection(SHARDS).document(f"{revision}_{n}"), {'questions': shard})
+    commits = batch.commits
+
+    set_ref.set({
+        'exam_code': exam_code,
+        'questions': shards[0],
+        'shard_count': len(shards),
+        'total_questions': len(questions),
+        'total_max_score': sum(q.get('max_score', 1.0) for q in questions),
+        'revision': revision,
+        'updated_at': SERVER_TIMESTAMP,
+    })
+    commits += 1
+
+    old_revision = previous.get('revision')
+    if previous.get('shard_count', 1) > 1 and old_revision != revision:
+        with ChunkedWriteBatch(db) as batch:
+            for n in range(1, previous['shard_count']):
+                batch.delete(set_ref.collection(SHARDS).document(f"{old_revision}_{n}"))
+        commits += batch.commits
+    return commits
+
+
+def _shard_refs(set_ref, data: Dict) -> List:
+    shards = set_ref.collection(SHARDS)
+    return [shards.document(f"{data.get('revision', '')}_{n}") for n in range(1, data.get('shard_count', 1))]
+
+
+def _assemble(data: Dict, refs: List, by_id: Dict[str, Dict]) -> Optional[List[Dict]]:
+    """The whole set, or None if a shard the main document lists is gone (deleted by a re-upload since)."""
+    if any(ref.id not in by_id for ref in refs):
+        return None
+    questions = list(data.get('questions', []))
+    for ref in refs:
+        questions.extend(by_id[ref.id].get('questions', []))
+    return questions
+
+
+def load_questions(exam_code: str) -> List[Dict]:
+    """Questions of one exam, in upload order; one document read for all but very large banks.
+
+    A re-upload deletes the old shards right after switching the main
+    document, so a read that races it may find shards missing: it re-reads
+    the main document once and raises rather than return part of a set.
+
+    Exams uploaded before per-exam sets existed are read once from the legacy
+    global `questions/config` document and copied into their own set.
+    """
+    if not exam_code:
+        return []
+    set_ref = question_set_ref(exam_code)
+    for attempt in range(2):
+        doc = set_ref.get()
+        if not doc.exists:
+            break
+        data = doc.to_dict()
+        refs = _shard_refs(set_ref, data)
+        by_id = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists} if refs else {}
+        questions = _assemble(data, refs, by_id)
+        if questions is not None:
+            return questions
+        logger.info("question set replaced while reading; reading again", extra={'exam_code': exam_code})
+    else:
+        raise RuntimeError(f"Question set {exam_code} is missing shards; it kept changing while being read")
+
+    legacy = db.collection('questions').document('config').get()
+    if not legacy.exists:
+        return []
+    questions = [q for q in legacy.to_dict().get('questions', []) if q.get('exam_code') == exam_code]
+    if questions:
+        logger.info("migrated legacy question set", extra={'exam_code': exam_code, 'questions': len(questions)})
+        save_questions(exam_code, questions, revision='legacy')
+    return questions
+
+
+async def aload_questions(exam_code: str) -> List[Dict]:
+    """load_questions() on the async client; the one-off legacy migration still runs on the sync one."""
+    if not exam_code:
+        return []
+    client = adb()
+    set_ref = client.collection(QUESTION_SETS).document(str(exam_code))
+    for attempt in range(2):
+        doc = await set_ref.get()
+        if not doc.exists:
+            return await sync_to_async(load_questions, thread_sensitive=False)(exam_code)
+        data = doc.to_dict()
+        refs = _shard_refs(set_ref, data)
+        by_id = {snap.id: snap.to_dict() async for snap in client.get_all(refs) if snap.exists} if refs else {}
+        questions = _assemble(data, refs, by_id)
+        if questions is not None:
+            return questions
+        logger.info("question set replaced while reading; reading again", extra={'exam_code': exam_code})
+    raise RuntimeError(f"Question set {exam_code} is missing shards; it kept changing while being read")
+
+
+def question_lookup(questions: List[Dict]) -> Dict[str, Dict]:
+    """{question id: question} for merging stored results with question text and answers."""
+    return {q['id']: q for q in questions if 'id' in q}
@@ -0,0 +1,101 @@
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+QUESTION_TYPES = ('mcq', 'descriptive')
+OPTION_COLUMNS = ['option1', 'option2', 'option3', 'option4']
+
+
+def _text_column(df: pd.DataFrame, name: str, default: str = '') -> pd.Series:
+    """A stripped string column; blank cells (and missing columns) become `default`."""
+    if name not in df:
+        return pd.Series(default, index=df.index, dtype=object)
+    col = df[name].fillna('').astype(str).str.strip()
+    return col.where(col != '', default)
+
+
+def _parse_concepts(df: pd.DataFrame) -> Dict[int, List[Dict]]:
+    """{row index: [{'name', 'keywords'}, ...]} from the Concept_Names / Concept_Keywords columns.
+
+    Names are comma-separated; keyword groups are separated by ';' and paired
+    with names by position. A name without a group is its own keyword.
+    """
+    names = _text_column(df, 'Concept_Names').str.split(',').explode().str.strip()
+    names = names[names.notna() & (names != '')].to_frame('name')
+    if names.empty:
+        return {}
+    names['pos'] = names.groupby(level=0).cumcount()
+
+    groups = _text_column(df, 'Concept_Keywords').str.split(';').explode().str.strip()
+    groups = groups[groups.notna() & (groups != '')].to_frame('group')
+    groups['pos'] = groups.groupby(level=0).cumcount()
+
+    merged = (
+        names.rename_axis('row').reset_index()
+        .merge(groups.rename_axis('row').reset_index(), on=['row', 'pos'], how='left')
+    )
+    keywords = merged['group'].fillna('').str.lower().str.split(',')
+
+    concepts: Dict[int, List[Dict]] = {}
+    for row, name, kws in zip(merged['row'], merged['name'], keywords):
+        kws = [k.strip() for k in kws if k.strip()] or [name.lower()]
+        concepts.setdefault(row, []).append({'name': name, 'keywords': kws})
+    return concepts
+
+
+def parse_question_sheet(df: pd.DataFrame, exam_code: str) -> Tuple[List[Dict], List[Dict]]:
+    """Turn an uploaded sheet into question dicts plus a validation report.
+
+    Returns (questions, report). Each report entry is {'row', 'question_id',
+    'errors'}, with `row` as the spreadsheet row number (header = row 1).
+    Rows with errors are not included in `questions`.
+    """
+    questions_text = _text_column(df, 'Question')
+    types = _text_column(df, 'Type', 'mcq').str.lower()
+    teacher_answers = _text_column(df, 'Teacher_Answer')
+    raw_scores = _text_column(df, 'Max_Score', '1.0')
+    max_scores = pd.to_numeric(raw_scores, errors='coerce')
+
+    option_cols = [c for c in OPTION_COLUMNS if c in df]
+    if option_cols:
+        option_rows = df[option_cols].fillna('').astype(str).apply(lambda col: col.str.strip()).values.tolist()
+    else:
+        option_rows = [[] for _ in range(len(df))]
+    concepts = _parse_concepts(df)
+
+    questions, report = [], []
+    for pos, (idx, text, q_type, answer, raw_score, score, options) in enumerate(zip(
+        df.index, questions_text, types, teacher_answers, raw_scores, max_scores, option_rows
+    )):
+        q_id = f"{exam_code}_{idx}"
+        options = [opt for opt in options if opt] if q_type == 'mcq' else []
+        errors = []
+        if not text:
+            errors.append("Question is empty")
+        if q_type not in QUESTION_TYPES:
+            errors.append(f"Unknown Type '{q_type}' (expected mcq or descriptive)")
+        if pd.isna(score) or score <= 0:
+            errors.append(f"Max_Score '{raw_score}' is not a positive number")
+        if not answer:
+            errors.append("Teacher_Answer is empty")
+        if q_type == 'mcq':
+            letters = 'ABCDEFGH'[:len(options)]
+            if len(options) < 2:
+                errors.append("MCQ needs at least two options")
+            elif answer and (len(answer) != 1 or answer.upper() not in letters):
+                errors.append(f"Teacher_Answer '{answer}' must be the letter of an option ({', '.join(letters)})")
+
+        if errors:
+            report.append({'row': pos + 2, 'question_id': q_id, 'errors': errors})
+            continue
+        questions.append({
+            'id': q_id,
+            'exam_code': exam_code,
+            'question': text,
+            'type': q_type,
+            'teacher_answer': answer,
+            'max_score': float(score),
+            'concepts': concepts.get(idx, []),
+            'options': options,
+        })
+    return questions, report
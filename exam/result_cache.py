@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+class GradeResultCache:
+    """Memoizes `grade()` breakdowns for answers already seen.
+
+    Keys combine the compiled question version, a hash of the normalized
+    answer and the grader config, so re-uploading a question or changing
+    weights/model never serves a stale score. An in-process LRU is bounded by
+    approximate size in bytes; an optional local SQLite tier lets all workers
+    on the machine reuse each other's results.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, path: Optional[Path] = None, max_rows: int = 200_000):
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._conn = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS grade_results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        found: Dict[str, Dict] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = json.loads(self._memory[key])
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT key, value FROM grade_results WHERE key IN (%s)" % ",".join("?" * len(chunk)), chunk
+                    ).fetchall()
+                    for key, value in rows:
+                        self._remember(key, value)
+                        found[key] = json.loads(value)
+                        self.shared_hits += 1
+            self.misses += sum(1 for key in missing if key not in found)
+        return found
+
+    def put_many(self, results: Dict[str, Dict]) -> None:
+        if not results:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, result in results.items():
+                value = json.dumps(result)
+                self._remember(key, value)
+                rows.append((key, value, now))
+            if self._conn is not None:
+                self._conn.executemany("INSERT OR REPLACE INTO grade_results VALUES (?, ?, ?)", rows)
+                self._puts += len(rows)
+                if self._puts >= 1000:
+                    self._puts = 0
+                    self._conn.execute(
+                        "DELETE FROM grade_results WHERE key IN ("
+                        " SELECT key FROM grade_results ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.max_rows,),
+                    )
+                self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.shared_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+                'entries': len(self._memory),
+                'bytes': self._bytes,
+            }
+
+    def _remember(self, key: str, value: str) -> None:
+        if key in self._memory:
+            self._bytes -= len(self._memory.pop(key))
+        self._memory[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= len(evicted)
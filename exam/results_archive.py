@@ -0,0 +1,147 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Local Parquet copy of results/*/submissions for offline analytics:
+#   <root>/submissions/exam_code=<code>/part.parquet   one row per submission
+#   <root>/details/exam_code=<code>/part.parquet       one row per answered question
+#   <root>/_state.json                                 high-water mark of the last sync
+# Partitions are hive-style, so pyarrow/pandas/DuckDB read <root>/submissions as one table.
+SUBMISSION_COLUMNS = [
+    'pern_no', 'student_name', 'status', 'total_score', 'total_max_score', 'percentage',
+    'total_questions', 'timestamp', 'graded_at', 'updated_at',
+]
+DETAIL_COLUMNS = [
+    'pern_no', 'position', 'q_id', 'question', 'your_answer', 'score', 'max_score', 'type', 'correct',
+    'concept_score', 'relation_score', 'semantic_similarity', 'penalty',
+]
+ARCHIVE_FIELDS = SUBMISSION_COLUMNS + ['details']
+TIMESTAMP_FIELDS = ('timestamp', 'graded_at', 'updated_at')
+STATE_FILE = '_state.json'
+
+
+def _naive_utc(value):
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def submission_row(data: Dict) -> Dict:
+    row = {col: data.get(col) for col in SUBMISSION_COLUMNS}
+    row['pern_no'] = None if row['pern_no'] is None else str(row['pern_no'])
+    for col in TIMESTAMP_FIELDS:
+        row[col] = _naive_utc(row[col])
+    return row
+
+
+def detail_rows(pern_no: str, details: Iterable[Dict]) -> List[Dict]:
+    """Flatten a submission's `details` array into one row per question."""
+    rows = []
+    for position, detail in enumerate(details or []):
+        inner = detail.get('details') or {}
+        rows.append({
+            'pern_no': str(pern_no),
+            'position': position,
+            'q_id': detail.get('q_id'),
+            'question': detail.get('question'),
+            'your_answer': str(detail.get('your_answer', '')),
+            'score': detail.get('score'),
+            'max_score': inner.get('max_score'),
+            'type': inner.get('type'),
+            'correct': inner.get('correct'),
+            'concept_score': inner.get('concept_score'),
+            'relation_score': inner.get('relation_score'),
+            'semantic_similarity': inner.get('semantic_similarity'),
+            'penalty': inner.get('penalty'),
+        })
+    return rows
+
+
+def archive_schemas():
+    """(submissions, details) pyarrow schemas; every sync writes these, whatever values a batch happens to hold."""
+    import pyarrow as pa
+
+    from .exports import parquet_types
+
+    types = {
+        **parquet_types(),
+        'updated_at': pa.timestamp('us'),
+        'position': pa.int64(),
+        'q_id': pa.string(),
+        'question': pa.string(),
+        'your_answer': pa.string(),
+        'score': pa.float64(),
+        'max_score': pa.float64(),
+        'type': pa.string(),
+        'correct': pa.bool_(),
+        'concept_score': pa.float64(),
+        'relation_score': pa.float64(),
+        'semantic_similarity': pa.float64(),
+        'penalty': pa.float64(),
+    }
+    return tuple(pa.schema([(col, types[col]) for col in columns]) for columns in (SUBMISSION_COLUMNS, DETAIL_COLUMNS))
+
+
+def changed_mark(data: Dict):
+    """When a submission last changed; documents written before `updated_at` existed fall back to `timestamp`."""
+    return data.get('updated_at') or data.get('timestamp')
+
+
+class ResultsArchive:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    # ---- sync state ----
+    def high_water(self) -> Optional[datetime]:
+        path = self.root / STATE_FILE
+        if not path.exists():
+            return None
+        value = json.loads(path.read_text()).get('high_water')
+        return datetime.fromisoformat(value) if value else None
+
+    def save_state(self, high_water: Optional[datetime], **info) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        state = {'high_water': high_water.isoformat() if high_water else None, **info}
+        tmp = self.root / (STATE_FILE + '.tmp')
+        tmp.write_text(json.dumps(state, default=str, indent=2))
+        os.replace(tmp, self.root / STATE_FILE)
+
+    @staticmethod
+    def since(high_water: Optional[datetime], overlap_seconds: float) -> Optional[datetime]:
+        """Where the next sync starts; the overlap covers commits that land just after a run."""
+        return high_water - timedelta(seconds=overlap_seconds) if high_water else None
+
+    # ---- partitions ----
+    def _partition(self, table: str, exam_code: str) -> Path:
+        return self.root / table / f"exam_code={exam_code}" / 'part.parquet'
+
+    def upsert(self, exam_code: str, submissions: List[Dict], details: List[Dict]) -> Tuple[int, int]:
+        """Replace these students' rows in the exam's partitions; returns (submission rows, detail rows) written.
+
+        Both tables are written with archive_schemas(), so partitions and syncs
+        always agree on column types and read back as one dataset.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        from .exports import arrow_table
+
+        changed = pa.array(sorted({row['pern_no'] for row in submissions}), pa.string())
+        written = []
+        for table, rows, schema in zip(('submissions', 'details'), (submissions, details), archive_schemas()):
+            path = self._partition(table, exam_code)
+            frame = arrow_table(([row.get(col) for col in schema.names] for row in rows), schema)
+            if path.exists():
+                # cast: partitions written before the schema was fixed have inferred types
+                existing = pq.read_table(path).select(schema.names).cast(schema)
+                existing = existing.filter(pc.invert(pc.is_in(existing['pern_no'], value_set=changed)))
+                frame = pa.concat_tables([existing, frame])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            pq.write_table(frame, tmp)
+            os.replace(tmp, path)
+            written.append(len(rows))
+        return written[0], written[1]
@@ -0,0 +1,41 @@
+import re
+from typing import List
+
+# Submissions carry `search_tokens`: every prefix of each word of the
+# student's name and of their PERN, lowercased. A search then becomes one
+# indexed array_contains query that reads only the matching documents.
+SEARCH_FIELD = 'search_tokens'
+MAX_PREFIX = 20  # longer query words are cut to this before lookup
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _words(text) -> List[str]:
+    return _WORD.findall(str(text or '').lower())
+
+
+def search_tokens(student_name, pern_no) -> List[str]:
+    tokens = set()
+    for word in _words(student_name) + _words(pern_no):
+        for n in range(1, min(len(word), MAX_PREFIX) + 1):
+            tokens.add(word[:n])
+    return sorted(tokens)
+
+
+def query_words(query: str) -> List[str]:
+    return [word[:MAX_PREFIX] for word in _words(query)]
+
+
+def lookup_token(query: str) -> str:
+    """The token to look a query up by; '' for an empty query.
+
+    PERN-like words (with digits) are far more selective than name words, so
+    they win; otherwise the longest word does.
+    """
+    return max(query_words(query), key=lambda word: (any(c.isdigit() for c in word), len(word)), default='')
+
+
+def matches(query: str, tokens) -> bool:
+    """True if every word of the query is a prefix of a name or PERN word."""
+    tokens = set(tokens or ())
+    return all(word in tokens for word in query_words(query))
@@ -1,3 +1,1658 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import datetime, timedelta
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from google.cloud.firestore_v1 import DELETE_FIELD
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .ai_service import DescriptiveAnswerGrader
+from .embeddings import EmbeddingBackend, make_backend
+from .exam_cache import ExamCache
+from .firestore_batch import ChunkedWriteBatch
+from .drafts import DraftBuffer
+from .idempotency import submit_dedupe
+from .metrics import HTTP_REQUESTS, Histogram, record_firestore, track_request_reads
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# (teacher answer, student answer) pairs spanning close, partial and unrelated answers
+REFERENCE_CORPUS = [
+    ("Steam turbine drives generator to produce electricity",
+     "The turbine spins the generator shaft which makes electric power"),
+    ("Economiser preheats feedwater using flue gas heat",
+     "It uses leftover heat from exhaust gases to warm the water going into the boiler"),
+    ("Superheater raises steam temperature above saturation",
+     "Superheater heats the steam further so it is dry"),
+    ("Boiler drum separates steam from water",
+     "The drum stores water"),
+    ("Plants use sunlight to produce glucose.",
+     "Plants use light to make sugar."),
+    ("Steam turbine drives generator to produce electricity",
+     "I do not know the answer"),
+]
+
+
+def _parquet_supported():
+    from .exports import parquet_supported
+
+    return parquet_supported()
+
+
+def _onnx_model_available():
+    return (settings.GRADER_ONNX_MODEL_DIR / "model.onnx").exists()
+
+
+class CountingBackend(EmbeddingBackend):
+    """A deterministic letter-count embedding that records every encode() call."""
+
+    name = "stub"
+
+    def __init__(self, model_name="stub-model", name="stub"):
+        super().__init__(model_name)
+        self.name = name
+        self.encoded = []
+
+    def encode(self, texts, batch_size=64):
+        self.encoded.append(list(texts))
+        vectors = np.zeros((len(texts), 27), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                vectors[row, ord(ch) - ord('a') if 'a' <= ch <= 'z' else 26] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def _stub_grader(**kwargs):
+    """A DescriptiveAnswerGrader on CountingBackend and a blank spaCy pipeline (no model downloads)."""
+    import spacy
+
+    with mock.patch('spacy.load', return_value=spacy.blank('en')):
+        return DescriptiveAnswerGrader(embedder=kwargs.pop('embedder', None) or CountingBackend(), **kwargs)
+
+
+def _descriptive(question_id, teacher_answer, keywords=()):
+    from .ai_service import Concept, QuestionConfig
+
+    concepts = [Concept(name=kw, keywords=[kw]) for kw in keywords]
+    return QuestionConfig(question_id, type='descriptive', teacher_answer=teacher_answer, concepts=concepts, max_score=10)
+
+
+@skipUnless(_onnx_model_available(), "run `manage.py export_onnx_model` to enable the ONNX parity test")
+class EmbeddingBackendParityTests(SimpleTestCase):
+    TOLERANCE = 0.05  # absolute, on the scaled semantic_similarity score
+
+    def _similarities(self, backend):
+        teachers = backend.encode([t.lower() for t, _ in REFERENCE_CORPUS])
+        students = backend.encode([s for _, s in REFERENCE_CORPUS])
+        sims = np.einsum("ij,ij->i", teachers, students)
+        return [DescriptiveAnswerGrader._scale_similarity(float(s)) for s in sims]
+
+    def test_onnx_int8_semantic_similarity_matches_torch(self):
+        torch_sims = self._similarities(make_backend("torch", MODEL_NAME))
+        onnx_sims = self._similarities(make_backend("onnx", MODEL_NAME, settings.GRADER_ONNX_MODEL_DIR))
+        for (teacher, student), expected, actual in zip(REFERENCE_CORPUS, torch_sims, onnx_sims):
+            with self.subTest(student=student):
+                self.assertAlmostEqual(actual, expected, delta=self.TOLERANCE)
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def _hits(self, keywords, *texts, lemmas=None):
+        from .ai_service import Concept, KeywordMatcher
+
+        concepts = [Concept(name=kw, keywords=[kw]) for kw in keywords]
+        return {keywords[i] for i in KeywordMatcher(concepts, lemmas).match(*texts)}
+
+    def test_keywords_match_whole_words_only(self):
+        self.assertEqual(self._hits(['gas'], 'the gasket leaked'), set())
+        self.assertEqual(self._hits(['gas'], 'flue gas, then steam'), {'gas'})
+
+    def test_phrases_match_consecutive_words(self):
+        keywords = ['heat exchanger', 'steam']
+        self.assertEqual(self._hits(keywords, 'a heat exchanger warms steam'), {'heat exchanger', 'steam'})
+        self.assertEqual(self._hits(keywords, 'heat from the exchanger'), set())
+        self.assertEqual(self._hits(keywords, 'heat-exchanger.'), {'heat exchanger'})
+
+    def test_punctuation_inside_technical_terms_is_kept(self):
+        keywords = ['c++', 'c#', '.net', 'node.js', 'c']
+        self.assertEqual(self._hits(keywords, 'written in c++.'), {'c++'})
+        self.assertEqual(self._hits(keywords, 'c# on .net, or node.js!'), {'c#', '.net', 'node.js'})
+        self.assertEqual(self._hits(keywords, 'a net and a node, see c.'), {'c'})
+
+    def test_plain_keywords_also_match_by_lemma(self):
+        lemmas = {'plants': 'plant', 'c++': 'c ++'}
+        self.assertEqual(self._hits(['plants', 'c++'], 'a plant', 'a plant', lemmas=lemmas), {'plants'})
+        self.assertEqual(self._hits(['plants', 'c++'], 'c code', 'c code', lemmas=lemmas), set())
+
+
+class TeacherEmbeddingCacheTests(SimpleTestCase):
+    TEACHER = 'Steam turbine drives generator to produce electricity'
+
+    def _grader(self, backend, path=None):
+        from .embedding_cache import TeacherEmbeddingCache
+
+        return _stub_grader(embedder=backend, teacher_cache=TeacherEmbeddingCache(backend.cache_key, path=path))
+
+    def _encoded_texts(self, backend):
+        return [text for call in backend.encoded for text in call]
+
+    def test_second_lookup_is_served_from_the_cache(self):
+        backend = CountingBackend()
+        grader = self._grader(backend)
+        grader.compute_semantic_similarities([self.TEACHER], ['the turbine spins the generator'])
+        grader.compute_semantic_similarities([self.TEACHER], ['a generator makes power'])
+        self.assertEqual(self._encoded_texts(backend).count(grader._normalize(self.TEACHER)), 1)
+        self.assertEqual(len(backend.encoded), 2)  # the second call encoded only the student answer
+
+    def test_entries_are_kept_apart_by_backend_cache_key(self):
+        import tempfile
+        from pathlib import Path
+
+        from .embedding_cache import TeacherEmbeddingCache
+
+        torch_key = MODEL_NAME  # SentenceTransformerBackend.cache_key
+        onnx_key = CountingBackend(MODEL_NAME, name='onnx-int8').cache_key
+        self.assertEqual(onnx_key, f'{MODEL_NAME}:onnx-int8')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'teacher.sqlite3'
+            TeacherEmbeddingCache(torch_key, path=path).put_many({'steam': np.ones(3, dtype=np.float32)})
+            self.assertEqual(TeacherEmbeddingCache(onnx_key, path=path).get_many(['steam']), {})
+            self.assertEqual(set(TeacherEmbeddingCache(torch_key, path=path).get_many(['steam'])), {'steam'})
+
+            onnx_backend = CountingBackend(MODEL_NAME, name='onnx-int8')
+            self.assertEqual(self._grader(onnx_backend, path).warm_teacher_embeddings(['steam']), 1)
+            self.assertEqual(onnx_backend.encoded, [['steam']])
+
+    def test_warm_teacher_embeddings_encodes_only_missing_answers(self):
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'teacher.sqlite3'
+            backend = CountingBackend()
+            grader = self._grader(backend, path)
+            self.assertEqual(grader.warm_teacher_embeddings([self.TEACHER, self.TEACHER, '  ', 'Boiler drum']), 2)
+            self.assertEqual(grader.warm_teacher_embeddings([self.TEACHER, 'Boiler drum']), 0)
+            self.assertEqual(len(backend.encoded), 1)
+
+            restarted = CountingBackend()  # another worker, or this one after a restart
+            self.assertEqual(self._grader(restarted, path).warm_teacher_embeddings([self.TEACHER]), 0)
+            self.assertEqual(restarted.encoded, [])
+
+
+class GradeResultCacheTests(SimpleTestCase):
+    def test_second_lookup_hits_memory(self):
+        from .result_cache import GradeResultCache
+
+        cache = GradeResultCache()
+        self.assertEqual(cache.get_many(['k']), {})
+        cache.put_many({'k': {'final_score': 3.0}})
+        self.assertEqual(cache.get_many(['k']), {'k': {'final_score': 3.0}})
+        self.assertEqual((cache.stats()['memory_hits'], cache.stats()['misses']), (1, 1))
+
+    def test_shared_tier_serves_other_workers(self):
+        import tempfile
+        from pathlib import Path
+
+        from .result_cache import GradeResultCache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'results.sqlite3'
+            GradeResultCache(path=path).put_many({'k': {'final_score': 3.0}})
+            other = GradeResultCache(path=path)
+            self.assertEqual(other.get_many(['k', 'missing']), {'k': {'final_score': 3.0}})
+            self.assertEqual((other.stats()['shared_hits'], other.stats()['misses']), (1, 1))
+
+    def test_least_recently_used_results_are_evicted_by_size(self):
+        from .result_cache import GradeResultCache
+
+        value = {'final_score': 1.0}
+        cache = GradeResultCache(max_bytes=2 * len('{"final_score": 1.0}'))
+        cache.put_many({'a': value, 'b': value})
+        cache.get_many(['a'])
+        cache.put_many({'c': value})
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c'])), {'a', 'c'})
+
+    def test_grader_or_weight_changes_invalidate_memoized_results(self):
+        from .result_cache import GradeResultCache
+
+        backend = CountingBackend()
+        grader = _stub_grader(embedder=backend, result_cache=GradeResultCache())
+        cfg = _descriptive('Q1', 'Steam drives the turbine')
+        grader.grade_many([cfg], ['the turbine is driven by steam'])
+        grader.grade_many([cfg], ['the turbine is driven by steam'])
+        self.assertEqual(len(backend.encoded), 1)  # second call served from the cache
+
+        with mock.patch('exam.ai_service.GRADER_VERSION', -1):
+            grader.grade_many([cfg], ['the turbine is driven by steam'])
+        self.assertEqual(len(backend.encoded), 2)
+
+        grader.w_semantic = 0.5
+        grader.grade_many([cfg], ['the turbine is driven by steam'])
+        self.assertEqual(len(backend.encoded), 3)
+
+
+class GradingTests(SimpleTestCase):
+    def test_question_configs_are_built_once_per_upload(self):
+        from .ai_service import QuestionConfig
+        from .grading import score_submission
+
+        grader = _stub_grader()
+        question = {
+            'id': 'Q1', 'exam_code': 'E1', 'type': 'descriptive', 'question': 'What drives the generator?',
+            'teacher_answer': 'Steam drives the turbine', 'max_score': 10,
+            'concepts': [{'name': 'steam', 'keywords': ['steam']}],
+        }
+        question['compiled'] = grader.compile_question(QuestionConfig.from_dict(question), revision='r1').to_dict()
+        answers = {'Q1': {'answer': 'steam turns the turbine'}}
+
+        with mock.patch.object(QuestionConfig, 'from_dict', wraps=QuestionConfig.from_dict) as from_dict:
+            first = score_submission([question], answers, grader)
+            second = score_submission([question], answers, grader)
+            self.assertEqual(from_dict.call_count, 1)
+            self.assertEqual(first, second)
+
+            reuploaded = {**question, 'teacher_answer': 'Steam spins the turbine'}
+            reuploaded['compiled'] = grader.compile_question(QuestionConfig.from_dict(reuploaded), revision='r2').to_dict()
+            from_dict.reset_mock()
+            score_submission([reuploaded], answers, grader)
+            self.assertEqual(from_dict.call_count, 1)
+
+    def _stored_question(self, grader, teacher_answer='Steam turbine drives generator to produce electricity'):
+        """A descriptive question as admin_upload stores it: compiled, teacher embedding warmed."""
+        import json
+
+        from .ai_service import QuestionConfig
+
+        question = {
+            'id': 'Q1', 'exam_code': 'E1', 'type': 'descriptive', 'question': 'What does the turbine do?',
+            'teacher_answer': teacher_answer, 'max_score': 10,
+            'concepts': [{'name': 'turbine', 'keywords': ['turbine']}, {'name': 'generator', 'keywords': ['generator']}],
+        }
+        compiled = grader.compile_questions([QuestionConfig.from_dict(question)], revision='r1')[0]
+        grader.warm_teacher_embeddings([teacher_answer])
+        return {**question, 'compiled': json.loads(json.dumps(compiled.to_dict()))}  # as read back from Firestore
+
+    def test_compiled_artifacts_survive_the_firestore_round_trip(self):
+        from .ai_service import CompiledQuestion, QuestionConfig
+
+        grader = _stub_grader()
+        question = self._stored_question(grader)
+        stored = QuestionConfig.from_dict(question)
+        fresh = QuestionConfig.from_dict({k: v for k, v in question.items() if k != 'compiled'})
+        fresh.compiled = grader.compile_question(fresh, revision='r1')
+        self.assertEqual(stored.compiled, fresh.compiled)
+        self.assertEqual(CompiledQuestion.from_dict(stored.compiled.to_dict()), stored.compiled)
+
+        answer = 'The turbine spins the generator shaft'
+        self.assertEqual(grader.grade(stored, answer), grader.grade(fresh, answer))
+
+    def test_compiled_questions_are_graded_without_reprocessing_the_teacher_answer(self):
+        from .ai_service import QuestionConfig
+        from .embedding_cache import TeacherEmbeddingCache
+
+        backend = CountingBackend()
+        grader = _stub_grader(embedder=backend, teacher_cache=TeacherEmbeddingCache(backend.cache_key))
+        cfg = QuestionConfig.from_dict(self._stored_question(grader))
+        backend.encoded.clear()
+        nlp = grader.nlp = mock.Mock(wraps=grader.nlp)
+
+        grader.grade(cfg, 'The turbine spins the generator')
+        self.assertEqual([call.args[0] for call in nlp.call_args_list], ['the turbine spins the generator'])
+        nlp.pipe.assert_not_called()  # no teacher parse, no keyword lemmas
+        self.assertEqual(backend.encoded, [['The turbine spins the generator']])
+
+    def test_stale_artifacts_are_recompiled(self):
+        from .ai_service import QuestionConfig
+
+        grader = _stub_grader()
+        question = self._stored_question(grader)
+        with mock.patch.object(grader, 'compile_questions', wraps=grader.compile_questions) as compile_questions:
+            grader.compiled_for(QuestionConfig.from_dict(question))
+            compile_questions.assert_not_called()
+
+            with mock.patch('exam.ai_service.GRADER_VERSION', -1):  # compiled by an older grader
+                grader.compiled_for(QuestionConfig.from_dict(question))
+            self.assertEqual(compile_questions.call_count, 1)
+
+            edited = QuestionConfig.from_dict({**question, 'teacher_answer': 'Steam turbine drives the pump'})
+            compiled = grader.compiled_for(edited)  # edited after it was compiled
+            self.assertEqual(compile_questions.call_count, 2)
+        self.assertNotEqual(compiled.version, question['compiled']['version'])
+        self.assertEqual((compiled.revision, compiled.teacher_token_count), ('r1', 5))
+
+    def test_each_answer_goes_through_spacy_once(self):
+        grader = _stub_grader()
+        cfg = _descriptive('Q1', 'Steam turbine drives generator to produce electricity', ['turbine', 'generator'])
+        grader.compiled_for(cfg)  # the teacher side is compiled at upload
+        nlp = grader.nlp = mock.Mock(wraps=grader.nlp)
+
+        grader.grade(cfg, 'The turbine spins the generator')
+        self.assertEqual((nlp.call_count, nlp.pipe.call_count), (1, 0))
+
+        nlp.reset_mock()
+        grader.grade_many([cfg, cfg, cfg], ['The turbine spins', 'A generator makes power', 'Steam'])
+        self.assertEqual(nlp.call_count, 0)
+        self.assertEqual([len(call.args[0]) for call in nlp.pipe.call_args_list], [3])
+
+        parsed = grader.parse_answer('the turbines turn the generators')
+        nlp.reset_mock()
+        for _ in range(3):  # the concept, relation and penalty stages all reuse the parse
+            grader.compute_concept_score(cfg, parsed)
+            grader.compute_relation_score(cfg, parsed)
+            grader.compute_penalty(cfg, parsed)
+        nlp.assert_not_called()
+        nlp.pipe.assert_not_called()
+
+    def test_grade_many_matches_grade_for_each_pair(self):
+        from .result_cache import GradeResultCache
+
+        cfgs = [
+            _descriptive('Q1', 'Steam turbine drives generator to produce electricity', ['turbine', 'generator']),
+            _descriptive('Q2', 'Economiser preheats feedwater using flue gas heat', ['flue gas', 'feedwater']),
+        ]
+        pairs = [
+            (cfgs[0], 'The turbine spins the generator shaft which makes electric power'),
+            (cfgs[1], 'It uses leftover heat from flue gas to warm the feedwater'),
+            (cfgs[0], 'I do not know the answer'),
+            (cfgs[0], 'The turbine spins the generator shaft which makes electric power'),
+        ]
+        expected = [_stub_grader().grade(cfg, answer) for cfg, answer in pairs]
+        for result_cache in (None, GradeResultCache()):
+            grader = _stub_grader(result_cache=result_cache)
+            with self.subTest(result_cache=result_cache is not None):
+                batched = grader.grade_many([cfg for cfg, _ in pairs], [answer for _, answer in pairs])
+                self.assertEqual(len(batched), len(expected))
+                for want, got in zip(expected, batched):
+                    self.assertEqual(set(got), set(want))
+                    for name, value in want.items():
+                        self.assertAlmostEqual(got[name], value, places=6, msg=name)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        hist = Histogram('test_latency_seconds', 'test', ('stage',), buckets=(0.1, 1.0))
+        hist.observe(0.05, stage='parse')
+        hist.observe(0.5, stage='parse')
+        lines = hist.render()
+        self.assertIn('test_latency_seconds_bucket{stage="parse",le="0.1"} 1', lines)
+        self.assertIn('test_latency_seconds_bucket{stage="parse",le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{stage="parse",le="+Inf"} 2', lines)
+        self.assertIn('test_latency_seconds_count{stage="parse"} 2', lines)
+
+    def test_firestore_reads_are_tallied_per_request(self):
+        with track_request_reads() as reads:
+            record_firestore('query', 0.01, reads=7)
+            record_firestore('document_get', 0.01, reads=1)
+            record_firestore('document_set', 0.01, writes=1)
+        self.assertEqual(reads[0], 8)
+
+    @override_settings(METRICS_TOKEN='', GRADER_PRELOAD=True)
+    def test_views_are_counted_and_exposed(self):
+        before = HTTP_REQUESTS.value(view='readiness', method='GET', status=503)
+        self.client.get('/healthz/ready/')
+        self.assertEqual(HTTP_REQUESTS.value(view='readiness', method='GET', status=503), before + 1)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('exam_http_request_duration_seconds_count{view="readiness",method="GET"}', response.content.decode())
+
+    @override_settings(GRADER_PRELOAD=False)
+    def test_page_only_workers_are_ready_without_the_grader(self):
+        response = self.client.get('/healthz/ready/')
+        self.assertEqual((response.status_code, response.json()['ready']), (200, True))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+# ==============================
+# IN-MEMORY FIRESTORE
+# ==============================
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return None if self._data is None else dict(self._data)
+
+
+def _apply_writes(current, data):
+    """Merge `data` into a copy of `current` the way Firestore applies a merge-set, transforms included."""
+    current = dict(current or {})
+    for key, value in data.items():
+        kind = type(value).__name__
+        if value is DELETE_FIELD:
+            current.pop(key, None)
+        elif kind == 'Increment':
+            current[key] = current.get(key, 0) + value.value
+        elif kind in ('Maximum', 'Minimum'):
+            pick = max if kind == 'Maximum' else min
+            current[key] = pick(current[key], value.value) if key in current else value.value
+        elif isinstance(value, dict):
+            current[key] = _apply_writes(current.get(key), value)
+        else:
+            current[key] = value
+    return current
+
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self._store = store
+        self._path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._store, self._path + (name,))
+
+    def get(self, transaction=None):
+        self._store.reads += 1
+        return FakeSnapshot(self.id, self._store.docs.get(self._path))
+
+    def set(self, data, merge=False):
+        self._store.writes += 1
+        current = self._store.docs.get(self._path) if merge else None
+        if isinstance(merge, list):  # listed fields are replaced whole, not merged into
+            current = {k: v for k, v in (current or {}).items() if k not in merge}
+        self._store.docs[self._path] = _apply_writes(current, data)
+
+    def update(self, data):
+        self.set(data, merge=True)
+
+    def delete(self):
+        self._store.writes += 1
+        self._store.docs.pop(self._path, None)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+
+    def commit(self):
+        assert len(self._ops) <= 500, "Firestore rejects batches over 500 writes"
+        self._store.commits += 1
+        for op in self._ops:
+            op()
+
+
+_OPERATORS = {
+    '==': lambda a, b: a == b, '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b, '>=': lambda a, b: a >= b, 'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: b in a,
+}
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregation:
+    def __init__(self, query):
+        self._query = query
+        self._fields = []
+
+    def _add(self, kind, field, alias):
+        self._fields.append((kind, field, alias))
+        return self
+
+    def count(self, alias):
+        return self._add('count', None, alias)
+
+    def sum(self, field, alias):
+        return self._add('sum', field, alias)
+
+    def avg(self, field, alias):
+        return self._add('avg', field, alias)
+
+    def get(self):
+        rows = [data for _, data in self._query._matches()]
+        self._query._store.reads += max(1, -(-len(rows) // 1000))  # one read per 1000 index entries
+        results = []
+        for kind, field, alias in self._fields:
+            values = [row[field] for row in rows if field in row] if field else rows
+            if kind == 'count':
+                value = len(values)
+            elif kind == 'sum':
+                value = sum(values)
+            else:
+                value = sum(values) / len(values) if values else None
+            results.append(FakeAggregationResult(alias, value))
+        return [results]
+
+
+class FakeQuery:
+    def __init__(self, store, path, filters=(), orders=(), limit=None, fields=None, start=None, end=None, last=None):
+        self._store = store
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._fields = fields
+        self._start = start
+        self._end = end
+        self._last = last
+
+    def _copy(self, **changes):
+        state = dict(
+            filters=self._filters, orders=self._orders, limit=self._limit, fields=self._fields,
+            start=self._start, end=self._end, last=self._last,
+        )
+        return FakeQuery(self._store, self._path, **{**state, **changes})
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def start_after(self, values):
+        return self._copy(start=values)
+
+    def end_before(self, values):
+        return self._copy(end=values)
+
+    def limit_to_last(self, n):
+        return self._copy(last=n)
+
+    def _key(self, doc_id, data):
+        return tuple(doc_id if f == '__name__' else data[f] for f, _ in self._orders)
+
+    def _cursor_key(self, values):
+        if isinstance(values, FakeSnapshot):
+            values = {**values.to_dict(), '__name__': values.id}
+        return tuple(values[f] for f, _ in self._orders)
+
+    def _matches(self):
+        depth = len(self._path) + 1
+        rows = [
+            (path[-1], data) for path, data in self._store.docs.items()
+            if len(path) == depth and path[:-1] == self._path
+            and all(f in data and _OPERATORS[op](data[f], v) for f, op, v in self._filters)
+            and all(f == '__name__' or f in data for f, _ in self._orders)
+        ]
+        for field, direction in reversed(self._orders):
+            rows.sort(
+                key=lambda row: row[0] if field == '__name__' else row[1][field],
+                reverse=direction == 'DESCENDING',
+            )
+        if self._start is not None:  # ascending orders only
+            rows = [row for row in rows if self._key(*row) > self._cursor_key(self._start)]
+        if self._end is not None:
+            rows = [row for row in rows if self._key(*row) < self._cursor_key(self._end)]
+        if self._last is not None:
+            rows = rows[-self._last:]
+        return rows[:self._limit] if self._limit is not None else rows
+
+    def stream(self, transaction=None):
+        rows = self._matches()
+        self._store.reads += max(1, len(rows))  # an empty result still costs one read
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield FakeSnapshot(doc_id, data)
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias):
+        return FakeAggregation(self).count(alias)
+
+    def sum(self, field, alias):
+        return FakeAggregation(self).sum(field, alias)
+
+    def avg(self, field, alias):
+        return FakeAggregation(self).avg(field, alias)
+
+
+class FakeTransaction(FakeBatch):
+    """Buffers writes and applies them on commit, as firestore_v1.transactional drives it."""
+
+    _read_only = False
+    _max_attempts = 1
+    _id = b'fake'
+
+    def _clean_up(self):
+        self._ops = []
+
+    def _begin(self, retry_id=None):
+        pass
+
+    def _commit(self):
+        self.commit()
+
+    def _rollback(self):
+        self._ops = []
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store, path):
+        super().__init__(store, path)
+
+    def document(self, doc_id):
+        return FakeDocument(self._store, self._path + (str(doc_id),))
+
+
+class FakeFirestore:
+    """Just enough of the client for the code under test; counts document reads and writes."""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+
+class FakeAsyncDocument(FakeDocument):
+    def collection(self, name):
+        return FakeAsyncCollection(self._store, self._path + (name,))
+
+    async def get(self, transaction=None):
+        return super().get(transaction)
+
+    async def set(self, data, merge=False):
+        super().set(data, merge)
+
+    async def update(self, data):
+        super().update(data)
+
+    async def delete(self):
+        super().delete()
+
+
+class FakeAsyncCollection(FakeCollection):
+    def document(self, doc_id):
+        return FakeAsyncDocument(self._store, self._path + (str(doc_id),))
+
+
+class FakeAsyncFirestore:
+    """The AsyncClient surface of a FakeFirestore; reads and writes land in the same store."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def collection(self, name):
+        return FakeAsyncCollection(self._store, (name,))
+
+    async def get_all(self, refs):
+        for ref in refs:
+            yield await ref.get()
+
+
+class ExamCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeFirestore()
+        self.db.collection('exam_codes').document('E1').set({'code': 'E1', 'active': False})
+        patcher = mock.patch('exam.exam_cache.db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = mock.patch('exam.exam_cache.time.monotonic', return_value=1000.0)
+        self.now = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def _load(self, code):
+        return self.db.collection('exam_codes').document(code).get().to_dict()
+
+    def test_repeated_lookups_within_ttl_do_not_read(self):
+        cache = ExamCache(ttl=30)
+        cache.get('exam', 'E1', self._load)
+        reads = self.db.reads
+        for _ in range(100):
+            cache.get('exam', 'E1', self._load)
+        self.assertEqual(self.db.reads, reads)
+
+    def test_unchanged_entry_is_revalidated_with_one_stamp_read(self):
+        cache = ExamCache(ttl=30)
+        cache.get('exam', 'E1', self._load)
+        reads = self.db.reads
+        self.now.return_value += 31
+        self.assertEqual(cache.get('exam', 'E1', self._load)['active'], False)
+        self.assertEqual(self.db.reads, reads + 1)  # the version stamp, not the exam
+
+    def test_invalidation_reaches_other_workers_after_ttl(self):
+        admin_worker, student_worker = ExamCache(ttl=30), ExamCache(ttl=30)
+        self.assertFalse(student_worker.get('exam', 'E1', self._load)['active'])
+
+        self.db.collection('exam_codes').document('E1').update({'active': True})
+        admin_worker.invalidate('E1')
+        self.assertTrue(admin_worker.get('exam', 'E1', self._load)['active'])
+
+        self.now.return_value += 31
+        self.assertTrue(student_worker.get('exam', 'E1', self._load)['active'])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ExamCache(ttl=30, max_items=2)
+        for code in ('A', 'B', 'A', 'C'):
+            cache.get('exam', code, lambda c: {'code': c})
+        loads = []
+        cache.get('exam', 'B', lambda c: loads.append(c))
+        self.assertEqual(loads, ['B'])
+
+
+class QuestionUploadTests(SimpleTestCase):
+    def _sheet(self, rows):
+        import pandas as pd
+
+        return pd.DataFrame(rows)
+
+    def test_concepts_and_options_are_parsed_per_row(self):
+        from .question_upload import parse_question_sheet
+
+        questions, report = parse_question_sheet(self._sheet([
+            {'Question': 'Explain the Rankine cycle', 'Type': 'descriptive', 'Teacher_Answer': 'Boiler, turbine...',
+             'Max_Score': 10, 'Concept_Names': 'Rankine, Condenser', 'Concept_Keywords': 'rankine,Cycle; condenser'},
+            {'Question': 'Heart of the plant?', 'Type': 'MCQ', 'Teacher_Answer': 'A', 'Max_Score': 1,
+             'option1': 'Boiler', 'option2': 'Pump', 'option3': None},
+        ]), 'E1')
+        self.assertEqual(report, [])
+        self.assertEqual(questions[0]['concepts'], [
+            {'name': 'Rankine', 'keywords': ['rankine', 'cycle']},
+            {'name': 'Condenser', 'keywords': ['condenser']},
+        ])
+        self.assertEqual(questions[1]['options'], ['Boiler', 'Pump'])
+        self.assertEqual([q['id'] for q in questions], ['E1_0', 'E1_1'])
+
+    def test_invalid_rows_are_reported_with_sheet_row_numbers(self):
+        from .question_upload import parse_question_sheet
+
+        questions, report = parse_question_sheet(self._sheet([
+            {'Question': 'Fine', 'Type': 'descriptive', 'Teacher_Answer': 'Yes', 'Max_Score': 2},
+            {'Question': '', 'Type': 'essay', 'Teacher_Answer': 'x', 'Max_Score': 'ten'},
+            {'Question': 'Pick', 'Type': 'mcq', 'Teacher_Answer': 'C', 'Max_Score': 1, 'option1': 'a', 'option2': 'b'},
+        ]), 'E1')
+        self.assertEqual([q['id'] for q in questions], ['E1_0'])
+        self.assertEqual([r['row'] for r in report], [3, 4])
+        self.assertEqual(len(report[0]['errors']), 3)
+        self.assertIn("letter of an option", report[1]['errors'][0])
+
+
+class BatchedWriteTests(SimpleTestCase):
+    def test_writes_are_committed_in_chunks_of_at_most_500(self):
+        db = FakeFirestore()
+        with ChunkedWriteBatch(db) as batch:
+            for i in range(1201):
+                batch.set(db.collection('c').document(str(i)), {'n': i})
+        self.assertEqual((db.commits, batch.writes, len(db.docs)), (3, 1201, 1201))
+
+    def test_large_question_sets_are_sharded_and_read_back_in_order(self):
+        from . import question_store
+
+        db = FakeFirestore()
+        questions = [{'id': f'E1_{i}', 'question': 'x' * 2000, 'max_score': 1.0} for i in range(1200)]
+        with mock.patch.object(question_store, 'db', db):
+            question_store.save_questions('E1', questions, revision='r1')
+            self.assertEqual(question_store.load_questions('E1'), questions)
+
+            question_store.save_questions('E1', questions[:10], revision='r2')
+            self.assertEqual(question_store.load_questions('E1'), questions[:10])
+        self.assertEqual([p for p in db.docs if 'shards' in p], [])  # r1 shards cleaned up
+
+    def test_a_re_upload_between_reads_never_yields_a_partial_set(self):
+        from . import question_store
+
+        db = FakeFirestore()
+        old = [{'id': f'E1_{i}', 'question': 'x' * 2000, 'max_score': 1.0} for i in range(1200)]
+        new = [{**q, 'question': 'y' * 2000} for q in old[:600]]
+        get_all = db.get_all
+
+        def re_upload_first(refs):
+            db.get_all = get_all
+            question_store.save_questions('E1', new, revision='r2')  # deletes the r1 shards about to be read
+            return get_all(refs)
+
+        with mock.patch.object(question_store, 'db', db):
+            question_store.save_questions('E1', old, revision='r1')
+            db.get_all = re_upload_first
+            self.assertEqual(question_store.load_questions('E1'), new)
+
+            del db.docs[('question_sets', 'E1', 'shards', 'r2_1')]  # lost for good
+            with self.assertRaises(RuntimeError):
+                question_store.load_questions('E1')
+
+
+class QueryReadCountTests(SimpleTestCase):
+    """Documents read per request, counted the way Firestore bills them."""
+
+    def setUp(self):
+        from . import exam_cache
+
+        self.db = FakeFirestore()
+        modules = ('exam.views', 'exam.queries', 'exam.exam_cache', 'exam.question_store', 'exam.exam_stats', 'exam.drafts')
+        for module in modules:
+            patcher = mock.patch(f'{module}.db', self.db)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module in ('exam.views', 'exam.exam_cache', 'exam.question_store', 'exam.drafts'):
+            patcher = mock.patch(f'{module}.adb', lambda: FakeAsyncFirestore(self.db))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        exam_cache._exam_cache.clear()
+        self.addCleanup(exam_cache._exam_cache.clear)
+        self.addCleanup(submit_dedupe.clear)
+        self.drafts = DraftBuffer(interval=3600, max_pending=100)  # flushed by hand, no thread
+        patcher = mock.patch('exam.drafts._draft_buffer', self.drafts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for code in ('E1', 'E2', 'E3'):
+            self.db.collection('exam_codes').document(code).set(
+                {'code': code, 'test_name': f'Test {code}', 'duration': 30, 'active': True}
+            )
+        self.db.collection('question_sets').document('E1').set({'questions': [{'id': 'E1_0'}]})
+        self.submissions = self.db.collection('results').document('E1').collection('submissions')
+        for i in range(1200):
+            self.submissions.document(str(i)).set({
+                'student_name': f'Student {i}', 'pern_no': str(i), 'status': 'graded', 'percentage': i % 100,
+                'total_score': i % 100, 'total_max_score': 100, 'answers': {'q': 'long answer ' * 50},
+                'timestamp': datetime(2026, 1, 1) + timedelta(minutes=i),
+            })
+        for i in range(1200, 1205):
+            self.submissions.document(str(i)).set({
+                'student_name': f'Student {i}', 'pern_no': str(i), 'status': 'pending',
+                'timestamp': datetime(2026, 1, 2),
+            })
+        self.db.reads = 0
+
+    def _request(self, view, method='get', data=None, **session):
+        from . import views
+
+        request = getattr(RequestFactory(), method)('/', data or {})
+        request.session = SessionStore()
+        request.session.update(session)
+        self.db.reads = 0
+        view = getattr(views, view)
+        response = async_to_sync(view)(request) if iscoroutinefunction(view) else view(request)
+        return response, self.db.reads
+
+    def test_existence_check_reads_one_document(self):
+        from .queries import exists
+
+        self.assertTrue(exists(self.submissions.where('status', '==', 'graded')))
+        self.assertEqual(self.db.reads, 1)
+
+    def test_exam_code_list_reads_each_code_once(self):
+        response, reads = self._request('admin_codes', admin_logged_in=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, 3)
+
+    def test_result_summary_uses_aggregations(self):
+        from .queries import result_summary
+
+        summary = result_summary(self.submissions)
+        self.assertEqual((summary['total'], summary['max'], summary['min']), (1200, 99.0, 0.0))
+        self.assertEqual(summary['ranges'], [480, 360, 360])
+        # count+avg over 1200 entries (2), two range counts (1 each), top and bottom score (1 each)
+        self.assertEqual(self.db.reads, 6)
+
+    def test_admin_stats_reads_the_aggregate_document(self):
+        from .exam_stats import rebuild_exam_stats
+
+        rebuild_exam_stats('E1')
+        response, reads = self._request('admin_stats', data={'code': 'E1'}, admin_logged_in=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, 3 + 1 + 51)  # codes dropdown, exam_stats/E1, one page plus one
+
+    @override_settings(ADMIN_STATS_PAGE_SIZE=500)
+    def test_admin_stats_pages_through_submissions_with_cursors(self):
+        from .exam_stats import rebuild_exam_stats
+        from .queries import paginate
+
+        rebuild_exam_stats('E1')
+        listing = self.submissions.select(['pern_no', 'timestamp'])
+        seen, after, pages = [], '', []
+        while True:
+            page = paginate(listing, 'timestamp', 500, after=after)
+            pages.append(page)
+            seen += [doc.id for doc in page.docs]
+            if not page.next_cursor:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, [str(i) for i in range(1205)])
+        self.assertEqual([len(p.docs) for p in pages], [500, 500, 205])
+
+        back = paginate(listing, 'timestamp', 500, before=pages[2].prev_cursor)
+        self.assertEqual([doc.id for doc in back.docs], seen[500:1000])
+        self.assertIsNotNone(back.prev_cursor)
+
+        self.db.reads = 0
+        response, reads = self._request('admin_stats', data={'code': 'E1', 'after': pages[1].next_cursor}, admin_logged_in=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, 3 + 1 + 205)
+        self.assertIn('before=', response.content.decode())
+
+    def test_admin_stats_lists_what_the_totals_count(self):
+        from .exam_stats import rebuild_exam_stats
+
+        rebuild_exam_stats('E1')
+        self.submissions.document('0').set({'status': DELETE_FIELD}, merge=True)  # graded before statuses existed
+        self.submissions.document('1').set(  # re-submitted, waiting to be graded again
+            {'status': 'pending', 'percentage': DELETE_FIELD, 'total_score': DELETE_FIELD}, merge=True
+        )
+        self.submissions.document('1200').set({'timestamp': datetime(2025, 12, 31)}, merge=True)  # on the first page
+        response, _ = self._request('admin_stats', data={'code': 'E1'}, admin_logged_in=True)
+        content = response.content.decode()
+        self.assertIn("'doc_id': '0'", content)
+        self.assertIn("'score': 'Regrading', 'percentage': '1.0%'", content)
+        self.assertNotIn("'doc_id': '1200'", content)  # a first submission still queued is not in the totals
+
+    def test_search_reads_only_matching_submissions(self):
+        from .exam_stats import rebuild_exam_stats
+
+        rebuild_exam_stats('E1')  # backfills search tokens on the seeded submissions
+        response, reads = self._request('admin_stats', data={'code': 'E1', 'search': 'student 119'}, admin_logged_in=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, 3 + 1 + 11)  # PERNs 119 and 1190-1199
+        self.assertIn("Showing <strong>11</strong> results", response.content.decode())
+
+    def test_search_finds_matches_past_the_first_page_of_its_lookup(self):
+        from .exam_stats import rebuild_exam_stats
+
+        for i in (195, 1199):
+            self.submissions.document(str(i)).update({'student_name': 'Zed Student'})
+        rebuild_exam_stats('E1')
+        # looked up by '1', which more than a page of PERNs start with; 'zed' only matches two of them
+        response, _ = self._request('admin_stats', data={'code': 'E1', 'search': 'zed 1'}, admin_logged_in=True)
+        content = response.content.decode()
+        self.assertIn("Showing <strong>2</strong> results", content)
+        self.assertNotIn("only the first", content)
+        self.assertEqual(content.count('Zed Student'), 2)
+
+    def test_search_says_when_it_stopped_at_the_limit(self):
+        from . import views
+        from .exam_stats import rebuild_exam_stats
+
+        rebuild_exam_stats('E1')
+        response, reads = self._request('admin_stats', data={'code': 'E1', 'search': 'student'}, admin_logged_in=True)
+        content = response.content.decode()
+        self.assertIn(f"Showing <strong>{views.SEARCH_RESULT_LIMIT}</strong> results", content)
+        self.assertIn(f"only the first {views.SEARCH_RESULT_LIMIT} matches", content)
+        self.assertEqual(reads, 3 + 1 + 2 * views.SEARCH_RESULT_LIMIT)  # stops at the page with one match too many
+
+    def test_csv_export_streams_rows_page_by_page(self):
+        from django.http import StreamingHttpResponse
+
+        response, reads = self._request_export('csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(reads, 500)  # only the first page before the response is returned
+        content = iter(response.streaming_content)
+        head = [next(content) for _ in range(1 + 500)]
+        self.assertEqual(self.db.reads, 500)  # the first page goes out before the second is read
+        head.append(next(content))
+        self.assertEqual(self.db.reads, 1000)
+        lines = b''.join(head + list(content)).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['Perno', 'student_name'])
+        self.assertEqual(len(lines), 1 + 1205)
+        self.assertIn('2026-01-01 00:00:00', lines[1])
+        self.assertEqual(self.db.reads, 1205)  # pages of 500, no page past the end
+
+    def test_xlsx_export_is_a_readable_workbook(self):
+        import openpyxl
+
+        response, _ = self._request_export('xlsx')
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook['Results'].iter_rows(values_only=True))
+        self.assertEqual(len(rows), 1 + 1205)
+        self.assertEqual((rows[1][0], rows[1][5]), ('0', 0))
+        self.assertEqual(rows[1][7], datetime(2026, 1, 1))
+
+    def test_export_of_an_exam_without_results_is_404(self):
+        from . import views
+
+        request = RequestFactory().get('/', {'format': 'csv'})
+        self.assertEqual(views.download_results(request, 'E2').status_code, 404)
+
+    def _request_export(self, export_format):
+        from . import views
+
+        request = RequestFactory().get('/', {'format': export_format})
+        self.db.reads = 0
+        return views.download_results(request, 'E1'), self.db.reads
+
+    def test_entering_a_cached_exam_code_reads_nothing(self):
+        response, reads = self._request('enter_exam_code', 'post', {'exam_code': 'E1'}, student_logged_in=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(reads, 3)  # version stamp, exam, question set
+
+        response, reads = self._request('enter_exam_code', 'post', {'exam_code': 'E1'}, student_logged_in=True)
+        self.assertEqual(reads, 0)
+
+    def _student_request(self, payload, key=None, pern_no='5000'):
+        import json
+
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = RequestFactory().post('/', json.dumps(payload), content_type='application/json', **headers)
+        request.session = SessionStore()
+        request.session.update(
+            {'student_logged_in': True, 'exam_code': 'E1', 'pern_no': pern_no, 'student_name': 'New Student'}
+        )
+        return request
+
+    def _post(self, view, payload, queue=None, key=None, pern_no='5000'):
+        import json
+
+        from . import views
+
+        request = self._student_request(payload, key, pern_no)
+        queue = queue or self._queue()
+        with mock.patch('exam.views.get_grading_queue', return_value=queue), \
+                mock.patch('exam.views.current_grading_queue', return_value=queue):
+            response = async_to_sync(getattr(views, view))(request)
+        return response, json.loads(response.content)
+
+    def _submit(self, queue, key=None):
+        return self._post('submit_exam', {'answers': {'E1_0': 'A'}}, queue, key)
+
+    def _queue(self, accepts=True):
+        queue = mock.Mock()
+        queue.submit.return_value = accepts
+        queue.status.return_value = None
+        return queue
+
+    def test_async_submit_stores_answers_and_queues_grading(self):
+        queue = self._queue()
+        response, _ = self._submit(queue)
+
+        self.assertEqual(response.status_code, 202)
+        stored = self.db.docs[('results', 'E1', 'submissions', '5000')]
+        self.assertEqual((stored['status'], stored['answers']), ('pending', {'E1_0': 'A'}))
+        self.assertEqual(queue.submit.call_args.args[0].key, 'E1/5000')
+
+    def test_retried_submit_is_stored_and_graded_once(self):
+        queue = self._queue()
+        self._submit(queue, key='k1')
+        writes = self.db.writes
+        queue.status.return_value = 'grading'
+
+        response, body = self._submit(queue, key='k1')
+        self.assertEqual((response.status_code, body['status'], body['replayed']), (202, 'grading', True))
+        self.assertEqual((queue.submit.call_count, self.db.writes), (1, writes))
+
+        self._submit(queue, key='k2')  # a new attempt is graded again
+        self.assertEqual(queue.submit.call_count, 2)
+
+    def test_submit_already_graded_elsewhere_is_not_regraded(self):
+        self.submissions.document('5000').set({'status': 'graded', 'idempotency_key': 'k1', 'percentage': 80})
+        queue = self._queue()
+
+        response, body = self._submit(queue, key='k1')
+        self.assertEqual((response.status_code, body['status']), (200, 'graded'))
+        queue.submit.assert_not_called()
+        self.assertEqual(self.db.docs[('results', 'E1', 'submissions', '5000')]['percentage'], 80)
+
+    def test_retry_after_a_cancelled_submit_completes(self):
+        from . import views
+
+        stalled = []
+
+        async def stalled_questions(exam_code):
+            stalled.append(exam_code)
+            await asyncio.Event().wait()
+
+        async def disconnect_then_retry():
+            with mock.patch('exam.views.aget_questions', stalled_questions):
+                first = asyncio.ensure_future(views.submit_exam(self._student_request({'answers': {}}, key='k1')))
+                while not stalled:
+                    await asyncio.sleep(0)
+                first.cancel()  # what Django does when an ASGI client disconnects
+                with self.assertRaises(asyncio.CancelledError):
+                    await first
+            retry = views.submit_exam(self._student_request({'answers': {'E1_0': 'A'}}, key='k1'))
+            return await asyncio.wait_for(retry, timeout=5)
+
+        queue = self._queue()
+        with mock.patch('exam.views.get_grading_queue', return_value=queue):
+            response = async_to_sync(disconnect_then_retry)()
+        self.assertEqual(response.status_code, 202)
+        queue.submit.assert_called_once()
+
+    def test_status_poll_without_a_queue_reads_the_submission(self):
+        import json
+
+        from . import grading_queue, views
+
+        self.submissions.document('5000').set({'status': 'graded', 'total_score': 8.04, 'percentage': 80.4})
+        with mock.patch('exam.grading_queue._grading_queue', None), \
+                mock.patch('exam.grading_queue.db', self.db), \
+                mock.patch('exam.grading_queue.GradingQueue') as make_queue, \
+                mock.patch('exam.grading_queue.get_grader') as get_grader:
+            response = views.submission_status(self._student_request({}))
+            self.assertIsNone(grading_queue.current_grading_queue())
+        make_queue.assert_not_called()
+        get_grader.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'status': 'graded', 'total_score': 8.0, 'percentage': 80.4})
+
+    def test_rejected_submit_can_be_retried_with_the_same_key(self):
+        response, _ = self._submit(self._queue(accepts=False), key='k1')
+        self.assertEqual(response.status_code, 503)
+
+        queue = self._queue()
+        response, _ = self._submit(queue, key='k1')
+        self.assertEqual(response.status_code, 202)
+        queue.submit.assert_called_once()
+
+
+    def test_autosaves_are_coalesced_into_one_write_per_student(self):
+        self.db.collection('answer_drafts').document('E1').collection('students').document('5000').set(
+            {'answers': {'E1_0': {'answer': 'old'}, 'E1_9': {'answer': 'kept'}}, 'revision': 1}
+        )
+        for revision in range(2, 12):
+            self.drafts.add('E1', '5000', {'E1_0': {'answer': f'draft {revision}'}}, revision)
+        self.drafts.add('E1', '5001', {'E1_0': {'answer': 'other'}}, 1)
+        writes, commits = self.db.writes, self.db.commits
+
+        self.assertEqual(self.drafts.flush(), 2)
+        self.assertEqual((self.db.writes - writes, self.db.commits - commits), (2, 1))
+        stored = self.db.docs[('answer_drafts', 'E1', 'students', '5000')]
+        self.assertEqual(stored['answers'], {'E1_0': {'answer': 'draft 11'}, 'E1_9': {'answer': 'kept'}})
+        self.assertEqual((stored['revision'], stored['saves']), (11, 10))
+        self.assertEqual(self.drafts.flush(), 0)
+
+    def test_submit_sends_only_the_changes_since_the_last_autosave(self):
+        response, _ = self._post('save_draft', {'changes': {'E1_0': {'answer': 'saved'}, 'E9_9': {}}, 'revision': 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.drafts.pending('E1', '5000').answers, {'E1_0': {'answer': 'saved'}})  # known ids only
+
+        self.drafts.flush()
+        response, _ = self._post('submit_exam', {'changes': {}, 'base_revision': 1}, key='k1')
+        self.assertEqual(response.status_code, 202)
+        stored = self.db.docs[('results', 'E1', 'submissions', '5000')]
+        self.assertEqual(stored['answers'], {'E1_0': {'answer': 'saved'}})
+        self.assertNotIn(('answer_drafts', 'E1', 'students', '5000'), self.db.docs)
+
+    def test_submit_asks_for_all_answers_when_saved_drafts_were_lost(self):
+        self._post('save_draft', {'changes': {'E1_0': {'answer': 'saved'}}, 'revision': 3})
+        self.drafts.discard('E1', '5000')  # as if the worker restarted before flushing
+
+        response, body = self._post('submit_exam', {'changes': {}, 'base_revision': 3}, key='k1')
+        self.assertEqual((response.status_code, body['resend_answers']), (409, True))
+
+        response, _ = self._post('submit_exam', {'answers': {'E1_0': {'answer': 'saved'}}}, key='k1')
+        self.assertEqual(response.status_code, 202)
+
+
+    def test_submit_asks_for_all_answers_while_another_worker_holds_saves(self):
+        self.db.collection('question_sets').document('E1').set({'questions': [{'id': 'E1_0'}, {'id': 'E1_1'}]})
+        other_worker = DraftBuffer(interval=3600, max_pending=100)
+        for revision in (1, 2, 3):
+            other_worker.add('E1', '5000', {'E1_0': {'answer': f'draft {revision}'}}, revision)
+        self._post('save_draft', {'changes': {'E1_1': {'answer': 'last'}}, 'revision': 4})
+
+        response, _ = self._post('submit_exam', {'changes': {}, 'base_revision': 4}, key='k1')
+        self.assertEqual(response.status_code, 409)
+
+        other_worker.flush()
+        response, _ = self._post('submit_exam', {'changes': {}, 'base_revision': 4}, key='k1')
+        self.assertEqual(response.status_code, 202)
+        stored = self.db.docs[('results', 'E1', 'submissions', '5000')]
+        self.assertEqual(stored['answers'], {'E1_0': {'answer': 'draft 3'}, 'E1_1': {'answer': 'last'}})
+
+    def test_malformed_submits_and_drafts_are_rejected_not_failed(self):
+        for payload in ({'changes': {}, 'base_revision': 'x'}, {'changes': {}, 'base_revision': None},
+                        {'changes': ['E1_0'], 'base_revision': 1}, ['E1_0']):
+            response, _ = self._post('submit_exam', payload, key='k1')
+            self.assertEqual(response.status_code, 400, payload)
+        for payload in ({'changes': {}, 'revision': 'x'}, {'changes': 'E1_0', 'revision': 1}, ['E1_0']):
+            response, _ = self._post('save_draft', payload)
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertNotIn(('results', 'E1', 'submissions', '5000'), self.db.docs)
+
+    def test_a_save_landing_after_submit_does_not_bring_the_draft_back(self):
+        from . import drafts
+
+        self._post('save_draft', {'changes': {'E1_0': {'answer': 'saved'}}, 'revision': 1})
+        response, _ = self._post('submit_exam', {'changes': {}, 'base_revision': 1}, key='k1')
+        self.assertEqual(response.status_code, 202)
+
+        # accepted just before the submit, but only buffered once the draft was deleted
+        response, _ = self._post('save_draft', {'changes': {'E1_0': {'answer': 'late'}}, 'revision': 2})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(self.drafts.add('E1', '5000', {'E1_0': {'answer': 'late'}}, 2))
+        self.drafts.flush_student('E1', '5000')
+        self.drafts.flush()
+        self.assertNotIn(('answer_drafts', 'E1', 'students', '5000'), self.db.docs)
+
+        # a new attempt autosaves again once the tombstone has expired
+        with mock.patch('exam.drafts.time.monotonic', return_value=drafts.time.monotonic() + drafts.TOMBSTONE_SECONDS):
+            self.assertTrue(self.drafts.add('E1', '5000', {'E1_0': {'answer': 'again'}}, 1))
+        self.drafts.flush()
+        self.assertEqual(self.db.docs[('answer_drafts', 'E1', 'students', '5000')]['revision'], 1)
+
+    def test_deleting_a_draft_waits_for_a_flush_under_way(self):
+        import threading
+
+        self.drafts.add('E1', '5000', {'E1_0': {'answer': 'typed'}}, 1)
+        committing, release = threading.Event(), threading.Event()
+        make_batch = self.db.batch
+
+        def slow_batch():
+            batch = make_batch()
+            commit = batch.commit
+
+            def wait_then_commit():
+                committing.set()
+                release.wait(5)
+                commit()
+            batch.commit = wait_then_commit
+            return batch
+
+        with mock.patch.object(self.db, 'batch', slow_batch):
+            flusher = threading.Thread(target=self.drafts.flush)
+            flusher.start()
+            committing.wait(5)
+            deleter = threading.Thread(target=self.drafts.delete, args=('E1', '5000'))
+            deleter.start()
+            deleter.join(0.1)
+            self.assertTrue(deleter.is_alive())  # held back until the flush has written
+            release.set()
+            flusher.join(5)
+            deleter.join(5)
+        self.assertNotIn(('answer_drafts', 'E1', 'students', '5000'), self.db.docs)
+
+
+class GradingQueueTests(SimpleTestCase):
+    def setUp(self):
+        for target, value in (('get_grader', mock.Mock()), ('save_graded_result', mock.Mock())):
+            patcher = mock.patch(f'exam.grading_queue.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ref = mock.Mock()
+        patcher = mock.patch('exam.grading_queue.submission_ref', return_value=self.ref)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _job(self, pern_no='1'):
+        from .grading_queue import GradingJob
+
+        return GradingJob(exam_code='E1', pern_no=pern_no, answers={}, questions=[])
+
+    def test_worker_survives_when_recording_a_failure_fails(self):
+        from .grading_queue import GradingQueue
+
+        self.ref.update.side_effect = RuntimeError("firestore down")
+        with mock.patch('exam.grading_queue.score_submission', side_effect=ValueError("bad answers")):
+            grading = GradingQueue(workers=1, maxsize=10)
+            for pern_no in ('1', '2'):
+                self.assertTrue(grading.submit(self._job(pern_no)))
+            grading._queue.join()
+        self.assertTrue(all(t.is_alive() for t in grading._threads))
+        self.assertEqual([grading.status('E1', p) for p in ('1', '2')], ['failed', 'failed'])
+
+    def test_a_job_graded_before_submit_returns_stays_graded(self):
+        from .grading_queue import GradingQueue
+
+        grading = GradingQueue(workers=0, maxsize=10)
+        put = grading._queue.put
+
+        def put_and_grade(job, timeout=None):  # a worker that finishes before submit() returns
+            put(job, timeout=timeout)
+            grading._grade(grading._queue.get())
+
+        with mock.patch('exam.grading_queue.score_submission', return_value={}), \
+                mock.patch.object(grading._queue, 'put', put_and_grade):
+            grading.submit(self._job())
+        self.assertEqual(grading.status('E1', '1'), 'graded')
+
+    def test_rejected_job_leaves_no_pending_status(self):
+        from .grading_queue import GradingQueue
+
+        grading = GradingQueue(workers=0, maxsize=1)
+        self.assertTrue(grading.submit(self._job('1')))
+        self.assertFalse(grading.submit(self._job('2'), timeout=0))
+        self.assertIsNone(grading.status('E1', '2'))
+
+
+class InProcessExecutor:
+    """ProcessPoolExecutor stand-in that runs the initializer and tasks in this process."""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None, initargs=()):
+        if initializer:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+class RegradeExamTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+
+        from . import question_store
+        from .result_cache import GradeResultCache
+
+        self.db = FakeFirestore()
+        for target in ('exam.question_store.db', 'exam.exam_stats.db'):
+            patcher = mock.patch(target, self.db)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.grader = _stub_grader(result_cache=GradeResultCache())
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name)
+        for patcher in (
+            mock.patch('exam.firebase_config.get_firestore_client', return_value=self.db),
+            mock.patch('exam.ai_service.get_grader', return_value=self.grader),
+            mock.patch('exam.management.commands.regrade_exam.ProcessPoolExecutor', InProcessExecutor),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings_override = override_settings(GRADER_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        question_store.save_questions('E1', [
+            {'id': 'E1_0', 'type': 'mcq', 'question': 'Heart of the plant?', 'teacher_answer': 'A',
+             'options': ['Boiler', 'Pump'], 'max_score': 1},
+            {'id': 'E1_1', 'type': 'descriptive', 'question': 'What does the turbine do?',
+             'teacher_answer': 'Steam turbine drives generator', 'max_score': 9,
+             'concepts': [{'name': 'generator', 'keywords': ['generator']}]},
+        ], revision='r1')
+        self.submissions = self.db.collection('results').document('E1').collection('submissions')
+        for i in range(5):
+            self.submissions.document(f's{i}').set({
+                'pern_no': f's{i}', 'status': 'graded', 'percentage': 0.0, 'timestamp': datetime(2026, 3, 1, 9, i),
+                'answers': {'E1_0': {'selectedOption': 'Boiler'}, 'E1_1': {'answer': f'the turbine drives a generator {i}'}},
+            })
+
+    def _regrade(self, *args):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        call_command('regrade_exam', 'E1', '--page-size', '2', '--chunk-size', '1', *args, stdout=StringIO())
+
+    def test_an_interrupted_regrade_resumes_from_its_checkpoint(self):
+        from .exam_stats import rebuild_exam_stats
+        from .management.commands import regrade_exam
+
+        updates, commits = [], []
+        update, commit = FakeBatch.update, FakeBatch.commit
+
+        def record_update(batch, ref, data):
+            if 'graded_at' in data:
+                updates.append(ref._path[-1])
+            update(batch, ref, data)
+
+        def record_commit(batch):
+            commits.append(len(batch._ops))
+            commit(batch)
+
+        grade_chunk = regrade_exam._grade_chunk
+
+        def interrupt_second_page(chunk):
+            if chunk[0][0] == 's2':
+                raise RuntimeError("worker killed")
+            return grade_chunk(chunk)
+
+        with mock.patch.object(FakeBatch, 'update', record_update), mock.patch.object(FakeBatch, 'commit', record_commit):
+            with mock.patch.object(regrade_exam, '_grade_chunk', interrupt_second_page), \
+                    self.assertRaises(RuntimeError):
+                self._regrade()
+            self.assertIsNone(self.grader.result_cache)  # _init_worker: a regrade never serves memoized results
+            self.assertEqual((updates, commits), (['s0', 's1'], [2]))  # the first page, in one batch
+            checkpoint = self.cache_dir / 'regrade_E1.json'
+            self.assertEqual(json.loads(checkpoint.read_text()), {'last_doc_id': 's1', 'done': 2})
+
+            with mock.patch('exam.exam_stats.rebuild_exam_stats', wraps=rebuild_exam_stats) as rebuild:
+                self._regrade('--resume')
+        self.assertEqual(updates, ['s0', 's1', 's2', 's3', 's4'])  # each submission written exactly once
+        self.assertEqual(commits[1:3], [2, 1])
+        self.assertFalse(checkpoint.exists())
+        rebuild.assert_called_once_with('E1', self.db)
+        self.assertEqual(self.db.docs[('exam_stats', 'E1')]['count'], 5)
+        stored = self.db.docs[('results', 'E1', 'submissions', 's4')]
+        self.assertEqual((stored['status'], stored['total_score'] >= 1.0), ('graded', True))
+
+
+class ExamStatsTests(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeFirestore()
+        patcher = mock.patch('exam.exam_stats.db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.submissions = self.db.collection('results').document('E1').collection('submissions')
+
+    def _submit(self, pern_no, minute):
+        from .search import search_tokens
+
+        self.submissions.document(pern_no).set({
+            'pern_no': pern_no, 'status': 'pending', 'timestamp': datetime(2026, 3, 1, 9, minute),
+            'search_tokens': search_tokens('', pern_no),
+        }, merge=True)
+
+    def _grade(self, pern_no, percentage):
+        from .exam_stats import save_graded_result
+
+        save_graded_result(self.submissions.document(pern_no), 'E1', {'status': 'graded', 'percentage': percentage})
+
+    def _stored(self):
+        return self.db.docs[('exam_stats', 'E1')]
+
+    def test_grading_updates_totals_and_regrading_replaces_the_old_score(self):
+        from .exam_stats import summarize
+
+        self._submit('1', 2)
+        self._grade('1', 30.0)
+        self._submit('2', 7)
+        self._grade('2', 80.0)
+        self._submit('1', 12)  # re-submission keeps counting 30% until it is graded again
+        self.assertEqual(summarize(self._stored())['total'], 2)
+        self._grade('1', 50.0)
+
+        summary = summarize(self._stored())
+        self.assertEqual((summary['total'], summary['avg'], summary['ranges']), (2, 65.0, [0, 1, 1]))
+        self.assertEqual(summary['timeline'], ['2026-03-01T09:05', '2026-03-01T09:10'])
+        self.assertEqual(summary['avg_scores'], [80.0, 50.0])
+        self.assertEqual(self._stored()['histogram'], {'3': 0, '5': 1, '8': 1})
+
+    def test_rebuild_matches_incremental_totals(self):
+        from .exam_stats import rebuild_exam_stats, summarize
+
+        for pern_no, minute, percentage in (('1', 0, 10.0), ('2', 1, 95.5), ('3', 6, 100.0)):
+            self._submit(pern_no, minute)
+            self._grade(pern_no, percentage)
+        incremental = summarize(self._stored())
+
+        self.db.docs[('exam_stats', 'E1')] = {'count': 99}  # drifted
+        report = rebuild_exam_stats('E1')
+        self.assertEqual(summarize(self._stored()), incremental)
+        self.assertEqual(report, {'submissions': 3, 'counted': 3, 'fixed': 0})
+
+
+    def test_rebuild_scans_again_when_grading_lands_meanwhile(self):
+        from . import exam_stats
+        from .exam_stats import rebuild_exam_stats, summarize
+
+        self._submit('1', 0)
+        self._grade('1', 40.0)
+        self._submit('2', 1)
+        self._stored()['count'] = 99  # drifted
+        scan, scans = exam_stats._scan_submissions, []
+
+        def scan_while_grading(client, exam_code):
+            result = scan(client, exam_code)
+            if not scans:
+                self._grade('2', 80.0)  # after the scan read submission 2 as pending
+            scans.append(result)
+            return result
+
+        with mock.patch('exam.exam_stats._scan_submissions', side_effect=scan_while_grading):
+            report = rebuild_exam_stats('E1')
+        self.assertEqual(len(scans), 2)
+        summary = summarize(self._stored())
+        self.assertEqual((summary['total'], summary['avg'], report['counted']), (2, 60.0, 2))
+
+    def test_viewing_stats_never_rebuilds(self):
+        from .exam_stats import load_exam_stats
+
+        self.submissions.document('1').set({'status': 'graded', 'percentage': 50.0})  # graded before aggregates
+        with mock.patch('exam.exam_stats.rebuild_exam_stats') as rebuild:
+            summary = load_exam_stats('E1')
+        rebuild.assert_not_called()
+        self.assertEqual((summary['pending'], summary['total']), (True, 0))
+        self.assertNotIn(('exam_stats', 'E1'), self.db.docs)
+        self.assertFalse(load_exam_stats('E2')['pending'])  # nothing graded yet: simply empty
+
+    def test_check_ignores_pending_resubmissions(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        for pern_no, minute, percentage in (('1', 0, 10.0), ('2', 1, 95.5), ('3', 6, 60.0)):
+            self._submit(pern_no, minute)
+            self._grade(pern_no, percentage)
+        self._submit('2', 8)  # re-submitted: still counted at 95.5% in the aggregate, but no score on the document
+        self.submissions.document('2').set({'percentage': DELETE_FIELD}, merge=True)
+
+        out = StringIO()
+        with mock.patch('exam.firebase_config.get_firestore_client', return_value=self.db):
+            call_command('rebuild_exam_stats', 'E1', '--check', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'E1: ok (2 graded)')
+
+        self._stored()['count'] += 1  # real drift is still reported
+        out = StringIO()
+        with mock.patch('exam.firebase_config.get_firestore_client', return_value=self.db):
+            call_command('rebuild_exam_stats', 'E1', '--check', stdout=out)
+        self.assertIn('drifted', out.getvalue())
+
+class SearchTokenTests(SimpleTestCase):
+    def test_tokens_are_word_prefixes_of_name_and_pern(self):
+        from .search import search_tokens
+
+        self.assertEqual(search_tokens('Ravi  Kumar', 'P-204'), [
+            '2', '20', '204', 'k', 'ku', 'kum', 'kuma', 'kumar', 'p', 'r', 'ra', 'rav', 'ravi',
+        ])
+
+    def test_queries_match_on_every_word(self):
+        from .search import lookup_token, matches, search_tokens
+
+        tokens = search_tokens('Ravi Kumar', '20451')
+        self.assertTrue(matches('kum RAV', tokens))
+        self.assertTrue(matches('2045', tokens))
+        self.assertFalse(matches('ravi sharma', tokens))
+        self.assertEqual(lookup_token('ravi 2045'), '2045')
+        self.assertEqual(lookup_token('  '), '')
+
+
+class ResultsArchiveTests(SimpleTestCase):
+    def test_details_are_flattened_one_row_per_question(self):
+        from .results_archive import detail_rows
+
+        rows = detail_rows(42, [
+            {'q_id': 'E1_0', 'score': 1.0, 'your_answer': 'Boiler', 'details': {'type': 'MCQ', 'correct': True, 'max_score': 1.0}},
+            {'q_id': 'E1_1', 'score': 6.5, 'your_answer': 'Steam...', 'details': {
+                'type': 'Descriptive', 'max_score': 10.0, 'concept_score': 0.7, 'semantic_similarity': 0.8,
+            }},
+        ])
+        self.assertEqual([(r['pern_no'], r['position'], r['q_id']) for r in rows], [('42', 0, 'E1_0'), ('42', 1, 'E1_1')])
+        self.assertEqual((rows[0]['correct'], rows[1]['concept_score'], rows[1]['penalty']), (True, 0.7, None))
+
+    def test_high_water_mark_round_trips_with_overlap(self):
+        import tempfile as tmp
+        from datetime import timezone
+
+        from .results_archive import ResultsArchive
+
+        with tmp.TemporaryDirectory() as root:
+            archive = ResultsArchive(root)
+            self.assertIsNone(archive.since(archive.high_water(), 60))
+            mark = datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)
+            archive.save_state(mark, last_run_documents=3)
+            self.assertEqual(archive.since(archive.high_water(), 60), mark - timedelta(minutes=1))
+
+    @skipUnless(_parquet_supported(), "pyarrow is not installed")
+    def test_upsert_replaces_changed_students_only(self):
+        import tempfile as tmp
+
+        import pandas as pd
+
+        from .results_archive import ResultsArchive, submission_row
+
+        with tmp.TemporaryDirectory() as root:
+            archive = ResultsArchive(root)
+            archive.upsert('E1', [submission_row({'pern_no': p, 'percentage': 10.0}) for p in ('1', '2')], [])
+            archive.upsert('E1', [submission_row({'pern_no': '2', 'percentage': 90.0})], [])
+            frame = pd.read_parquet(f"{root}/submissions/exam_code=E1/part.parquet")
+            self.assertEqual(sorted(zip(frame['pern_no'], frame['percentage'])), [('1', 10.0), ('2', 90.0)])
+
+    @skipUnless(_parquet_supported(), "pyarrow is not installed")
+    def test_syncs_with_different_nulls_read_back_as_one_dataset(self):
+        import tempfile as tmp
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        from .results_archive import ResultsArchive, archive_schemas, detail_rows, submission_row
+
+        with tmp.TemporaryDirectory() as root:
+            archive = ResultsArchive(root)
+            # first sync: nothing graded yet, so the score and grading columns are all null
+            archive.upsert('E1', [submission_row({'pern_no': p, 'status': 'pending'}) for p in (1, 2)], [])
+            archive.upsert('E2', [submission_row({'pern_no': 3, 'status': 'pending'})], detail_rows(3, [{'q_id': 'E2_0'}]))
+            # second sync: graded, with whole-number scores
+            archive.upsert('E1', [submission_row({
+                'pern_no': '2', 'status': 'graded', 'total_score': 9, 'percentage': 90, 'total_questions': 1,
+                'graded_at': datetime(2026, 3, 1, 9, 5), 'updated_at': datetime(2026, 3, 1, 9, 5),
+            })], detail_rows('2', [{'q_id': 'E1_0', 'score': 9, 'details': {'type': 'MCQ', 'correct': True}}]))
+
+            submissions_schema, details_schema = archive_schemas()
+            submissions = ds.dataset(f"{root}/submissions", partitioning='hive').to_table()
+            details = ds.dataset(f"{root}/details", partitioning='hive').to_table()
+        self.assertTrue(submissions.schema.equals(submissions_schema.append(pa.field('exam_code', pa.string()))))
+        self.assertTrue(details.schema.equals(details_schema.append(pa.field('exam_code', pa.string()))))
+        rows = sorted(submissions.to_pylist(), key=lambda row: row['pern_no'])
+        self.assertEqual(
+            [(r['exam_code'], r['pern_no'], r['status'], r['percentage'], r['graded_at']) for r in rows],
+            [('E1', '1', 'pending', None, None), ('E1', '2', 'graded', 90.0, datetime(2026, 3, 1, 9, 5)),
+             ('E2', '3', 'pending', None, None)],
+        )
+        self.assertEqual(sorted((r['pern_no'], r['score'], r['correct']) for r in details.to_pylist()),
+                         [('2', 9.0, True), ('3', None, None)])
@@ -18,4 +18,10 @@ urlpatterns = [
     path('student/exam/', views.take_exam, name='take_exam'),
     path('student/results/', views.student_results, name='student_results'),  # ← ADD THIS LINE
     path('api/submit-exam/', views.submit_exam, name='submit_exam'),
+    path('api/save-draft/', views.save_draft, name='save_draft'),
+    path('api/submission-status/', views.submission_status, name='submission_status'),
+
+    # Health checks
+    path('healthz/ready/', views.readiness, name='readiness'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,21 +1,43 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import make_password, check_password
 from django.contrib import messages
+from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
+import itertools
 import json
-import pandas as pd
+import logging
 import uuid
 from datetime import datetime
-from google.cloud.firestore_v1 import SERVER_TIMESTAMP
-from io import BytesIO
-from collections import defaultdict
+from google.cloud.firestore_v1 import DELETE_FIELD, SERVER_TIMESTAMP
 
 # NEW IMPORTS for Hybrid Grader
 # from .ai_service import evaluate_answer  # Updated to hybrid
-from .ai_service import DescriptiveAnswerGrader, Concept, QuestionConfig  # NEW
-
-from .firebase_config import db
+from .ai_service import QuestionConfig, get_grader, grader_is_ready  # NEW
+from .grading_queue import (
+    STATUS_GRADED, STATUS_GRADING, STATUS_PENDING, STATUS_FAILED, GRADED_FIELDS,
+    GradingJob, current_grading_queue, get_grading_queue, submission_ref,
+)
+
+from .firebase_config import adb, db
+from .exam_cache import aget_exam, aget_questions, get_questions, invalidate_exam
+from .question_store import question_lookup, save_questions
+from .exam_stats import STATS_FIELD, load_exam_stats
+from .exports import (
+    EXPORT_FIELDS, EXPORT_FORMATS, csv_stream, export_rows, parquet_stream, parquet_supported, xlsx_file,
+)
+from .queries import exam_code_list, iter_pages, paginate
+from .search import SEARCH_FIELD, lookup_token, matches, search_tokens
+from .drafts import adelete_draft, aload_draft, get_draft_buffer
+from .idempotency import (
+    IDEMPOTENCY_FIELD, IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, SUBMIT_DEDUPE, dedupe_key, submit_dedupe,
+)
+from . import metrics as app_metrics
+
+logger = logging.getLogger(__name__)
 
 # Admin credentials (UNCHANGED)
 ADMIN_USER = 'Admin'
@@ -29,6 +51,26 @@ def get_admin_doc():
     doc = doc_ref.get()
     return doc_ref, doc
 
+# ==================== HEALTH CHECKS ====================
+def readiness(request):
+    """Load-balancer readiness probe: 200 once the grading models are warm.
+
+    Page-only workers (GRADER_PRELOAD=0) never warm them, so they are ready straight away.
+    """
+    if not settings.GRADER_PRELOAD:
+        return JsonResponse({'ready': True, 'grader': 'on demand'})
+    if grader_is_ready():
+        cache = get_grader().result_cache
+        return JsonResponse({'ready': True, 'result_cache': cache.stats() if cache else None})
+    return JsonResponse({'ready': False}, status=503)
+
+def metrics(request):
+    """Prometheus scrape endpoint: view, grader and Firestore counters and histograms."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=403)
+    return HttpResponse(app_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ==================== AUTH VIEWS (UNCHANGED) ====================
 def login(request):
     error = None
@@ -103,6 +145,8 @@ def admin_dashboard(request):
 # NEW: Enhanced admin_upload with CONCEPT columns
 @csrf_exempt
 def admin_upload(request):
+    import pandas as pd  # imported on use: pandas adds ~0.4s to every process start
+    from .question_upload import parse_question_sheet
     if not request.session.get('admin_logged_in'):
         return redirect('login')
     
@@ -121,7 +165,25 @@ def admin_upload(request):
         try:
             df = pd.read_excel(file) if file.name.endswith(('.xlsx', '.xls')) else pd.read_csv(file)
             
-            # 1. Update/Create Exam Record
+            # 1. Parse and validate all rows column-wise; invalid rows are reported, not uploaded
+            questions_data, row_errors = parse_question_sheet(df, exam_code)
+            if not questions_data:
+                messages.error(request, "❌ No valid questions found in the file.")
+                return render(request, 'admin_upload.html', {
+                    'error': 'No valid questions found in the file.', 'row_errors': row_errors
+                })
+
+            upload_revision = uuid.uuid4().hex  # new compiled versions -> memoized grades invalidated
+            descriptive = [q for q in questions_data if q['type'] != 'mcq']
+            if descriptive:
+                # Teacher-side grading artifacts, so grading only processes the student side
+                compiled = get_grader().compile_questions(
+                    [QuestionConfig.from_dict(q) for q in descriptive], revision=upload_revision
+                )
+                for q, artifact in zip(descriptive, compiled):
+                    q['compiled'] = artifact.to_dict()
+
+            # 2. Update/Create Exam Record
             db.collection('exam_codes').document(exam_code).set({
                 'code': exam_code,
                 'test_name': f"Test {exam_code}",
@@ -130,78 +192,26 @@ def admin_upload(request):
                 'created_at': SERVER_TIMESTAMP
             })
 
-            questions_data = []
-            
-            # Use 'idx' for the dataframe loop to avoid conflict with 'i' in concepts
-            for idx, row in df.iterrows():
-                concepts = []
-                names_str = str(row.get('Concept_Names', '')).strip()
-                kws_str = str(row.get('Concept_Keywords', '')).strip()
-
-                # --- Concept Parsing Logic ---
-                if names_str and names_str.lower() != 'nan' and names_str != '':
-                    names = [n.strip() for n in names_str.split(',') if n.strip()]
-                    kw_groups = [g.strip() for g in kws_str.split(';') if g.strip()]
-                    
-                    for i, name in enumerate(names):
-                        if i < len(kw_groups):
-                            current_keywords = [k.strip().lower() for k in kw_groups[i].split(',') if k.strip()]
-                        else:
-                            current_keywords = [name.lower()]
-                            
-                        concepts.append({
-                            'name': name,
-                            'keywords': current_keywords 
-                        })
-
-                # --- Prepare Question Data (OUTSIDE the names_str IF block) ---
-                q_id = f"{exam_code}_{idx}"
-                q_type = str(row.get('Type', 'mcq')).lower().strip()
-                
-                # Handle MCQ Options: splitting by comma or pipe
-                options_raw = str(row.get('Options', ''))
-                if q_type == 'mcq':
-                    options = [
-                        str(row.get('option1', '')).strip(),
-                        str(row.get('option2', '')).strip(),
-                        str(row.get('option3', '')).strip(),
-                        str(row.get('option4', '')).strip(),
-                    ]
-
-                    # Remove empty values
-                    options = [opt for opt in options if opt]
-                else:
-                    options = []    
-
-                q_data = {
-                    'id': q_id,
-                    'exam_code': exam_code,
-                    'question': str(row.get('Question', '')),
-                    'type': q_type,
-                    'teacher_answer': str(row.get('Teacher_Answer', '')),
-                    'max_score': float(row.get('Max_Score', 1.0)),
-                    'concepts': concepts,
-                    'options': options
-                }
-
-                # --- SAVE TO FIRESTORE ---
-                db.collection('questions').document(q_id).set(q_data)
-                questions_data.append(q_data)
-                print(f"Uploaded: {q_id}")
-
-            # 2. Update Global Config
-            db.collection('questions').document('config').set({
-                'questions': questions_data,
-                'total_questions': len(questions_data),
-                'updated_at': SERVER_TIMESTAMP
+            # 3. Save this exam's question set (replaces any earlier upload for the same code)
+            commits = save_questions(exam_code, questions_data, revision=upload_revision)
+            invalidate_exam(exam_code)
+            logger.info("questions uploaded", extra={
+                'exam_code': exam_code, 'questions': len(questions_data),
+                'rejected_rows': len(row_errors), 'batch_commits': commits,
             })
 
+            # 4. Cache teacher embeddings now so grading only encodes student answers
+            if descriptive:
+                get_grader().warm_teacher_embeddings([q['teacher_answer'] for q in descriptive])
+
             messages.success(request, f"✅ Successfully uploaded {len(questions_data)} questions!")
-            return render(request, 'admin_upload.html', {
-                'success': f'✅ Successfully uploaded {len(questions_data)} questions for exam {exam_code}!'
-            })
+            success = f'✅ Successfully uploaded {len(questions_data)} questions for exam {exam_code}!'
+            if row_errors:
+                success += f' {len(row_errors)} row(s) were skipped, see below.'
+            return render(request, 'admin_upload.html', {'success': success, 'row_errors': row_errors})
 
         except Exception as e:
+            logger.exception("question upload failed", extra={'exam_code': exam_code})
             messages.error(request, f"❌ Failed upload: {str(e)}")
             return render(request, 'admin_upload.html', {'error': f"Processing Error: {str(e)}"})
 
@@ -211,10 +221,10 @@ def admin_upload(request):
 # Download Exam dataframe 
 #=====================================
 
-import pandas as pd
 
 def generate_exam_dataframe():
     """Returns the sample exam DataFrame"""
+    import pandas as pd
     return pd.DataFrame({
         'Q_ID': ['Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6'],
 
@@ -280,6 +290,7 @@ from django.http import HttpResponse
 from openpyxl.utils import get_column_letter
 
 def download_sample_excel(request):
+    import pandas as pd
     df = generate_exam_dataframe()
 
     response = HttpResponse(
@@ -328,28 +339,30 @@ def admin_codes(request):
             duration = int(request.POST.get('duration', 60))
             
             if db.collection('exam_codes').document(code).get().exists:
-                codes = list(db.collection('exam_codes').stream())
                 return render(request, 'admin_codes.html', {
-                    'error': 'Code already exists', 'codes': codes
+                    'error': 'Code already exists', 'codes': exam_code_list()
                 })
             
             db.collection('exam_codes').document(code).set({
                 'code': code, 'test_name': test_name, 'duration': duration,
                 'active': False, 'created_at': SERVER_TIMESTAMP
             })
+            invalidate_exam(code)
         elif action == 'activate':
             code = request.POST.get('code')
             db.collection('exam_codes').document(code).update({'active': True})
+            invalidate_exam(code)
         elif action == 'deactivate':
             code = request.POST.get('code')
             db.collection('exam_codes').document(code).update({'active': False})
+            invalidate_exam(code)
         elif action == 'update_name':
             code = request.POST.get('code')
             test_name = request.POST.get('test_name')
             db.collection('exam_codes').document(code).update({'test_name': test_name})
+            invalidate_exam(code)
     
-    codes = list(db.collection('exam_codes').stream())
-    return render(request, 'admin_codes.html', {'codes': codes})
+    return render(request, 'admin_codes.html', {'codes': exam_code_list()})
 
 # NEW: Enhanced admin_stats with PERN/Name SEARCH
 def clean_firestore_data(data):
@@ -363,6 +376,32 @@ def clean_firestore_data(data):
     else:
         return str(data)
 
+RESULT_LIST_FIELDS = [
+    'student_name', 'pern_no', 'total_max_score', 'total_score', 'percentage', 'timestamp', 'status', STATS_FIELD
+]
+SEARCH_RESULT_LIMIT = 200
+
+
+def _search_submissions(results_ref, search_query):
+    """(matching submissions, truncated) for an admin search, at most SEARCH_RESULT_LIMIT of them.
+
+    Looked up by the query's most selective word, then paged through until the
+    other words have matched enough: a limit on the lookup itself would drop
+    matches that come after the first non-matching ones.
+    """
+    token = lookup_token(search_query)
+    if not token:
+        return [], False
+    lookup = results_ref.select(RESULT_LIST_FIELDS + [SEARCH_FIELD]).where(SEARCH_FIELD, 'array_contains', token)
+    docs = []
+    for page in iter_pages(lookup, page_size=SEARCH_RESULT_LIMIT):
+        for doc in page:
+            if matches(search_query, doc.to_dict().get(SEARCH_FIELD)):
+                if len(docs) == SEARCH_RESULT_LIMIT:
+                    return docs, True
+                docs.append(doc)
+    return docs, False
+
 def admin_stats(request):
     if not request.session.get('admin_logged_in'):
         return redirect('login')
@@ -371,8 +410,7 @@ def admin_stats(request):
     selected_code = request.GET.get('code','')
     search_query = request.GET.get('search', '').strip()
     
-    codes = db.collection('exam_codes').stream()
-    print(f"seach quesry {search_query} , selected code {selected_code}")
+    codes = exam_code_list(['test_name'])
     stats = {}
 
     # Visualization Data Containers
@@ -384,74 +422,70 @@ def admin_stats(request):
 
     total_results_count = 0
     search_results_count = 0
+    search_truncated = False
+    page = None
+    stats_pending = False
 
     if selected_code:
         results_ref = db.collection('results').document(selected_code).collection('submissions')
-        docs = results_ref.order_by('timestamp').stream()
+        # Headline numbers and charts come from the exam's aggregate document
+        # (one read); the listing below only needs the columns the table shows.
+        summary = load_exam_stats(selected_code)
+        stats_pending = summary['pending']  # graded before aggregates existed; rebuilt by manage.py rebuild_exam_stats
+        chart_data.update(ranges=summary['ranges'], timeline=summary['timeline'], avg_scores=summary['avg_scores'])
+        listing = results_ref.select(RESULT_LIST_FIELDS)
+        if search_query:
+            # Indexed lookup on the query's most selective word; only submissions with it are read
+            matched, search_truncated = _search_submissions(results_ref, search_query)
+            docs = sorted(matched, key=lambda doc: str(doc.to_dict().get('timestamp', '')))
+        else:
+            # Not filtered on status: submissions graded before statuses existed have none
+            page = paginate(
+                listing, 'timestamp', settings.ADMIN_STATS_PAGE_SIZE,
+                after=request.GET.get('after', ''), before=request.GET.get('before', ''),
+            )
+            docs = page.docs
+        total_results_count = summary['total']
         
         exam_results = []
-        temp_timeline = defaultdict(list)
 
         scores = []
-
-        count_query = results_ref.count()
-        count_result = count_query.get()
-        print(f"Total documents: {count_result[0][0].value}")
         
         for doc in docs:
             data = doc.to_dict()
-            perc = data.get('percentage', 0)
-
-            # 1. Distribution Logic
-            if perc < 40: chart_data['ranges'][0] += 1
-            elif perc < 70: chart_data['ranges'][1] += 1
-            else: chart_data['ranges'][2] += 1
-
-            # Normalize data for searching
-            student_name = str(data.get('student_name', '')).lower()
-            pern_no = str(data.get('pern_no', '')).lower()
-            query = search_query.lower()
-
-        
+            # List exactly what the totals count: a re-submission waiting to be
+            # graded again still counts (and is shown) with its last score
+            graded = data.get('status', STATUS_GRADED) == STATUS_GRADED
+            if not graded and not data.get(STATS_FIELD):
+                continue  # first submission still in the grading queue
+            perc = data.get('percentage', 0) if graded else data[STATS_FIELD]['percentage']
 
-            # 3. Apply Filtering Logic
-            # If no search query, add everyone. If query exists, match Name or PERN
             raw_timestamp = data.get('timestamp')
             formatted_date = ""
 
             if raw_timestamp:
                 try:
                     formatted_date = raw_timestamp.strftime('%Y-%m-%dT%H:%M:%S')
-                    temp_timeline[formatted_date].append(perc)
-
                 except AttributeError:
                     formatted_date = str(raw_timestamp)
 
-            if not search_query or (query in student_name or query in pern_no):
-                exam_results.append({
-                    'student_name': data.get('student_name'),
-                    'pern_no': data.get('pern_no'),
-                    'max_score': data.get('total_max_score'),
-                    'score': data.get('total_score'),
-                    'percentage': f"{perc}%",
-                    'timestamp': formatted_date,
-                    'doc_id': doc.id
-                })
-
-                scores.append(float(data.get('percentage', 0)))
-                if search_query: search_results_count += 1
-
-            total_results_count += 1
+            exam_results.append({
+                'student_name': data.get('student_name'),
+                'pern_no': data.get('pern_no'),
+                'max_score': data.get('total_max_score'),
+                'score': data.get('total_score') if graded else 'Regrading',
+                'percentage': f"{perc}%",
+                'timestamp': formatted_date,
+                'doc_id': doc.id
+            })
 
-        # Finalize Timeline Data
-        for date in sorted(temp_timeline.keys()):
-            chart_data['timeline'].append(date)
-            chart_data['avg_scores'].append(sum(temp_timeline[date]) / len(temp_timeline[date]))
+            scores.append(float(perc))
+            if search_query: search_results_count += 1
 
         stats[selected_code] = {'results': exam_results}    
             
                 
-        if exam_results:
+        if exam_results and search_query:
             stats[selected_code] = {
                 'total_tests': len(exam_results),
                 'avg_score': sum(scores) / len(scores) if scores else 0,
@@ -459,61 +493,57 @@ def admin_stats(request):
                 'min_score': min(scores) if scores else 0,
                 'results': exam_results
             }
+        elif exam_results:
+            stats[selected_code] = {
+                'total_tests': summary['total'],
+                'avg_score': summary['avg'],
+                'max_score': summary['max'],
+                'min_score': summary['min'],
+                'results': exam_results
+            }
 
     return render(request, 'admin_stats.html', {
         'codes': codes,
         'stats': stats,
         'search_query': search_query,
         'search_results': search_results_count,
+        'search_truncated': search_truncated,
+        'search_limit': SEARCH_RESULT_LIMIT,
         'total_results': total_results_count,
+        'page': page,
+        'stats_pending': stats_pending,
         'chart_json': json.dumps(chart_data) # Send as JSON string
     })
 
 def download_results(request, exam_code):
-    # Reference the specific subcollection for this exam
-    docs = db.collection('results').document(exam_code).collection('submissions').stream()
-    
-    data = []
-    for doc in docs:
-        data.append(doc.to_dict())
-        
-    if not data:
+    """Stream an exam's results as xlsx (default), csv or parquet (?format=...).
+
+    Submissions are read a page at a time, so memory does not grow with the
+    size of the exam. CSV and parquet go out as each page arrives; an xlsx is
+    only valid once complete, so the whole workbook is written to a temporary
+    file first and nothing is sent until every page has been read.
+    """
+    export_format = request.GET.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse(f"Unknown format '{export_format}'.", status=400)
+    if export_format == 'parquet' and not parquet_supported():
+        return HttpResponse("Parquet export needs pyarrow installed on the server.", status=501)
+    content_type, extension = EXPORT_FORMATS[export_format]
+
+    submissions = db.collection('results').document(exam_code).collection('submissions')
+    pages = iter_pages(submissions.select(EXPORT_FIELDS))
+    first_page = next(pages, None)
+    if not first_page:
         return HttpResponse("No results found for this exam code.", status=404)
+    rows = export_rows(itertools.chain([first_page], pages))
 
-    # Create DataFrame
-    df = pd.DataFrame(data)
-
-    # Fix Firestore timestamps (force convert + remove timezone)
-    for col in df.columns:
-        try:
-            df[col] = pd.to_datetime(df[col], errors='ignore')
-            if hasattr(df[col].dtype, 'tz'):
-                df[col] = df[col].dt.tz_localize(None)
-        except:
-            pass
-    
-    # Clean up column names for the Excel file
-    column_mapping = {
-        'pern_no': 'Perno',
-        'name': 'Student Name',
-        'score': 'Total Score',
-        'timestamp': 'Submission Time'
-    }
-    df = df.rename(columns=column_mapping)
-
-    for col in df.columns:
-        if pd.api.types.is_datetime64_any_dtype(df[col]):
-            df[col] = df[col].dt.tz_localize(None)
-    # Use BytesIO to create the Excel file in memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Results')
-    
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename=Results_{exam_code}.xlsx'
+    if export_format == 'csv':
+        response = StreamingHttpResponse(csv_stream(rows), content_type=content_type)
+    elif export_format == 'parquet':
+        response = StreamingHttpResponse(parquet_stream(rows), content_type=content_type)
+    else:
+        response = FileResponse(xlsx_file(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename=Results_{exam_code}.{extension}'
     return response
 
 # NEW: API for detailed result modal
@@ -523,10 +553,10 @@ def student_result_detail(request, doc_id):
     if doc.exists:
         data = doc.to_dict()
         # Enhance details with teacher answers
+        q_lookup = question_lookup(get_questions(data.get('exam_code')))
         for detail in data.get('details', []):
-            q_doc = db.collection('questions').document(detail.get('q_id', '')).get()
-            if q_doc.exists:
-                q_data = q_doc.to_dict()
+            q_data = q_lookup.get(detail.get('q_id', ''))
+            if q_data:
                 detail['details'] = detail.get('details', {})
                 detail['details']['teacher_answer'] = q_data.get('teacher_answer', '')
                 detail['details']['student_answer'] = detail.get('your_answer', '')
@@ -544,46 +574,42 @@ def get_student_detail_json(request, exam_code, doc_id):
         return JsonResponse({'error': 'Document not found'}, status=404)
 
 # ==================== STUDENT VIEWS (UPDATED submit_exam) ====================
-def enter_exam_code(request):
-    # UNCHANGED
-    if not request.session.get('student_logged_in'):
+# The student hot path runs as async views on the Firestore AsyncClient, so
+# under ASGI one worker keeps many students waiting on Firestore at once.
+# Grading stays on the grading queue's threads.
+async def enter_exam_code(request):
+    if not await request.session.aget('student_logged_in'):
         return redirect('login')
     
     if request.method == 'POST':
         code = request.POST.get('exam_code')
-        code_doc = db.collection('exam_codes').document(code).get()
+        code_data, questions = await asyncio.gather(aget_exam(code), aget_questions(code))
         
-        if not code_doc.exists:
+        if code_data is None:
             return render(request, 'enter_exam_code.html', {'error': 'Invalid exam code'})
         
-        code_data = code_doc.to_dict()
         if not code_data.get('active', False):
             return render(request, 'enter_exam_code.html', {'error': 'Exam not active'})
         
-        questions = list(db.collection('questions').stream())
         if not questions:
             return render(request, 'enter_exam_code.html', {'error': 'No questions loaded'})
         
-        request.session['exam_code'] = code
-        request.session['exam_duration'] = code_data.get('duration', 60)
-        request.session['exam_start_time'] = datetime.now().isoformat()
+        await request.session.aset('exam_code', code)
+        await request.session.aset('exam_duration', code_data.get('duration', 60))
+        await request.session.aset('exam_start_time', datetime.now().isoformat())
         return redirect('take_exam')
     
     return render(request, 'enter_exam_code.html')
 
-def take_exam(request):
-    if not request.session.get('student_logged_in') or 'exam_code' not in request.session:
+async def take_exam(request):
+    if not await request.session.aget('student_logged_in') or not await request.session.ahas_key('exam_code'):
         return redirect('enter_exam_code')
     
-    current_exam_code = request.session.get('exam_code')
-    config_ref = db.collection('questions').document('config').get()
-    
-    if not config_ref.exists:
-        messages.error(request, "Exam configuration not found.")
-        return redirect('enter_exam_code')
-
-    all_questions = config_ref.to_dict().get('questions', [])
-
+    current_exam_code = await request.session.aget('exam_code')
+    pern_no = await request.session.aget('pern_no')
+    questions, (saved_answers, draft_revision, _) = await asyncio.gather(
+        aget_questions(current_exam_code), aload_draft(current_exam_code, pern_no),
+    )
     filtered_questions = [
         {
             'id': q.get('id'),
@@ -591,7 +617,7 @@ def take_exam(request):
             'type': q.get('type'),
             'options': q.get('options', [])
         } 
-        for q in all_questions if q.get('exam_code') == current_exam_code
+        for q in questions
     ]
 
     if not filtered_questions:
@@ -600,157 +626,236 @@ def take_exam(request):
 
     return render(request, 'take_exam.html', {
         'questions': json.dumps(filtered_questions), # Clean JSON for JS
-        'duration': request.session.get('exam_duration', 60),
-        'student_name': request.session.get('student_name'),
-        'exam_code': current_exam_code
+        'duration': await request.session.aget('exam_duration', 60),
+        'student_name': await request.session.aget('student_name'),
+        'exam_code': current_exam_code,
+        'saved_answers': saved_answers,  # restores the page after a crash or reload
+        'draft_revision': draft_revision,
     })
 
 @csrf_exempt
-def submit_exam(request):
-    print("\n🚀 NEW HYBRID EXAM EVALUATION")
-    
+async def save_draft(request):
+    """Autosave from take_exam.html: the answers changed since its last save, buffered in memory (see drafts.py)."""
     if request.method != 'POST':
         return JsonResponse({'error': 'POST only'}, status=400)
-    
+    if not await request.session.aget('student_logged_in'):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+
+    exam_code = await request.session.aget('exam_code')
+    pern_no = await request.session.aget('pern_no')
+    if not exam_code or not pern_no:
+        return JsonResponse({'error': 'No active exam'}, status=404)
     try:
-        print("loading answers....")                                                                  # Debug Helper
         data = json.loads(request.body)
-        answers = data.get('answers', {})
-        student_name = request.session.get('student_name')
-        exam_code = request.session.get('exam_code')
-        pern_no = request.session.get('pern_no')
-        
-        print("Fetching questions config from DB")                                                     # Debug Helper
-        # NEW: Get config + individual questions
-        config_doc = db.collection('questions').document('config').get()
-        questions = config_doc.to_dict()['questions'] if config_doc.exists else []
-        
-        if not questions:
-            print("Empty questions....")                                                               # Debug Helper
-            questions_docs = list(db.collection('questions').stream())
-            questions = [q.to_dict() for q in questions_docs if q.id != 'config']
-        
-        score = 0
-        result_details = []
-        print("Calling Transformer grader model....")                                                   # Debug Helper
-        grader = DescriptiveAnswerGrader()  # NEW Transformer grader
-        print(f"Answers : {answers}")                                                                   # Debug Helper
-        for q in questions:
-            q_id = q['id']
-            user_ans = answers.get(q_id, {})
-            q_type = q['type']
-            print(f"{q_id} Question score processing")                                                   # Debug Helper
-            if q_type == 'mcq':
-                selected = user_ans.get('selectedOption', '')
-                correct_letter = q['teacher_answer']
-
-                options = q.get('options', [])
-
-                correct_index = ord(correct_letter.upper()) - ord('A')
-                correct_option = options[correct_index] if correct_index < len(options) else ''
-
-                is_correct = selected == correct_option
-
-                q_score = q['max_score'] if is_correct else 0.0
-                score += q_score
-                details = {'type': 'MCQ', 'correct': is_correct, 'max_score': q['max_score']}
-            
-            else:  # descriptive
-                student_ans = user_ans.get('answer', '')
-                if not student_ans.strip():
-                    q_score = 0.0
-                    print(f"{q_id} was Unanswered...")                                                 # Debug Helper
-                    details = {'type': 'Descriptive', 'score': 0.0, 'max_score': q['max_score']}
-                else:
-                    # NEW: Hybrid grading with concepts
-                    concepts = [Concept(**c) for c in q.get('concepts', [])]
-                    cfg = QuestionConfig(
-                        question_id = q_id,
-                        type =  q_type,
-                        teacher_answer = q['teacher_answer'],
-                        # correct_answer = answers[q_id],
-                        concepts = concepts,
-                        max_score = int(float(q.get('max_score', 1))),
-                    )
-                    print(f"Question config of {q_id} is : {cfg}")         
-                    print(type(cfg.max_score), cfg.max_score)                             # Debug Helper
-                    result = grader.grade(cfg, student_ans)
-                    print(f"Result score for it :: {result}")                                            # Debug Helper
-                    q_score = result['final_score']
-                    score += q_score
-                    details = {
-                        'type': 'Descriptive',
-                        'concept_score': result['concept_score'],
-                        'relation_score': result['relation_score'],
-                        'semantic_similarity': result['semantic_similarity'],
-                        'penalty': result['penalty'],
-                        'max_score': q['max_score']
-                    }
-            
-            result_details.append({
-                'q_id': q_id,
-                'question': q['question'][:100] + '...' if len(q['question']) > 100 else q['question'],
-                'your_answer': user_ans.get('answer', user_ans.get('selectedOption', '')),
-                'score': round(q_score, 1),
-                'details': details
-            })
-        
-        # Save enhanced results
-        total_max = sum(q.get('max_score', 1.0) for q in questions)
-        submission_data = {
-            'exam_code': exam_code,
-            'student_name': student_name,
-            'pern_no': pern_no,
-            'total_score': float(score),
-            'total_questions': len(questions),
-            'total_max_score': total_max,
-            'percentage': round((score / total_max) * 100, 1),
-            'details': result_details,
-            'timestamp': SERVER_TIMESTAMP
-        }
+        changes = data.get('changes') or {}
+        revision = int(data.get('revision', 0))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid draft'}, status=400)
+    if not isinstance(changes, dict):
+        return JsonResponse({'error': 'Invalid draft'}, status=400)
+
+    # Only this exam's questions, which also bounds the size of the draft document
+    question_ids = {q.get('id') for q in await aget_questions(exam_code)}
+    changes = {q_id: answer for q_id, answer in changes.items() if q_id in question_ids}
+    if not get_draft_buffer().add(exam_code, pern_no, changes, revision):
+        return JsonResponse({'error': 'These answers were already submitted'}, status=409)
+    return JsonResponse({'saved': True, 'revision': revision}, status=202)
+
+@csrf_exempt
+async def submit_exam(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST only'}, status=400)
     
-        exam_results_ref = db.collection('results').document(exam_code).collection('submissions')
-        exam_results_ref.document(str(pern_no)).set(submission_data)
-        
-        return JsonResponse({
-            'success': True,
-            'total_score': round(score, 1),
-            'percentage': round((score / total_max) * 100, 1),
-            'details': result_details
-        })
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Invalid submission'}, status=400)
+
+    exam_code = None
+    try:
+        student_name = await request.session.aget('student_name')
+        exam_code = await request.session.aget('exam_code')
+        pern_no = await request.session.aget('pern_no')
+        if 'answers' in data:
+            answers = data['answers']
+        else:
+            # Only the changes since the last autosave; the rest comes from the draft
+            try:
+                base_revision = int(data.get('base_revision', 0))
+            except (ValueError, TypeError):
+                return JsonResponse({'error': 'Invalid base_revision'}, status=400)
+            changes = data.get('changes') or {}
+            if not isinstance(changes, dict):
+                return JsonResponse({'error': 'Invalid changes'}, status=400)
+            answers, revision, complete = await aload_draft(exam_code, pern_no)
+            if not complete or revision < base_revision:
+                # Some acknowledged save is not stored (another worker's buffer, or lost with a restart)
+                return JsonResponse({'error': 'Saved answers are out of date', 'resend_answers': True}, status=409)
+            answers.update(changes)
+        client_key = (request.headers.get(IDEMPOTENCY_HEADER) or data.get(IDEMPOTENCY_FIELD) or '')[:MAX_KEY_LENGTH]
+
+        if not client_key:  # pages loaded before keys existed
+            body, status = await _accept_submission(exam_code, pern_no, student_name, answers, None)
+            return JsonResponse(body, status=status)
+
+        # Retries of one attempt share its key: only the first stores and grades the answers
+        key = dedupe_key(exam_code, pern_no, client_key)
+        future, first = submit_dedupe.claim(key)
+        if not first:
+            # shielded: a waiter going away must not cancel the attempt's shared future
+            body, status = await asyncio.shield(asyncio.wrap_future(future))
+            SUBMIT_DEDUPE.inc(result='replayed')
+            if status < 400:
+                body = {**body, 'status': _queued_status(exam_code, pern_no) or body['status']}
+            return JsonResponse({**body, 'replayed': True}, status=status)
+
+        try:
+            body, status = await _accept_submission(exam_code, pern_no, student_name, answers, client_key)
+        except Exception as e:
+            submit_dedupe.release(key, future, ({'error': str(e)}, 500))
+            raise
+        except BaseException:
+            # Cancelled, e.g. the client disconnected under ASGI: the retry must not wait on this attempt
+            submit_dedupe.release(key, future, ({'error': 'Submission interrupted; please retry.', 'retry_after': 1}, 503))
+            raise
+        if status < 400:
+            submit_dedupe.complete(future, (body, status))
+        else:
+            submit_dedupe.release(key, future, (body, status))  # let the next retry try again
+        return JsonResponse(body, status=status)
     
     except Exception as e:
+        logger.exception("submission failed", extra={'exam_code': exam_code})
         return JsonResponse({'error': str(e)}, status=500)
 
-def student_results(request):
+async def _accept_submission(exam_code, pern_no, student_name, answers, client_key):
+    """Store the answers and queue them for grading; returns (JSON body, HTTP status)."""
+    ref = submission_ref(exam_code, pern_no, client=adb())
+    # Only this exam's questions are graded and counted towards the maximum score
+    if client_key:
+        questions, stored = await asyncio.gather(aget_questions(exam_code), ref.get())
+    else:
+        questions, stored = await aget_questions(exam_code), None
+    if not questions:
+        logger.warning("submission for exam without questions", extra={'exam_code': exam_code})
+        return {'error': 'No questions found for this exam'}, 404
+
+    accepted = {
+        'success': True,
+        'submission_id': f"{exam_code}/{pern_no}",
+        'status_url': reverse('submission_status'),
+    }
+    # Answers already stored under this key (by another worker, or before a restart):
+    # report them rather than grading again, unless they were never queued here or grading failed
+    previous = stored.to_dict() if stored is not None and stored.exists else {}
+    if client_key and previous.get(IDEMPOTENCY_FIELD) == client_key:
+        status = previous.get('status', STATUS_GRADED)
+        if status == STATUS_GRADED or _queued_status(exam_code, pern_no) in (STATUS_PENDING, STATUS_GRADING):
+            SUBMIT_DEDUPE.inc(result='stored')
+            return {**accepted, 'status': status}, 200
+
+    # Store the raw answers durably first; grading happens off the request path.
+    # Only these fields are replaced (whole, so no answers of an earlier submission
+    # linger), and a re-submission keeps the stats contribution of its last grading.
+    fields = {
+        'exam_code': exam_code,
+        'student_name': student_name,
+        'pern_no': pern_no,
+        'answers': answers,
+        'status': STATUS_PENDING,
+        'total_questions': len(questions),
+        'total_max_score': sum(q.get('max_score', 1.0) for q in questions),
+        'timestamp': SERVER_TIMESTAMP,
+        SEARCH_FIELD: search_tokens(student_name, pern_no),
+        IDEMPOTENCY_FIELD: client_key or DELETE_FIELD,
+        'updated_at': SERVER_TIMESTAMP,
+        **{field: DELETE_FIELD for field in GRADED_FIELDS},
+    }
+    await ref.set(fields, merge=list(fields))
+
+    job = GradingJob(exam_code=exam_code, pern_no=str(pern_no), answers=answers, questions=questions)
+    # submit() may block for a moment on a full queue, so keep it off the event loop
+    if not await sync_to_async(get_grading_queue().submit, thread_sensitive=False)(job):
+        logger.warning("grading queue full", extra={'exam_code': exam_code, 'pern_no': pern_no})
+        return {
+            'error': 'Grading is busy. Your answers are saved; please retry in a few seconds.',
+            'retry_after': 5
+        }, 503
+
+    SUBMIT_DEDUPE.inc(result='accepted')
+    await adelete_draft(exam_code, pern_no)
+    return {**accepted, 'status': STATUS_PENDING}, 202
+
+def _queued_status(exam_code, pern_no):
+    """The submission's status in this process's grading queue; None if it is not there (or there is no queue)."""
+    queue = current_grading_queue()
+    return queue.status(exam_code, pern_no) if queue is not None else None
+
+def submission_status(request):
+    """Polled by take_exam.html until the student's submission has been graded."""
     if not request.session.get('student_logged_in'):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+
+    exam_code = request.session.get('exam_code')
+    pern_no = request.session.get('pern_no')
+    if not exam_code or not pern_no:
+        return JsonResponse({'error': 'No active exam'}, status=404)
+
+    status = _queued_status(exam_code, pern_no)
+    if status in (STATUS_PENDING, STATUS_GRADING):
+        return JsonResponse({'status': status})
+
+    doc = submission_ref(exam_code, pern_no).get()
+    if not doc.exists:
+        return JsonResponse({'error': 'Submission not found'}, status=404)
+    data = doc.to_dict()
+    status = data.get('status', STATUS_GRADED)  # documents from before the queue have no status
+    response = {'status': status}
+    if status == STATUS_GRADED:
+        response.update({
+            'total_score': round(data.get('total_score', 0), 1),
+            'percentage': data.get('percentage', 0)
+        })
+    elif status == STATUS_FAILED:
+        response['error'] = data.get('error', 'Grading failed')
+    return JsonResponse(response)
+
+async def student_results(request):
+    if not await request.session.aget('student_logged_in'):
         return redirect('login')
     
     # 1. Get identifiers from the student's session
-    pern_no = request.session.get('pern_no')
-    exam_code = request.session.get('exam_code')
+    pern_no = await request.session.aget('pern_no')
+    exam_code = await request.session.aget('exam_code')
     
     if not pern_no or not exam_code:
         return redirect('enter_exam_code')
 
-    # 2. Fetch the specific result from Firestore
+    # 2. Fetch the specific result and this exam's questions (for question text and teacher answers) together
     # Path: results -> [exam_code] -> submissions -> [pern_no]
-    result_doc = db.collection('results').document(exam_code).collection('submissions').document(str(pern_no)).get()
+    result_doc, questions = await asyncio.gather(
+        submission_ref(exam_code, pern_no, client=adb()).get(),
+        aget_questions(exam_code),
+    )
     
     if not result_doc.exists:
         return HttpResponse("Your results are not ready yet. Please contact the administrator.", status=404)
 
     result_data = result_doc.to_dict()
+    if result_data.get('status', STATUS_GRADED) != STATUS_GRADED:
+        return render(request, 'results.html', {
+            'student_name': result_data.get('student_name'),
+            'grading_status': result_data.get('status'),
+            'results': [],
+            'admin_view': False
+        })
     student_details = result_data.get('details', [])
 
-    # 3. Fetch Question Config to show the question text and teacher answers
-    q_config_doc = db.collection('questions').document('config').get()
-    q_lookup = {}
-    if q_config_doc.exists:
-        q_config = q_config_doc.to_dict().get('questions', [])
-        q_lookup = {q['id']: q for q in q_config}
+    q_lookup = question_lookup(questions)
 
-    # 4. Merge metadata (same logic as your admin view)
+    # 3. Merge metadata (same logic as your admin view)
     merged_results = []
     for detail in student_details:
         q_id = detail.get('q_id')
@@ -776,7 +881,7 @@ def student_results(request):
             }
         })
 
-    # 5. Pass all data to the same results.html template
+    # 4. Pass all data to the same results.html template
     return render(request, 'results.html', {
         'student_name': result_data.get('student_name'),
         'total_score': result_data.get('total_score'),
@@ -801,15 +906,14 @@ def admin_result_view(request, exam_code, per_no):
     
     student_details = result_data.get('details', [])
 
-    # 2. Fetch the Teacher's Question Config
+    # 2. Fetch the exam's questions
     # This contains the correct answers and options
-    q_config_doc = db.collection('questions').document('config').get()
-    if not q_config_doc.exists:
+    questions = get_questions(exam_code)
+    if not questions:
         return HttpResponse("Question configuration missing", status=404)
     
-    q_config = q_config_doc.to_dict().get('questions', [])
     # Create a lookup dictionary for easy mapping: { 'Q1': {question_data} }
-    q_lookup = {q['id']: q for q in q_config}
+    q_lookup = question_lookup(questions)
 
     # 3. Merge the Data
     merged_results = []
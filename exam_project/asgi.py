@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam_project.settings')
 
 application = get_asgi_application()
+
+# Start the grading workers, which load and warm the grader in the background;
+# /healthz/ready/ reports 503 until that is done.
+from django.conf import settings  # noqa: E402
+
+if settings.GRADER_PRELOAD:
+    from exam.grading_queue import get_grading_queue  # noqa: E402
+    get_grading_queue()
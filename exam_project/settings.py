@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'exam.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'exam_project.urls'
@@ -128,4 +130,57 @@ STATICFILES_DIRS = [BASE_DIR / 'exam' / 'static']
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Firebase credentials path
-FIREBASE_CRED = BASE_DIR / 'firebase-cred.json'
\ No newline at end of file
+FIREBASE_CRED = BASE_DIR / 'firebase-cred.json'
+
+# Start the grading workers (which load the grading models) when a web worker starts (see exam_project/wsgi.py and asgi.py).
+# Set to 0 on processes that only serve pages; they load the models on first use instead.
+GRADER_PRELOAD = os.environ.get('GRADER_PRELOAD', '1') == '1'
+
+# Local, per-machine grader caches (teacher embeddings, ...)
+GRADER_CACHE_DIR = Path(os.environ.get('GRADER_CACHE_DIR', BASE_DIR / 'grader_cache'))
+
+# Sentence-embedding backend: 'torch' (SentenceTransformer fp32) or 'onnx' (int8 ONNX Runtime, CPU)
+GRADER_EMBEDDING_BACKEND = os.environ.get('GRADER_EMBEDDING_BACKEND', 'torch')
+GRADER_ONNX_MODEL_DIR = Path(os.environ.get('GRADER_ONNX_MODEL_DIR', GRADER_CACHE_DIR / 'onnx-minilm-int8'))
+
+# Background grading: worker threads per process and the bounded queue feeding them
+GRADING_WORKERS = int(os.environ.get('GRADING_WORKERS', 2))
+GRADING_QUEUE_SIZE = int(os.environ.get('GRADING_QUEUE_SIZE', 500))
+
+# Memoized grading results for repeated answers: in-process LRU size, plus a SQLite tier shared by local workers
+GRADER_RESULT_CACHE_MB = int(os.environ.get('GRADER_RESULT_CACHE_MB', 32))
+GRADER_RESULT_CACHE_SHARED = os.environ.get('GRADER_RESULT_CACHE_SHARED', '1') == '1'
+
+
+# Exam metadata and question sets are cached per process for this many seconds, then revalidated
+# against a shared version stamp (bumped by uploads and admin_codes changes)
+EXAM_CACHE_TTL = float(os.environ.get('EXAM_CACHE_TTL', 30))
+EXAM_CACHE_SIZE = int(os.environ.get('EXAM_CACHE_SIZE', 256))
+
+# Autosaved draft answers are buffered per process and written to Firestore at most once per student per
+# interval (seconds); the buffer flushes early once this many students have unwritten changes
+DRAFT_FLUSH_INTERVAL = float(os.environ.get('DRAFT_FLUSH_INTERVAL', 5))
+DRAFT_BUFFER_MAX_STUDENTS = int(os.environ.get('DRAFT_BUFFER_MAX_STUDENTS', 5000))
+
+# Submissions per page in the admin_stats results table
+ADMIN_STATS_PAGE_SIZE = int(os.environ.get('ADMIN_STATS_PAGE_SIZE', 50))
+
+# Observability: /metrics (Prometheus text format) and JSON logs on stderr
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # when set, scrapes must send "Authorization: Bearer <token>"
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))  # requests slower than this are logged as warnings
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'exam.log_format.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        'exam': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}